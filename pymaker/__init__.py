@@ -22,7 +22,7 @@ import re
 import sys
 import time
 from enum import Enum, auto
-from functools import total_ordering, wraps
+from functools import total_ordering, wraps, lru_cache
 from threading import Lock
 from typing import Optional
 
@@ -31,16 +31,23 @@ import pkg_resources
 from hexbytes import HexBytes
 
 from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.middleware.pythonic import receipt_formatter
 from web3.utils.contracts import get_function_info, encode_abi
 from web3.utils.events import get_event_data
 
+from pymaker.events import EventScanner
+from pymaker.eventstore import event_store
 from pymaker.gas import DefaultGasPrice, GasPrice
 from pymaker.numeric import Wad
-from pymaker.util import synchronize, bytes_to_hexstring, is_contract_at
+from pymaker.util import synchronize, bytes_to_hexstring, is_contract_at, make_batch_request
 
 filter_threads = []
 node_is_parity = None
-transaction_lock = Lock()
+nonce_allocators = {}
+nonce_allocators_lock = Lock()
+receipt_watchers = {}
+receipt_watchers_lock = Lock()
 
 
 def register_filter_thread(filter_thread):
@@ -87,6 +94,14 @@ def _track_status(f):
     return wrapper
 
 
+@lru_cache(maxsize=65536)
+def _normalize_address(address) -> tuple:
+    # Checksumming involves calculating a keccak hash, so results are cached. As a side effect,
+    # all `Address` instances created from the same representation share the same strings.
+    checksum_address = eth_utils.to_checksum_address(address)
+    return checksum_address, bytes.fromhex(checksum_address[2:])
+
+
 @total_ordering
 class Address:
     """Represents an Ethereum address.
@@ -100,15 +115,22 @@ class Address:
     Attributes:
         address: Normalized hexadecimal representation of the Ethereum address.
     """
+    __slots__ = ['address', '_bytes']
+
     def __init__(self, address):
         if isinstance(address, Address):
             self.address = address.address
+            self._bytes = address._bytes
         else:
-            self.address = eth_utils.to_checksum_address(address)
+            try:
+                self.address, self._bytes = _normalize_address(address)
+            except TypeError:
+                # unhashable representations (like `bytearray`) can not be cached
+                self.address, self._bytes = _normalize_address.__wrapped__(address)
 
     def as_bytes(self) -> bytes:
         """Return the address as a 20-byte bytes array."""
-        return bytes.fromhex(self.address.replace('0x', ''))
+        return self._bytes
 
     def __str__(self):
         return f"{self.address}"
@@ -117,11 +139,11 @@ class Address:
         return f"Address('{self.address}')"
 
     def __hash__(self):
-        return self.address.__hash__()
+        return self._bytes.__hash__()
 
     def __eq__(self, other):
         assert(isinstance(other, Address))
-        return self.address == other.address
+        return self._bytes == other._bytes
 
     def __lt__(self, other):
         assert(isinstance(other, Address))
@@ -172,11 +194,19 @@ class Contract:
             return callback
 
         block_number = contract.web3.eth.blockNumber
-        result = contract.events[event].createFilter(fromBlock=max(block_number-number_of_past_blocks, 0),
-                                                     toBlock=block_number,
-                                                     argument_filters=event_filter).get_all_entries()
+        from_block = max(block_number-number_of_past_blocks, 0)
+
+        # If the event store is enabled, only events not stored yet get fetched from the node
+        store = event_store(contract.web3)
+        if store is not None:
+            return list(map(_event_callback(cls, True),
+                            store.past_events(contract, event, from_block, block_number, event_filter)))
 
-        return list(map(_event_callback(cls, True), result))
+        # The range is scanned in chunks, as querying a large range at once tends to fail (see `EventScanner`)
+        scanner = EventScanner(contract, event, from_block=from_block, to_block=block_number,
+                               event_filter=event_filter, transform=_event_callback(cls, True))
+
+        return list(scanner.scan())
 
     @staticmethod
     def _load_abi(package, resource) -> list:
@@ -333,6 +363,218 @@ class TransactStatus(Enum):
      FINISHED = auto()
 
 
+class NonceAllocator:
+    """Allocates nonces for transactions sent from one account.
+
+    Keeps a local, monotonically increasing nonce counter so many :py:class:`pymaker.Transact`
+    instances can send transactions from the same account at once, without a global lock and
+    without querying the node for every transaction. The counter gets (re)synchronized with
+    the node only on first use and after `resync()` has been called, which :py:class:`pymaker.Transact`
+    does every time sending a transaction fails (i.e. there may be a nonce gap or the counter is stale).
+
+    Instances of this class shouldn't be created directly, use `nonce_allocator()` instead
+    so there is always only one allocator per `Web3` instance and account.
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+        account: Address of the account the nonces are allocated for.
+    """
+    def __init__(self, web3: Web3, account: str):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(account, str))
+
+        self.web3 = web3
+        self.account = account
+        self._next_nonce = None
+        self._lock = Lock()
+
+    def allocate(self) -> int:
+        """Returns a nonce not allocated to any other transaction yet.
+
+        Queries the node only if the counter hasn't been synchronized yet.
+
+        Returns:
+            The nonce to be used for the next transaction.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = self._node_next_nonce()
+
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def resync(self):
+        """Makes the next `allocate()` call synchronize the counter with the node first."""
+        with self._lock:
+            self._next_nonce = None
+
+    def _node_next_nonce(self) -> int:
+        global node_is_parity
+        if node_is_parity is None:
+            node_is_parity = "parity" in self.web3.version.node.lower()
+
+        if node_is_parity:
+            return int(self.web3.manager.request_blocking("parity_nextNonce", [self.account]), 16)
+        else:
+            return self.web3.eth.getTransactionCount(self.account, block_identifier='pending')
+
+    def __repr__(self):
+        return f"NonceAllocator('{self.account}')"
+
+
+def nonce_allocator(web3: Web3, account: str) -> NonceAllocator:
+    """Returns the nonce allocator for the given `Web3` instance and account.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+        account: Address of the account to get the allocator for.
+
+    Returns:
+        The :py:class:`pymaker.NonceAllocator` shared by all transactions sent
+        from `account` through `web3`.
+    """
+    assert(isinstance(web3, Web3))
+    assert(isinstance(account, str))
+
+    key = (web3, account.lower())
+    with nonce_allocators_lock:
+        if key not in nonce_allocators:
+            nonce_allocators[key] = NonceAllocator(web3, account)
+
+        return nonce_allocators[key]
+
+
+class ReceiptWatcher:
+    """Watches transaction counts and receipts on behalf of all in-flight transactions.
+
+    Instead of each :py:class:`pymaker.Transact` querying the node for the transaction count
+    of its account and for receipts of all transactions it has sent, they all ask the shared
+    watcher. The watcher polls the node at most once every `frequency` seconds, fetching
+    everything that has been asked for recently in one JSON-RPC batch request
+    (see :py:func:`pymaker.util.make_batch_request`), and answers from its cache in between.
+
+    Accounts and transaction hashes are being watched from the moment they are first asked about,
+    until no one has asked about them for `expiry` seconds.
+
+    Instances of this class shouldn't be created directly, use `receipt_watcher()` instead
+    so there is always only one watcher per `Web3` instance.
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+        frequency: Minimum interval between subsequent polls (in seconds).
+        expiry: Time after which accounts and transaction hashes no one asked about
+            stop being watched (in seconds).
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, frequency: float = 0.25, expiry: float = 60):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(frequency, (int, float)))
+        assert(isinstance(expiry, (int, float)))
+
+        self.web3 = web3
+        self.frequency = frequency
+        self.expiry = expiry
+        self._accounts = {}
+        self._transactions = {}
+        self._transaction_counts = {}
+        self._receipts = {}
+        self._last_poll = 0
+        self._lock = Lock()
+
+    def transaction_count(self, account: str) -> int:
+        """Returns the number of transactions sent from `account`, as of the last poll.
+
+        Args:
+            account: Address of the account.
+
+        Returns:
+            Number of transactions sent from `account` which have already been mined.
+        """
+        assert(isinstance(account, str))
+
+        with self._lock:
+            self._accounts[account] = time.time()
+            self._poll(force=account not in self._transaction_counts)
+
+            if account not in self._transaction_counts:
+                raise Exception(f"Unable to get transaction count for {account}")
+
+            return self._transaction_counts[account]
+
+    def receipt(self, transaction_hash) -> Optional[dict]:
+        """Returns the raw receipt of a transaction, as of the last poll.
+
+        Args:
+            transaction_hash: Hash of the transaction.
+
+        Returns:
+            The raw receipt of the transaction if it has been mined, `None` otherwise.
+        """
+        transaction_hash = bytes_to_hexstring(transaction_hash) if isinstance(transaction_hash, bytes) \
+            else transaction_hash
+
+        with self._lock:
+            self._transactions[transaction_hash] = time.time()
+            self._poll(force=False)
+
+            return self._receipts.get(transaction_hash)
+
+    def _poll(self, force: bool):
+        now = time.time()
+        if not force and now - self._last_poll < self.frequency:
+            return
+
+        self._accounts = {key: value for key, value in self._accounts.items() if now - value < self.expiry}
+        self._transactions = {key: value for key, value in self._transactions.items() if now - value < self.expiry}
+        self._transaction_counts = {key: value for key, value in self._transaction_counts.items()
+                                    if key in self._accounts}
+        self._receipts = {key: value for key, value in self._receipts.items() if key in self._transactions}
+
+        # Receipts of mined transactions do not change, so there is no need to ask for them again
+        accounts = list(self._accounts.keys())
+        transactions = list(key for key in self._transactions.keys() if key not in self._receipts)
+        requests = [('eth_getTransactionCount', [account, 'latest']) for account in accounts] + \
+                   [('eth_getTransactionReceipt', [transaction]) for transaction in transactions]
+
+        responses = make_batch_request(self.web3, requests)
+        self._last_poll = now
+
+        for account, response in zip(accounts, responses[:len(accounts)]):
+            if 'result' in response:
+                self._transaction_counts[account] = int(response['result'], 16)
+            else:
+                self.logger.warning(f"Failed to get transaction count for {account} ({response.get('error')})")
+
+        for transaction, response in zip(transactions, responses[len(accounts):]):
+            raw_receipt = response.get('result')
+            if raw_receipt is not None and raw_receipt.get('blockNumber') is not None:
+                self._receipts[transaction] = AttributeDict.recursive(receipt_formatter(raw_receipt))
+
+    def __repr__(self):
+        return f"ReceiptWatcher({self.web3.providers[0]})"
+
+
+def receipt_watcher(web3: Web3) -> ReceiptWatcher:
+    """Returns the receipt watcher for the given `Web3` instance.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        The :py:class:`pymaker.ReceiptWatcher` shared by all transactions sent through `web3`.
+    """
+    assert(isinstance(web3, Web3))
+
+    with receipt_watchers_lock:
+        if web3 not in receipt_watchers:
+            receipt_watchers[web3] = ReceiptWatcher(web3)
+
+        return receipt_watchers[web3]
+
+
 class Transact:
     """Represents an Ethereum transaction before it gets executed."""
 
@@ -370,15 +612,8 @@ class Transact:
         self.status = TransactStatus.NEW
         self.nonce = None
 
-    def _is_parity(self) -> bool:
-        global node_is_parity
-        if node_is_parity is None:
-            node_is_parity = "parity" in self.web3.version.node.lower()
-
-        return node_is_parity
-
     def _get_receipt(self, transaction_hash: str) -> Optional[Receipt]:
-        raw_receipt = self.web3.eth.getTransactionReceipt(transaction_hash)
+        raw_receipt = receipt_watcher(self.web3).receipt(transaction_hash)
         if raw_receipt is not None and raw_receipt['blockNumber'] is not None:
             receipt = Receipt(raw_receipt)
             receipt.result = self.result_function(receipt) if self.result_function is not None else None
@@ -561,6 +796,9 @@ class Transact:
             self.nonce = replaced_tx.nonce
 
         # Initialize variables which will be used in the main loop.
+        allocator = nonce_allocator(self.web3, from_account)
+        watcher = receipt_watcher(self.web3)
+        nonce_resynced = False
         tx_hashes = []
         initial_time = time.time()
         gas_price_last = 0
@@ -568,7 +806,9 @@ class Transact:
         while True:
             seconds_elapsed = int(time.time() - initial_time)
 
-            if self.nonce is not None and self.web3.eth.getTransactionCount(from_account) > self.nonce:
+            # Transaction counts and receipts come from the watcher shared by all in-flight transactions,
+            # which polls the node for all of them at once.
+            if self.nonce is not None and watcher.transaction_count(from_account) > self.nonce:
                 # Check if any transaction sent so far has been mined (has a receipt).
                 # If it has, we return either the receipt (if if was successful) or `None`.
                 for attempt in range(1, 11):
@@ -584,7 +824,7 @@ class Transact:
                                 return None
 
                     self.logger.debug(f"No receipt found in attempt #{attempt}/10 (nonce={self.nonce},"
-                                      f" getTransactionCount={self.web3.eth.getTransactionCount(from_account)})")
+                                      f" getTransactionCount={watcher.transaction_count(from_account)})")
 
                     await asyncio.sleep(0.5)
 
@@ -603,17 +843,13 @@ class Transact:
                 gas_price_last = gas_price_value
 
                 try:
-                    # We need the lock in order to not try to send two transactions with the same nonce.
-                    with transaction_lock:
-                        if self.nonce is None:
-                            if self._is_parity():
-                                self.nonce = int(self.web3.manager.request_blocking("parity_nextNonce", [from_account]), 16)
-
-                            else:
-                                self.nonce = self.web3.eth.getTransactionCount(from_account, block_identifier='pending')
+                    # The allocator hands out a different nonce to each transaction, so there is no need
+                    # to hold any lock while sending the transaction itself.
+                    if self.nonce is None:
+                        self.nonce = allocator.allocate()
 
-                        tx_hash = self._func(from_account, gas, gas_price_value, self.nonce)
-                        tx_hashes.append(tx_hash)
+                    tx_hash = self._func(from_account, gas, gas_price_value, self.nonce)
+                    tx_hashes.append(tx_hash)
 
                     self.logger.info(f"Sent transaction {self.name()} with nonce={self.nonce}, gas={gas},"
                                      f" gas_price={gas_price_value if gas_price_value is not None else 'default'}"
@@ -624,6 +860,17 @@ class Transact:
                                         f" ({e})")
 
                     if len(tx_hashes) == 0:
+                        # Either the allocated nonce was stale (i.e. some other software sent a transaction
+                        # from the same account) or we have just left a gap in nonces. In both cases
+                        # the allocator has to synchronize with the node again. If the nonce was allocated
+                        # by us, we try once more with the synchronized one.
+                        allocator.resync()
+
+                        if replaced_tx is None and not nonce_resynced:
+                            self.nonce = None
+                            nonce_resynced = True
+                            continue
+
                         raise
 
             await asyncio.sleep(0.25)
@@ -642,6 +889,55 @@ class Transact:
         return Invocation(self.address, Calldata(self._contract_function()._encode_transaction_data()))
 
 
+class TransactIntent:
+    """Picklable description of a transaction, to be turned into a `Transact` in another process.
+
+    `Transact` objects can not be sent between processes, as they hold a reference to `Web3`.
+    A `TransactIntent` only records the pymaker contract class, the contract address, the name of the method
+    returning the `Transact` and its arguments, so it can be created in a process with no connection
+    to the node (see the `in_process` option of :py:class:`pymaker.lifecycle.Lifecycle`) and turned into
+    a `Transact` by the process sending transactions.
+
+    The typical usage pattern is as follows:
+
+        intent = TransactIntent(ERC20Token, token_address, 'transfer', [recipient, Wad.from_number(5)])
+        intent.transact(web3).transact()
+
+    Attributes:
+        contract_class: Pymaker contract class, its constructor has to accept `web3` and `address` arguments.
+        address: Address of the contract.
+        method: Name of the contract class method returning the `Transact`.
+        args: Arguments of the method.
+    """
+    def __init__(self, contract_class: type, address: Address, method: str, args: list = None):
+        assert(isinstance(contract_class, type))
+        assert(isinstance(address, Address))
+        assert(isinstance(method, str))
+        assert(isinstance(args, list) or (args is None))
+
+        self.contract_class = contract_class
+        self.address = address
+        self.method = method
+        self.args = args or []
+
+    def transact(self, web3: Web3) -> Transact:
+        """Creates the `Transact` described by this intent.
+
+        Args:
+            web3: An instance of `Web3` from `web3.py`.
+
+        Returns:
+            A :py:class:`pymaker.Transact` ready to be sent.
+        """
+        assert(isinstance(web3, Web3))
+
+        contract = self.contract_class(web3=web3, address=self.address)
+        return getattr(contract, self.method)(*self.args)
+
+    def __repr__(self):
+        return f"TransactIntent({self.contract_class.__name__}('{self.address}').{self.method}({self.args}))"
+
+
 class Transfer:
     """Represents an ERC20 token transfer.
 
@@ -0,0 +1,53 @@
+; Runtime code of the `Multicall` contract, see `pymaker.multicall.Multicall`.
+;
+; It has only one function, `aggregate(bytes calls) view returns (uint256 blockNumber, bytes results)`.
+;
+; `calls` is a concatenation of (20-byte target address, 32-byte data length, data) records.
+; Each call gets executed with STATICCALL, and `results` is a concatenation of (32-byte success flag,
+; 32-byte return data length, return data) records, in the same order. Failed calls do not make
+; the whole `aggregate` call fail, their success flag is just zero.
+;
+; The contract uses Byzantium opcodes only. `Multicall.bin` is this code assembled and prefixed
+; with a standard 13-byte constructor which copies it to memory and returns it (the constructor
+; takes no arguments).
+;
+; Stack contents are shown in comments after the instructions, top of the stack on the right.
+
+    PUSH1 0 CALLDATALOAD PUSH29 SHIFT224 SWAP1 DIV      ; [selector]
+    PUSH4 SELECTOR EQ PUSH2 main JUMPI
+    PUSH1 0 DUP1 REVERT
+
+main:
+    JUMPDEST
+    PUSH1 4 CALLDATALOAD PUSH1 4 ADD                    ; [p]                  (position of `calls` length)
+    DUP1 CALLDATALOAD                                   ; [p, len]
+    SWAP1 PUSH1 32 ADD                                  ; [len, ptr]
+    SWAP1 DUP2 ADD                                      ; [ptr, end]
+    SWAP1                                               ; [end, ptr]
+    PUSH1 0x60                                          ; [end, ptr, out]      (results start after the return header)
+
+loop:
+    JUMPDEST
+    DUP3 DUP3 LT ISZERO PUSH2 done JUMPI                ; exit unless ptr < end
+    DUP2 PUSH1 20 ADD CALLDATALOAD                      ; [end, ptr, out, dlen]
+    DUP1 DUP4 PUSH1 52 ADD DUP4 PUSH1 64 ADD CALLDATACOPY   ; memory[out+64:] = call data
+    PUSH1 0 DUP1 DUP3 DUP5 PUSH1 64 ADD                 ; [end, ptr, out, dlen, 0, 0, dlen, out+64]
+    DUP7 CALLDATALOAD PUSH13 SHIFT96 SWAP1 DIV          ; [..., target]
+    GAS STATICCALL                                      ; [end, ptr, out, dlen, success]
+    DUP3 MSTORE                                         ; memory[out] = success
+    RETURNDATASIZE DUP1 DUP4 PUSH1 32 ADD MSTORE        ; memory[out+32] = rsize, [end, ptr, out, dlen, rsize]
+    DUP1 PUSH1 0 DUP5 PUSH1 64 ADD RETURNDATACOPY       ; memory[out+64:] = return data
+    DUP3 ADD PUSH1 64 ADD                               ; [end, ptr, out, dlen, out+64+rsize]
+    SWAP2 POP                                           ; [end, ptr, out', dlen]
+    DUP3 ADD PUSH1 52 ADD                               ; [end, ptr, out', ptr+52+dlen]
+    SWAP2 POP                                           ; [end, ptr', out']
+    PUSH2 loop JUMP
+
+done:
+    JUMPDEST
+    NUMBER PUSH1 0 MSTORE                               ; blockNumber
+    PUSH1 0x40 PUSH1 0x20 MSTORE                        ; offset of `results`
+    PUSH1 0x60 DUP2 SUB PUSH1 0x40 MSTORE               ; length of `results`
+    PUSH1 0 DUP2 MSTORE                                 ; zero the padding
+    PUSH1 31 ADD PUSH1 0x1f NOT AND                     ; [end, ptr, size]     (`out` rounded up to 32 bytes)
+    PUSH1 0 RETURN
@@ -0,0 +1,193 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+from concurrent.futures import Future
+
+from web3 import Web3
+
+from pymaker.util import make_batch_request
+
+_state = threading.local()
+
+
+class _RequestRecorded(BaseException):
+    pass
+
+
+def _request_key(method: str, params) -> str:
+    return method + json.dumps(params, sort_keys=True)
+
+
+def batch_middleware(make_request, web3: Web3):
+    """Web3.py middleware which makes batching of calls possible.
+
+    It does nothing unless a :py:class:`pymaker.batch.Batch` is being executed in the current thread.
+    If it is, it either records the requests made (and aborts the call straight away), or serves
+    responses received in the batch instead of sending the requests to the node.
+    """
+    def middleware(method, params):
+        if getattr(_state, 'web3', None) is web3:
+            if _state.recording is not None:
+                _state.recording.append((method, params))
+                raise _RequestRecorded()
+
+            key = _request_key(method, params)
+            if key in _state.responses:
+                return _state.responses[key]
+
+        return make_request(method, params)
+
+    return middleware
+
+
+class Batch:
+    """Executes multiple calls using one JSON-RPC batch request.
+
+    Calls registered with `call()` are not executed straight away. Once `execute()` gets called
+    (which happens automatically when `Batch` is used as a context manager), each of them is run
+    once with all node requests being recorded instead of sent, then all recorded requests are sent
+    to the node as one JSON-RPC batch (see :py:func:`pymaker.util.make_batch_request`) and finally
+    each call is run again, this time getting the responses from the batch.
+
+    As calls run in full both times, any pymaker method can be batched, with its results decoded
+    exactly the same way as they would be without batching. Calls which make more than one request
+    have the subsequent ones sent to the node in the usual way.
+
+    The typical usage pattern is as follows:
+
+        with batch(web3) as b:
+            balance = b.call(token.balance_of, our_address)
+            cup = b.call(tub.cups, 1)
+
+        print(balance.result(), cup.result())
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+    """
+
+    def __init__(self, web3: Web3):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self._calls = []
+
+        if 'pymaker_batch' not in web3.middleware_stack:
+            web3.middleware_stack.inject(batch_middleware, name='pymaker_batch', layer=0)
+
+    def call(self, function, *args, **kwargs) -> Future:
+        """Registers a call to be executed as part of the batch.
+
+        Args:
+            function: Function to be called, usually a method of one of the pymaker contract classes.
+            args: Positional arguments to call `function` with.
+            kwargs: Keyword arguments to call `function` with.
+
+        Returns:
+            A `concurrent.futures.Future`, which will get resolved to either the value returned
+            by the call or the exception raised by it once the batch has been executed.
+        """
+        assert(callable(function))
+
+        future = Future()
+        self._calls.append((future, function, args, kwargs))
+        return future
+
+    def execute(self):
+        """Executes all calls registered so far, resolving their futures."""
+        calls, self._calls = self._calls, []
+
+        requests = {}
+        pending = []
+        for future, function, args, kwargs in calls:
+            recorded = []
+            result, exception = None, None
+
+            previous_state = self._enter(recording=recorded, responses={})
+            try:
+                result = function(*args, **kwargs)
+            except _RequestRecorded:
+                pass
+            except Exception as e:
+                exception = e
+            finally:
+                self._exit(previous_state)
+
+            # Calls which did not make any requests are already done at this point. The ones which did
+            # (even if they swallowed the exception aborting them) need to be run again once the batch is back.
+            if len(recorded) > 0:
+                pending.append((future, function, args, kwargs))
+                for method, params in recorded:
+                    requests.setdefault(_request_key(method, params), (method, params))
+            elif exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+        keys = list(requests.keys())
+        responses = dict(zip(keys, self._send(list(requests.values()))))
+
+        for future, function, args, kwargs in pending:
+            previous_state = self._enter(recording=None, responses=responses)
+            try:
+                future.set_result(function(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._exit(previous_state)
+
+    def _send(self, requests: list) -> list:
+        return make_batch_request(self.web3, requests)
+
+    def _enter(self, recording, responses: dict) -> tuple:
+        previous_state = (getattr(_state, 'web3', None), getattr(_state, 'recording', None),
+                          getattr(_state, 'responses', None))
+
+        _state.web3 = self.web3
+        _state.recording = recording
+        _state.responses = responses
+
+        return previous_state
+
+    @staticmethod
+    def _exit(previous_state: tuple):
+        _state.web3, _state.recording, _state.responses = previous_state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+
+    def __repr__(self):
+        return f"Batch({self.web3.providers[0]})"
+
+
+def batch(web3: Web3) -> Batch:
+    """Creates a new batch of calls to be sent to the node in one JSON-RPC batch request.
+
+    See :py:class:`pymaker.batch.Batch` for the usage pattern.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        A new :py:class:`pymaker.batch.Batch` instance.
+    """
+    return Batch(web3)
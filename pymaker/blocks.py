@@ -0,0 +1,461 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+from web3 import Web3, IPCProvider, WebsocketProvider
+from web3.datastructures import AttributeDict
+from web3.middleware.pythonic import block_formatter
+
+from pymaker.batch import batch
+from pymaker.metrics import MetricsSink
+
+
+class BlockSource:
+    """Source of new block headers, delivering them to a callback from a dedicated thread.
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+        metrics: Sink for metrics of the source (see :py:mod:`pymaker.metrics`).
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self.metrics = MetricsSink()
+
+        self._callback = None
+        self._stopped = False
+
+    def start(self, callback) -> threading.Thread:
+        """Starts watching for new blocks.
+
+        Args:
+            callback: Function to be called with each new block header (as an `AttributeDict`,
+                formatted the same way as `web3.eth.getBlock` results).
+
+        Returns:
+            The (already started) daemon thread watching for new blocks.
+        """
+        assert(callable(callback))
+        assert(self._callback is None)
+
+        self._callback = callback
+
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stops watching for new blocks."""
+        self._stopped = True
+
+    def _run(self):
+        raise NotImplementedError()
+
+    def _deliver(self, block):
+        if not self._stopped:
+            self._callback(block)
+
+    def _poll(self, poll_interval: float, until: float = None):
+        event_filter = self.web3.eth.filter('latest')
+        while not self._stopped and (until is None or time.time() < until):
+            block_hashes = event_filter.get_new_entries()
+
+            # if more than one block arrived since the last poll, only the most recent one matters
+            if len(block_hashes) > 0:
+                self._deliver(self.web3.eth.getBlock(block_hashes[-1]))
+
+            time.sleep(poll_interval)
+
+
+class PollingBlockSource(BlockSource):
+    """Watches for new blocks by polling a `latest` block filter.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+        poll_interval: Time between subsequent polls (in seconds).
+    """
+    def __init__(self, web3: Web3, poll_interval: float = 1.0):
+        assert(isinstance(poll_interval, (int, float)))
+
+        super().__init__(web3)
+        self.poll_interval = poll_interval
+
+    def _run(self):
+        self._poll(self.poll_interval)
+
+    def __repr__(self):
+        return f"PollingBlockSource(poll_interval={self.poll_interval})"
+
+
+class SubscriptionBlockSource(BlockSource):
+    """Watches for new blocks using an `eth_subscribe('newHeads')` subscription.
+
+    Block headers get pushed by the node the moment it imports a new block, so they reach
+    the callback without any polling delay and without any additional requests to the node.
+
+    The subscription is made over WebSocket (if `uri` starts with `ws://` or `wss://`) or over IPC
+    (otherwise, `uri` being the path to the IPC socket). If the subscription can not be made or gets
+    interrupted, the source falls back to polling (see :py:class:`pymaker.blocks.PollingBlockSource`)
+    and tries to subscribe again after `retry_interval` seconds.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`. Used for polling only.
+        uri: WebSocket endpoint or IPC socket path of the node.
+        poll_interval: Time between subsequent polls when falling back to polling (in seconds).
+        retry_interval: Time after which subscribing is attempted again when polling (in seconds).
+    """
+    def __init__(self, web3: Web3, uri: str, poll_interval: float = 1.0, retry_interval: float = 30.0):
+        assert(isinstance(uri, str))
+        assert(isinstance(poll_interval, (int, float)))
+        assert(isinstance(retry_interval, (int, float)))
+
+        super().__init__(web3)
+        self.uri = uri
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+
+        while not self._stopped:
+            try:
+                loop.run_until_complete(self._subscribe())
+                self.logger.warning(f"Subscription to new blocks via {self.uri} closed, falling back to polling")
+            except Exception as e:
+                self.logger.warning(f"Subscription to new blocks via {self.uri} failed ({e}),"
+                                    f" falling back to polling")
+
+            self.metrics.increment('pymaker_filter_thread_restarts_total', labels={'thread': 'block_source'})
+
+            self._poll(self.poll_interval, until=time.time() + self.retry_interval)
+
+    async def _subscribe(self):
+        request = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']})
+
+        if self.uri.startswith('ws://') or self.uri.startswith('wss://'):
+            import websockets
+
+            async with websockets.connect(self.uri) as websocket:
+                await websocket.send(request)
+                while not self._stopped:
+                    self._handle(json.loads(await websocket.recv()))
+
+        else:
+            reader, writer = await asyncio.open_unix_connection(self.uri)
+            try:
+                writer.write(request.encode('utf-8'))
+
+                # IPC is a stream of JSON messages with no delimiters between them
+                buffer = ''
+                decoder = json.JSONDecoder()
+                while not self._stopped:
+                    data = await reader.read(65536)
+                    if not data:
+                        return
+
+                    buffer = (buffer + data.decode('utf-8')).lstrip()
+                    while buffer:
+                        try:
+                            message, index = decoder.raw_decode(buffer)
+                        except ValueError:
+                            break
+
+                        buffer = buffer[index:].lstrip()
+                        self._handle(message)
+            finally:
+                writer.close()
+
+    def _handle(self, message: dict):
+        if 'error' in message:
+            raise Exception(message['error'])
+
+        if message.get('id') == 1:
+            self.logger.info(f"Subscribed to new blocks via {self.uri}")
+
+        elif message.get('method') == 'eth_subscription':
+            self._deliver(AttributeDict(block_formatter(message['params']['result'])))
+
+    def __repr__(self):
+        return f"SubscriptionBlockSource('{self.uri}')"
+
+
+class BlockHistory:
+    """Ring buffer of recent block headers, detecting chain reorganizations.
+
+    Each new header is expected to be a child of the most recent one. If it is not, the history walks
+    back over its ancestors (fetching their headers from the node) until it reaches a block which is
+    already in the buffer. Blocks in the buffer after that common ancestor are the ones which have been
+    reorganized away. Headers which skip a few blocks, as polling may deliver them, only get their
+    missing ancestors fetched and are not reported as reorganizations.
+
+    Reorganizations deeper than `size` can not be told apart exactly, in that case all buffered blocks
+    at or above the height of the oldest fetched ancestor are reported as replaced.
+
+    Headers without a `parentHash` are ignored.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+        size: Maximum number of headers kept in the buffer.
+    """
+    def __init__(self, web3: Web3, size: int = 64):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(size, int))
+        assert(size > 0)
+
+        self.web3 = web3
+        self.size = size
+
+        self._blocks = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    @property
+    def blocks(self) -> list:
+        """Headers currently in the buffer, from the oldest to the most recent one."""
+        with self._lock:
+            return list(self._blocks)
+
+    def add(self, block) -> Optional[Tuple[int, list, list]]:
+        """Adds a new block header to the history.
+
+        Args:
+            block: The new block header.
+
+        Returns:
+            `None` if the block extends the chain known so far. If it causes a reorganization, a tuple
+            of its depth (number of blocks replaced), the list of replaced headers and the list of headers
+            replacing them (ending with `block`), both lists ordered from the lowest block number.
+        """
+        if block.get('parentHash') is None:
+            return None
+
+        with self._lock:
+            if len(self._blocks) == 0:
+                self._blocks.append(block)
+                return None
+
+            # the same block can get delivered more than once, e.g. after falling back to polling
+            positions = {known['hash']: index for index, known in enumerate(self._blocks)}
+            if block['hash'] in positions:
+                return None
+
+            new_blocks = [block]
+            oldest_number = self._blocks[0]['number']
+            while new_blocks[0]['parentHash'] not in positions \
+                    and new_blocks[0]['number'] > oldest_number \
+                    and len(new_blocks) <= self.size:
+                parent = self.web3.eth.getBlock(new_blocks[0]['parentHash'])
+                if parent is None:
+                    break
+
+                new_blocks.insert(0, parent)
+
+            ancestor = positions.get(new_blocks[0]['parentHash'])
+            if ancestor is not None:
+                kept = list(self._blocks)[:ancestor+1]
+                old_blocks = list(self._blocks)[ancestor+1:]
+            else:
+                kept = [known for known in self._blocks if known['number'] < new_blocks[0]['number']]
+                old_blocks = [known for known in self._blocks if known['number'] >= new_blocks[0]['number']]
+
+            self._blocks = deque(kept + new_blocks, maxlen=self.size)
+
+        if len(old_blocks) > 0:
+            return len(old_blocks), old_blocks, new_blocks
+        else:
+            return None
+
+    def __repr__(self):
+        return f"BlockHistory(size={self.size})"
+
+
+class BlockContext:
+    """Everything an `on_block` callback may need to know about the block it has been invoked for.
+
+    Apart from the block header, it carries the results of the prefetch list registered
+    with :py:meth:`pymaker.lifecycle.Lifecycle.on_block`. All calls on that list get executed
+    before the callback starts, using one JSON-RPC batch request (see :py:class:`pymaker.batch.Batch`),
+    so however long the list is, it only costs one round trip to the node.
+
+    The context also works as a per-block read cache. Each call made through `call()` gets
+    executed only once per block, however many times it is made. Calls from the prefetch list
+    are already in the cache.
+
+    Prefetched values and cached calls are read from the `latest` block, which usually is
+    the block the context has been created for, but may already be a newer one.
+
+    Contexts can be pickled, so they can be passed to callbacks running in other processes
+    (see the `in_process` option of :py:meth:`pymaker.lifecycle.Lifecycle.on_block`). Only the block header
+    and the results of the prefetch list get pickled, the cache of calls made through `call()` does not.
+
+    The typical usage pattern is as follows:
+
+        def on_block(context: BlockContext):
+            print(context.number, context['balance'], context.call(tub.per))
+
+        lifecycle.on_block(on_block, prefetch={'balance': (token.balance_of, our_address),
+                                               'per': tub.per})
+
+    Attributes:
+        block: The block header.
+        number: Number of the block.
+        hash: Hash of the block.
+        timestamp: Timestamp of the block.
+    """
+    def __init__(self, block, prefetched: dict = None):
+        self.block = block
+        self.number = block['number']
+        self.hash = block['hash']
+        self.timestamp = block.get('timestamp')
+
+        self._prefetched = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        for name, (function, args, future) in (prefetched or {}).items():
+            self._prefetched[name] = future
+            self._cache[self._key(function, args)] = future
+
+    @staticmethod
+    def prefetch(web3: Web3, block, prefetch: dict) -> 'BlockContext':
+        """Creates a context for a block, executing all calls on the prefetch list in one batch.
+
+        Args:
+            web3: An instance of `Web3` from `web3.py`.
+            block: The block header.
+            prefetch: Prefetch list, as a dictionary. Values are either functions to be called
+                with no arguments, or tuples of a function followed by its arguments.
+                Keys are names the results will be available under.
+
+        Returns:
+            A new :py:class:`pymaker.blocks.BlockContext` instance.
+        """
+        assert(isinstance(web3, Web3))
+        assert(isinstance(prefetch, dict))
+
+        prefetched = {}
+        with batch(web3) as b:
+            for name, entry in prefetch.items():
+                function, args = (entry[0], tuple(entry[1:])) if isinstance(entry, tuple) else (entry, ())
+                prefetched[name] = (function, args, b.call(function, *args))
+
+        return BlockContext(block, prefetched)
+
+    def call(self, function, *args):
+        """Calls a function, unless it has already been called with the same arguments for this block.
+
+        Args:
+            function: Function to be called, usually a method of one of the pymaker contract classes.
+            args: Positional arguments to call `function` with. Have to be hashable.
+
+        Returns:
+            Value returned by the function (now or the first time it was called for this block).
+        """
+        assert(callable(function))
+
+        key = self._key(function, args)
+        with self._lock:
+            future = self._cache.get(key)
+            if future is None:
+                future = Future()
+                self._cache[key] = future
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()
+
+    @staticmethod
+    def _key(function, args: tuple) -> tuple:
+        # pymaker contract classes define `__eq__` without `__hash__`, so bound methods
+        # of them are not hashable and have to be keyed by the identity of the instance
+        if hasattr(function, '__self__') and hasattr(function, '__func__'):
+            return id(function.__self__), function.__func__, args
+        else:
+            return function, args
+
+    def __getstate__(self):
+        # futures and the lock can not be pickled, so only outcomes of the prefetched calls are
+        def outcome(future: Future) -> tuple:
+            return (None, future.exception()) if future.exception() is not None else (future.result(), None)
+
+        return {'block': self.block,
+                'prefetched': {name: outcome(future) for name, future in self._prefetched.items()}}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['block'])
+
+        for name, (result, exception) in state['prefetched'].items():
+            future = Future()
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+            self._prefetched[name] = future
+
+    def __getitem__(self, name: str):
+        """Returns the result of a call from the prefetch list.
+
+        If the call raised an exception, the same exception gets raised here.
+        """
+        return self._prefetched[name].result()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._prefetched
+
+    def __repr__(self):
+        return f"BlockContext(number={self.number}, prefetched={list(self._prefetched.keys())})"
+
+
+def default_block_source(web3: Web3) -> BlockSource:
+    """Returns the best block source available for a `Web3` instance.
+
+    For nodes connected to over WebSocket or IPC a :py:class:`pymaker.blocks.SubscriptionBlockSource`
+    is used, for other ones (HTTP) it is a :py:class:`pymaker.blocks.PollingBlockSource`.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        A new block source.
+    """
+    assert(isinstance(web3, Web3))
+
+    provider = web3.providers[0]
+    if isinstance(provider, WebsocketProvider):
+        return SubscriptionBlockSource(web3, provider.endpoint_uri)
+    elif isinstance(provider, IPCProvider):
+        return SubscriptionBlockSource(web3, provider.ipc_path)
+    else:
+        return PollingBlockSource(web3)
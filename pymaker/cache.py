@@ -0,0 +1,154 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from typing import Optional
+
+from web3 import Web3
+
+from pymaker.util import bytes_to_hexstring
+
+call_caches = {}
+call_caches_lock = threading.Lock()
+
+
+class CallCache:
+    """Caches results of view calls (`eth_call` requests) made within one block.
+
+    Results are cached by (contract address, calldata, block number), so the same getter
+    called multiple times within one block hits the node only once. The cache does not
+    discover new blocks by itself, it has to be told about each of them by calling
+    `new_block()`. :py:class:`pymaker.lifecycle.Lifecycle` does it automatically. Until the
+    first block number gets known, nothing is being cached.
+
+    Only calls made against the `latest` block are cached, calls which failed never are.
+
+    Caches should not be created directly, use :py:func:`pymaker.cache.enable_call_cache` instead.
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+        block_number: Number of the block cached results come from, `None` if not known yet.
+        hits: Number of calls served from the cache.
+        misses: Number of calls which had to be sent to the node.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self.block_number = None
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def new_block(self, block_number: int):
+        """Informs the cache about a new block, dropping all results cached for the previous one.
+
+        Args:
+            block_number: Number of the new block.
+        """
+        assert(isinstance(block_number, int))
+
+        with self._lock:
+            if block_number != self.block_number:
+                self.block_number = block_number
+                self._entries = {}
+
+    def clear(self):
+        """Drops all cached results."""
+        with self._lock:
+            self._entries = {}
+
+    def middleware(self, make_request, web3: Web3):
+        def middleware(method, params):
+            key = self._key(method, params)
+            if key is None:
+                return make_request(method, params)
+
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+
+                self.misses += 1
+
+            response = make_request(method, params)
+
+            with self._lock:
+                if key[3] == self.block_number and 'error' not in response:
+                    self._entries[key] = response
+
+            return response
+
+        return middleware
+
+    def _key(self, method: str, params) -> Optional[tuple]:
+        if method != 'eth_call' or len(params) != 2 or params[1] != 'latest' or self.block_number is None:
+            return None
+
+        def as_str(value) -> str:
+            return bytes_to_hexstring(value) if isinstance(value, bytes) else str(value)
+
+        transaction = params[0]
+        return (as_str(transaction.get('to')).lower(), as_str(transaction.get('data')).lower(),
+                as_str(transaction.get('from')).lower(), self.block_number)
+
+    def __repr__(self):
+        return f"CallCache(block_number={self.block_number}, hits={self.hits}, misses={self.misses})"
+
+
+def enable_call_cache(web3: Web3) -> CallCache:
+    """Enables caching of view call results within one block for a `Web3` instance.
+
+    Once enabled, the cache applies to all view calls made by all pymaker contract classes
+    using this `Web3` instance. Calling this function more than once is harmless, the same
+    :py:class:`pymaker.cache.CallCache` is returned each time.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        The :py:class:`pymaker.cache.CallCache` of `web3`.
+    """
+    assert(isinstance(web3, Web3))
+
+    with call_caches_lock:
+        if web3 not in call_caches:
+            cache = CallCache(web3)
+
+            # The cache is the outermost middleware, so cached results are already formatted
+            # and calls served from it never reach the batching middleware (see `pymaker.batch`).
+            web3.middleware_stack.add(cache.middleware, name='pymaker_call_cache')
+            call_caches[web3] = cache
+
+        return call_caches[web3]
+
+
+def call_cache(web3: Web3) -> Optional[CallCache]:
+    """Returns the view call cache of a `Web3` instance.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        The :py:class:`pymaker.cache.CallCache` of `web3`, or `None` if caching has not been enabled for it.
+    """
+    return call_caches.get(web3)
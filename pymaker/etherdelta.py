@@ -48,7 +48,12 @@ class Order:
         v: V component of the order signature.
         r: R component of the order signature.
         s: S component of the order signature.
+        sell_to_buy_price: Price of the order, in `pay_token` per one `buy_token`. Cached.
+        buy_to_sell_price: Price of the order, in `buy_token` per one `pay_token`. Cached.
     """
+    __slots__ = ['_ether_delta', 'maker', 'pay_token', '_pay_amount', 'buy_token', '_buy_amount', 'expires', 'nonce',
+                 'v', 'r', 's', '_sell_to_buy_price', '_buy_to_sell_price']
+
     def __init__(self, ether_delta, maker: Address, pay_token: Address, pay_amount: Wad, buy_token: Address,
                  buy_amount: Wad, expires: int, nonce: int, v: int, r: bytes, s: bytes):
 
@@ -75,13 +80,39 @@ class Order:
         self.r = r
         self.s = s
 
+    @property
+    def pay_amount(self) -> Wad:
+        return self._pay_amount
+
+    @pay_amount.setter
+    def pay_amount(self, pay_amount: Wad):
+        self._pay_amount = pay_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
+    @property
+    def buy_amount(self) -> Wad:
+        return self._buy_amount
+
+    @buy_amount.setter
+    def buy_amount(self, buy_amount: Wad):
+        self._buy_amount = buy_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
     @property
     def sell_to_buy_price(self) -> Wad:
-        return self.pay_amount / self.buy_amount
+        if self._sell_to_buy_price is None:
+            self._sell_to_buy_price = self._pay_amount / self._buy_amount
+
+        return self._sell_to_buy_price
 
     @property
     def buy_to_sell_price(self) -> Wad:
-        return self.buy_amount / self.pay_amount
+        if self._buy_to_sell_price is None:
+            self._buy_to_sell_price = self._buy_amount / self._pay_amount
+
+        return self._buy_to_sell_price
 
     @property
     def remaining_buy_amount(self) -> Wad:
@@ -143,7 +174,8 @@ class Order:
                f" '{self.expires}', '{self.nonce}')"
 
     def __repr__(self):
-        return pformat(vars(self))
+        return pformat({name.lstrip('_'): getattr(self, name)
+                        for name in self.__slots__ if not name.endswith('_price')})
 
 
 class LogTrade:
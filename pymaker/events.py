@@ -0,0 +1,173 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from web3.utils.contracts import find_matching_event_abi
+from web3.utils.events import get_event_data
+from web3.utils.filters import construct_event_filter_params, construct_data_filter_regex
+
+
+class EventScanner:
+    """Scans a range of blocks for past events of one type, in chunks.
+
+    Instead of querying the node for the whole range at once, which for large ranges tends to time out
+    or exhaust node resources, the range is split into chunks queried with separate `eth_getLogs` calls.
+    Chunk size adapts to how the node copes with them. It gets doubled after each successful query
+    (up to `max_chunk_size`) and halved after each failed one, the failed chunk being split in two and
+    queried again. A single block failing more than `max_retries` times makes the scan fail.
+
+    Up to `max_workers` chunks are being fetched concurrently, but events are always yielded in order.
+    They are yielded one by one as chunks arrive, without building one big list of them.
+
+    Scanning can be resumed. If the scan fails or the caller stops iterating, calling `scan()` again
+    continues exactly where the previous scan has stopped, so each event gets yielded only once.
+
+    The typical usage pattern is as follows:
+
+        scanner = EventScanner(contract, 'LogTake', from_block, to_block, transform=LogTake)
+        for log_take in scanner.scan():
+            print(log_take)
+
+    Attributes:
+        contract: A `web3.py` contract instance.
+        event: Name of the event to scan for.
+        from_block: First block to scan.
+        to_block: Last block to scan.
+        event_filter: Optional filter on event arguments, like the `argument_filters` of `web3.py` filters.
+        transform: Optional function to be applied to each event found (decoded by `web3.py`)
+            before it gets yielded, usually one of the `Log...` classes.
+        decode: If `False`, events do not get decoded and raw logs are yielded (or passed to `transform`) instead.
+        next_block: First block which has not been scanned yet.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, contract, event: str, from_block: int, to_block: int, event_filter: dict = None,
+                 transform=None, chunk_size: int = 1000, max_chunk_size: int = 100000, max_workers: int = 4,
+                 max_retries: int = 5, decode: bool = True):
+        assert(isinstance(event, str))
+        assert(isinstance(from_block, int))
+        assert(isinstance(to_block, int))
+        assert(isinstance(event_filter, dict) or (event_filter is None))
+        assert(callable(transform) or (transform is None))
+        assert(isinstance(chunk_size, int))
+        assert(isinstance(max_chunk_size, int))
+        assert(isinstance(max_workers, int))
+        assert(isinstance(max_retries, int))
+        assert(isinstance(decode, bool))
+        assert(0 < chunk_size <= max_chunk_size)
+        assert(max_workers > 0)
+
+        self.contract = contract
+        self.event = event
+        self.from_block = from_block
+        self.to_block = to_block
+        self.event_filter = event_filter
+        self.transform = transform
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.decode = decode
+        self.next_block = from_block
+
+        self._event_abi = find_matching_event_abi(contract.abi, event_name=event)
+        self._pending = deque()
+
+    def scan(self):
+        """Scans the (remaining part of the) block range, yielding events one by one.
+
+        Returns:
+            A generator of events, each of them either as decoded by `web3.py` (or a raw log if `decode`
+            is `False`) or, if `transform` is specified, as returned by `transform`.
+        """
+        while len(self._pending) > 0:
+            yield self._pending.popleft()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = deque()
+            next_chunk_block = self.next_block
+
+            while True:
+                while len(futures) < self.max_workers and next_chunk_block <= self.to_block:
+                    chunk_end = min(next_chunk_block + self.chunk_size - 1, self.to_block)
+                    futures.append((chunk_end, executor.submit(self._fetch_chunk, next_chunk_block, chunk_end)))
+                    next_chunk_block = chunk_end + 1
+
+                if len(futures) == 0:
+                    break
+
+                chunk_end, future = futures.popleft()
+                try:
+                    events = future.result()
+                except:
+                    for _, other_future in futures:
+                        other_future.cancel()
+                    raise
+
+                self._pending.extend(map(self.transform, events) if self.transform else events)
+                self.next_block = chunk_end + 1
+
+                while len(self._pending) > 0:
+                    yield self._pending.popleft()
+
+    def _fetch_chunk(self, from_block: int, to_block: int) -> list:
+        attempt = 0
+        while True:
+            try:
+                events = self._get_logs(from_block, to_block)
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+                return events
+
+            except Exception as e:
+                self.chunk_size = max(self.chunk_size // 2, 1)
+
+                if to_block > from_block:
+                    self.logger.debug(f"Failed to fetch {self.event} events from blocks {from_block}-{to_block} ({e}),"
+                                      f" splitting the chunk in two")
+                    middle_block = (from_block + to_block) // 2
+                    return self._fetch_chunk(from_block, middle_block) + self._fetch_chunk(middle_block + 1, to_block)
+
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+
+                self.logger.debug(f"Failed to fetch {self.event} events from block {from_block} ({e}), retrying")
+                time.sleep(0.1 * 2**attempt)
+
+    def _get_logs(self, from_block: int, to_block: int) -> list:
+        data_filter_set, filter_params = construct_event_filter_params(self._event_abi,
+                                                                       contract_address=self.contract.address,
+                                                                       argument_filters=self.event_filter or {},
+                                                                       fromBlock=from_block,
+                                                                       toBlock=to_block)
+
+        logs = self.contract.web3.eth.getLogs(filter_params)
+
+        # `eth_getLogs` can only filter by indexed arguments, the other ones have to be filtered here
+        if any(data_filter_set):
+            data_filter_regex = construct_data_filter_regex(data_filter_set)
+            logs = [log for log in logs if data_filter_regex.match(log['data'])]
+
+        return [get_event_data(self._event_abi, log) for log in logs] if self.decode else list(logs)
+
+    def __repr__(self):
+        return f"EventScanner({self.event}, from_block={self.from_block}, to_block={self.to_block}," \
+               f" next_block={self.next_block})"
@@ -0,0 +1,287 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.utils.contracts import find_matching_event_abi
+from web3.utils.events import get_event_data
+from web3.utils.filters import construct_event_filter_params, construct_data_filter_regex
+
+from pymaker.events import EventScanner
+
+event_stores = {}
+event_stores_lock = threading.Lock()
+
+
+class EventStore:
+    """Persistent local store of past events, kept in an SQLite database.
+
+    Events are stored per contract address and event name, together with the range of blocks
+    which has already been synced for them. Each time events from a block range are requested,
+    only the part of the range not synced yet gets fetched from the node (see
+    :py:class:`pymaker.events.EventScanner`), so after a restart a keeper only downloads
+    the events which happened since it last ran.
+
+    The last `reorg_depth` synced blocks could have been reorganized since they were synced,
+    so whenever a sync moves forward, events from these blocks get deleted and fetched again.
+
+    All events of the requested type get stored, regardless of the `event_filter` used.
+    Filtering happens when reading from the store, indexed arguments being matched against
+    the indexed topic columns of the database.
+
+    The database does not record which network events come from, so a separate database file
+    should be used for each network.
+
+    Stores should not be created directly, use :py:func:`pymaker.eventstore.enable_event_store` instead.
+
+    Attributes:
+        web3: An instance of `Web3` from `web3.py`.
+        path: Path to the SQLite database file.
+        reorg_depth: Number of most recent synced blocks to fetch again on each sync.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, path: str, reorg_depth: int = 12):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(path, str))
+        assert(isinstance(reorg_depth, int))
+        assert(reorg_depth >= 0)
+
+        self.web3 = web3
+        self.path = path
+        self.reorg_depth = reorg_depth
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS events ("
+                                     "address TEXT NOT NULL, event TEXT NOT NULL, "
+                                     "block_number INTEGER NOT NULL, log_index INTEGER NOT NULL, "
+                                     "block_hash TEXT NOT NULL, transaction_hash TEXT NOT NULL, "
+                                     "transaction_index INTEGER NOT NULL, "
+                                     "topic0 TEXT, topic1 TEXT, topic2 TEXT, topic3 TEXT, data TEXT NOT NULL, "
+                                     "PRIMARY KEY (address, event, block_number, log_index))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS events_topic1 ON events (topic1)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS events_topic2 ON events (topic2)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS events_topic3 ON events (topic3)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS synced_ranges ("
+                                     "address TEXT NOT NULL, event TEXT NOT NULL, "
+                                     "first_block INTEGER NOT NULL, last_block INTEGER NOT NULL, "
+                                     "PRIMARY KEY (address, event))")
+
+    def synced_range(self, contract, event: str) -> Optional[Tuple[int, int]]:
+        """Returns the range of blocks events of one type have been synced for.
+
+        Args:
+            contract: A `web3.py` contract instance.
+            event: Name of the event.
+
+        Returns:
+            The first and the last synced block, or `None` if nothing has been synced yet.
+        """
+        assert(isinstance(event, str))
+
+        with self._lock:
+            row = self._connection.execute("SELECT first_block, last_block FROM synced_ranges "
+                                           "WHERE address = ? AND event = ?", (contract.address, event)).fetchone()
+            return tuple(row) if row is not None else None
+
+    def sync(self, contract, event: str, from_block: int, to_block: int):
+        """Makes sure all events of one type from a range of blocks are present in the store.
+
+        Only blocks which have not been synced yet (plus the last `reorg_depth` synced blocks)
+        are fetched from the node.
+
+        Args:
+            contract: A `web3.py` contract instance.
+            event: Name of the event.
+            from_block: First block of the range.
+            to_block: Last block of the range.
+        """
+        assert(isinstance(event, str))
+        assert(isinstance(from_block, int))
+        assert(isinstance(to_block, int))
+
+        synced_range = self.synced_range(contract, event)
+        if synced_range is None:
+            self._fetch(contract, event, from_block, to_block, rollback_from=None)
+            return
+
+        first_block, last_block = synced_range
+        if from_block < first_block:
+            self._fetch(contract, event, from_block, first_block - 1, rollback_from=None)
+
+        if to_block > last_block:
+            rollback_from = max(last_block - self.reorg_depth + 1, first_block)
+            self._fetch(contract, event, rollback_from, to_block, rollback_from=rollback_from)
+
+    def past_events(self, contract, event: str, from_block: int, to_block: int, event_filter: dict = None) -> list:
+        """Returns past events of one type, syncing them from the node first if necessary.
+
+        Args:
+            contract: A `web3.py` contract instance.
+            event: Name of the event.
+            from_block: First block of the range.
+            to_block: Last block of the range.
+            event_filter: Optional filter on event arguments, like the `argument_filters` of `web3.py` filters.
+
+        Returns:
+            List of events as decoded by `web3.py`, ordered by block number and log index.
+        """
+        assert(isinstance(event_filter, dict) or (event_filter is None))
+
+        self.sync(contract, event, from_block, to_block)
+
+        event_abi = find_matching_event_abi(contract.abi, event_name=event)
+        data_filter_set, filter_params = construct_event_filter_params(event_abi,
+                                                                       contract_address=contract.address,
+                                                                       argument_filters=event_filter or {})
+
+        query = "SELECT block_number, log_index, block_hash, transaction_hash, transaction_index, " \
+                "topic0, topic1, topic2, topic3, data FROM events " \
+                "WHERE address = ? AND event = ? AND block_number >= ? AND block_number <= ?"
+        arguments = [contract.address, event, from_block, to_block]
+
+        for index, topic in enumerate(filter_params.get('topics', [])):
+            if topic is not None:
+                topics = topic if isinstance(topic, list) else [topic]
+                query += f" AND topic{index} IN ({', '.join('?' * len(topics))})"
+                arguments.extend(topic.lower() for topic in topics)
+
+        query += " ORDER BY block_number, log_index"
+
+        with self._lock:
+            rows = self._connection.execute(query, arguments).fetchall()
+
+        if any(data_filter_set):
+            data_filter_regex = construct_data_filter_regex(data_filter_set)
+            rows = [row for row in rows if data_filter_regex.match(row[9])]
+
+        return [get_event_data(event_abi, self._to_log(contract.address, row)) for row in rows]
+
+    def rollback(self, from_block: int):
+        """Forgets events of all types from a block onwards, for example after a chain reorganization.
+
+        Synced ranges get shrunk accordingly, so the forgotten blocks will be fetched again
+        next time events from them are requested.
+
+        Args:
+            from_block: First block to forget events from.
+        """
+        assert(isinstance(from_block, int))
+
+        self.logger.debug(f"Rolling back events from block {from_block} onwards")
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM events WHERE block_number >= ?", (from_block,))
+            self._connection.execute("UPDATE synced_ranges SET last_block = ? WHERE last_block >= ?",
+                                     (from_block - 1, from_block))
+            self._connection.execute("DELETE FROM synced_ranges WHERE last_block < first_block")
+
+    def _fetch(self, contract, event: str, from_block: int, to_block: int, rollback_from: Optional[int]):
+        self.logger.debug(f"Syncing {event} events of {contract.address} from blocks {from_block}-{to_block}")
+
+        scanner = EventScanner(contract, event, from_block, to_block, decode=False)
+        logs = list(scanner.scan())
+
+        # Deleting the rolled back events, inserting the fetched ones and recording the new synced range
+        # happens in one transaction, so the store never ends up with a range marked as synced but
+        # with events missing from it.
+        with self._lock, self._connection:
+            if rollback_from is not None:
+                self._connection.execute("DELETE FROM events WHERE address = ? AND event = ? AND block_number >= ?",
+                                         (contract.address, event, rollback_from))
+
+            self._connection.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                         [self._to_row(contract.address, event, log) for log in logs])
+
+            self._connection.execute("INSERT OR IGNORE INTO synced_ranges VALUES (?, ?, ?, ?)",
+                                     (contract.address, event, from_block, to_block))
+            self._connection.execute("UPDATE synced_ranges SET first_block = MIN(first_block, ?), "
+                                     "last_block = MAX(last_block, ?) WHERE address = ? AND event = ?",
+                                     (from_block, to_block, contract.address, event))
+
+    @staticmethod
+    def _to_row(address: str, event: str, log) -> tuple:
+        topics = [HexBytes(topic).hex() for topic in log['topics']]
+        topics = topics + [None] * (4 - len(topics))
+        return (address, event, log['blockNumber'], log['logIndex'], HexBytes(log['blockHash']).hex(),
+                HexBytes(log['transactionHash']).hex(), log['transactionIndex'], *topics, log['data'])
+
+    @staticmethod
+    def _to_log(address: str, row: tuple) -> AttributeDict:
+        return AttributeDict({'address': address,
+                              'blockNumber': row[0],
+                              'logIndex': row[1],
+                              'blockHash': HexBytes(row[2]),
+                              'transactionHash': HexBytes(row[3]),
+                              'transactionIndex': row[4],
+                              'topics': [HexBytes(topic) for topic in row[5:9] if topic is not None],
+                              'data': row[9]})
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def __repr__(self):
+        return f"EventStore('{self.path}', reorg_depth={self.reorg_depth})"
+
+
+def enable_event_store(web3: Web3, path: str, reorg_depth: int = 12) -> EventStore:
+    """Enables the persistent event store for a `Web3` instance.
+
+    Once enabled, all `past_...` methods of all pymaker contract classes using this `Web3` instance
+    read events from the store, syncing it with the node first. Calling this function more than once
+    is harmless, the same :py:class:`pymaker.eventstore.EventStore` is returned each time.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+        path: Path to the SQLite database file. Gets created if it does not exist.
+        reorg_depth: Number of most recent synced blocks to fetch again on each sync.
+
+    Returns:
+        The :py:class:`pymaker.eventstore.EventStore` of `web3`.
+    """
+    assert(isinstance(web3, Web3))
+
+    with event_stores_lock:
+        if web3 not in event_stores:
+            event_stores[web3] = EventStore(web3, path, reorg_depth)
+
+        return event_stores[web3]
+
+
+def event_store(web3: Web3) -> Optional[EventStore]:
+    """Returns the event store of a `Web3` instance.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+
+    Returns:
+        The :py:class:`pymaker.eventstore.EventStore` of `web3`, or `None` if it has not been enabled for it.
+    """
+    return event_stores.get(web3)
@@ -15,18 +15,25 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 import logging
 import signal
 import threading
 import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 
 import pytz
 from pymaker.sign import eth_sign
 from web3 import Web3
 
-from pymaker import register_filter_thread, any_filter_thread_present, stop_all_filter_threads, all_filter_threads_alive
-from pymaker.util import AsyncCallback
+from pymaker import register_filter_thread, any_filter_thread_present, stop_all_filter_threads, all_filter_threads_alive, \
+    TransactIntent
+from pymaker.blocks import BlockContext, BlockHistory, BlockSource, default_block_source
+from pymaker.cache import call_cache, enable_call_cache
+from pymaker.eventstore import event_store
+from pymaker.metrics import MetricsSink
+from pymaker.util import AsyncCallback, CoroutineCallback, invoke_callback
 
 
 def trigger_event(event: threading.Event):
@@ -58,6 +65,14 @@ class Lifecycle:
     - waiting for the node to have at least one peer and sync before starting the keeper,
     - checking if the keeper account (`web3.eth.defaultAccount`) is unlocked.
 
+    If view call caching has been enabled for `web3` (see :py:func:`pymaker.cache.enable_call_cache`),
+    `Lifecycle` informs the cache about each new block it receives.
+
+    While watching for new blocks, `Lifecycle` keeps the most recent block headers in a ring buffer
+    (see :py:class:`pymaker.blocks.BlockHistory`) in order to detect chain reorganizations. When one
+    happens, the call cache gets cleared, events from the replaced blocks get removed from the event store
+    (see :py:func:`pymaker.eventstore.enable_event_store`) and the `on_reorg` callback gets called.
+
     Also, once the lifecycle is initialized, keeper starts listening for SIGINT/SIGTERM
     signals and starts a graceful shutdown if it receives any of them.
 
@@ -71,13 +86,26 @@ class Lifecycle:
 
     once called like that, `Lifecycle` will enter an infinite loop.
 
+    Callbacks are run by a bounded pool of threads shared by all `Lifecycle` instances in the process
+    (see :py:func:`pymaker.util.default_callback_executor`), unless a different executor is passed.
+
+    CPU-heavy `on_block` and `every` callbacks can be run in a pool of worker processes instead
+    (see the `in_process` option and `use_process_pool`), so they do not hold the GIL other callbacks need.
+    Worker processes have no connection to the node, so these callbacks get the block context in
+    a pickled form and, instead of sending transactions themselves, return them as
+    :py:class:`pymaker.TransactIntent` objects, which get sent by the keeper process (see `on_intents`).
+
     Attributes:
         web3: Instance of the `Web3` class from `web3.py`. Optional.
+        executor: Executor to run callbacks in. Optional.
     """
     logger = logging.getLogger()
 
-    def __init__(self, web3: Web3 = None):
+    def __init__(self, web3: Web3 = None, executor: Executor = None):
+        assert(isinstance(executor, Executor) or (executor is None))
+
         self.web3 = web3
+        self.executor = executor
 
         self.do_wait_for_sync = True
         self.delay = 0
@@ -85,6 +113,14 @@ class Lifecycle:
         self.startup_function = None
         self.shutdown_function = None
         self.block_function = None
+        self.block_context = False
+        self.block_prefetch = {}
+        self.block_source = None
+        self.block_history = None
+        self.reorg_function = None
+        self.process_executor = None
+        self.intents_function = None
+        self.metrics = MetricsSink()
         self.every_timers = []
         self.event_timers = []
 
@@ -93,12 +129,73 @@ class Lifecycle:
         self.fatal_termination = False
         self._at_least_one_every = False
         self._last_block_time = None
+        self._last_block_number = None
+        self._current_block = None
+        self._current_block_time = None
+        self._syncing = False
+        self._syncing_checked_at = None
         self._on_block_callback = None
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._initialize()
+
+        # Startup phase
+        if self.startup_function:
+            self.logger.info("Executing keeper startup logic")
+            self.startup_function()
+
+        # Bind `on_block`, bind `every`
+        # Enter the main loop
+        self._start_watching_blocks()
+        self._start_every_timers()
+        self._main_loop()
+
+        # Enter shutdown process
+        self.logger.info("Shutting down the keeper")
+
+        # Disable all filters
+        if self.block_source is not None:
+            self.block_source.stop()
+
+        if any_filter_thread_present():
+            self.logger.info("Waiting for all threads to terminate...")
+            stop_all_filter_threads()
+
+        self._finish()
+        self.logger.info("Keeper terminated")
+        exit(10 if self.fatal_termination else 0)
+
+    def _finish(self):
+        # If the `on_block` callback is still running, wait for it to terminate
+        if self._on_block_callback is not None:
+            self.logger.info("Waiting for outstanding callback to terminate...")
+            self._on_block_callback.wait()
+
+        # If any every (timer) callback is still running, wait for it to terminate
+        if len(self.every_timers) > 0:
+            self.logger.info("Waiting for outstanding timers to terminate...")
+            for timer in self.every_timers:
+                timer[1].wait()
+
+        # If any event callback is still running, wait for it to terminate
+        if len(self.event_timers) > 0:
+            self.logger.info("Waiting for outstanding events to terminate...")
+            for timer in self.event_timers:
+                timer[2].wait()
+
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
+
+        # Shutdown phase
+        if self.shutdown_function:
+            self.logger.info("Executing keeper shutdown logic...")
+            self.shutdown_function()
+            self.logger.info("Shutdown logic finished")
+
+    def _initialize(self):
         # Initialization phase
         if self.web3:
             self.logger.info(f"Keeper connected to {self.web3.providers[0]}")
@@ -143,50 +240,6 @@ class Lifecycle:
 
                     time.sleep(0.1)
 
-        # Startup phase
-        if self.startup_function:
-            self.logger.info("Executing keeper startup logic")
-            self.startup_function()
-
-        # Bind `on_block`, bind `every`
-        # Enter the main loop
-        self._start_watching_blocks()
-        self._start_every_timers()
-        self._main_loop()
-
-        # Enter shutdown process
-        self.logger.info("Shutting down the keeper")
-
-        # Disable all filters
-        if any_filter_thread_present():
-            self.logger.info("Waiting for all threads to terminate...")
-            stop_all_filter_threads()
-
-        # If the `on_block` callback is still running, wait for it to terminate
-        if self._on_block_callback is not None:
-            self.logger.info("Waiting for outstanding callback to terminate...")
-            self._on_block_callback.wait()
-
-        # If any every (timer) callback is still running, wait for it to terminate
-        if len(self.every_timers) > 0:
-            self.logger.info("Waiting for outstanding timers to terminate...")
-            for timer in self.every_timers:
-                timer[1].wait()
-
-        # If any event callback is still running, wait for it to terminate
-        if len(self.event_timers) > 0:
-            self.logger.info("Waiting for outstanding events to terminate...")
-            for timer in self.event_timers:
-                timer[2].wait()
-
-        # Shutdown phase
-        if self.shutdown_function:
-            self.logger.info("Executing keeper shutdown logic...")
-            self.shutdown_function()
-            self.logger.info("Shutdown logic finished")
-        self.logger.info("Keeper terminated")
-        exit(10 if self.fatal_termination else 0)
-
     def _wait_for_init(self):
         # In unit-tests waiting for the node to sync does not work correctly.
         # So we skip it.
@@ -277,17 +330,118 @@ class Lifecycle:
 
         self.terminated_internally = True
 
-    def on_block(self, callback):
+    def on_block(self, callback, context: bool = False, prefetch: dict = None, in_process: bool = False):
         """Register the specified callback to be run for each new block received by the node.
 
+        If `context` is `True` or a prefetch list is passed, the callback gets called with
+        a :py:class:`pymaker.blocks.BlockContext` of the block as its only argument. All calls
+        on the prefetch list get executed in one batch before the callback gets called,
+        and their results are available in the context.
+
         Args:
             callback: Function to be called for each new blocks.
+            context: Whether to pass a :py:class:`pymaker.blocks.BlockContext` to the callback.
+            prefetch: Optional prefetch list, see :py:meth:`pymaker.blocks.BlockContext.prefetch`.
+            in_process: Whether to run the callback in a worker process, see `use_process_pool`.
         """
         assert(callable(callback))
+        assert(isinstance(context, bool))
+        assert(isinstance(prefetch, dict) or (prefetch is None))
+        assert(isinstance(in_process, bool))
 
         assert(self.web3 is not None)
         assert(self.block_function is None)
-        self.block_function = callback
+        self.block_function = self._in_process(callback) if in_process else callback
+        self.block_context = context or prefetch is not None
+        self.block_prefetch = prefetch or {}
+
+    def on_reorg(self, callback):
+        """Register the specified callback to be run on each chain reorganization.
+
+        The callback gets called with the depth of the reorganization (number of blocks replaced),
+        the list of replaced block headers and the list of headers replacing them. It runs in the thread
+        watching for new blocks, before the `on_block` callback gets triggered for the new chain,
+        after the call cache and the event store have already been invalidated.
+
+        Reorganizations are only detected while watching for new blocks, but using `on_block`
+        is not necessary for the callback to work.
+
+        Args:
+            callback: Function to be called on each chain reorganization.
+        """
+        assert(callable(callback))
+
+        assert(self.web3 is not None)
+        assert(self.reorg_function is None)
+        self.reorg_function = callback
+
+    def use_process_pool(self, max_workers: int = None):
+        """Run callbacks registered with `in_process=True` in a pool of the specified size.
+
+        If not called, a pool with as many worker processes as there are CPUs gets used.
+        Callbacks run in worker processes (and their arguments and results) have to be picklable,
+        so they are usually module-level functions, not methods of keeper objects holding `Web3`.
+
+        Args:
+            max_workers: Maximum number of worker processes.
+        """
+        assert(isinstance(max_workers, int) or (max_workers is None))
+
+        self.process_executor = ProcessPoolExecutor(max_workers)
+
+    def on_intents(self, callback):
+        """Register the specified callback to handle results of callbacks run in worker processes.
+
+        Whatever a callback run in a worker process returns (apart from `None`) gets passed, as a list,
+        to this callback in the keeper process. If not registered, the results are expected to be
+        :py:class:`pymaker.TransactIntent` objects and get sent as transactions one after another.
+
+        Args:
+            callback: Function to be called with a list of results of a worker process callback.
+        """
+        assert(callable(callback))
+
+        assert(self.intents_function is None)
+        self.intents_function = callback
+
+    def use_metrics(self, metrics: MetricsSink):
+        """Report lifecycle metrics to the specified sink.
+
+        The following metrics get reported:
+        - `pymaker_block_number` (gauge): number of the most recent block received,
+        - `pymaker_block_lag_seconds` (histogram): time between the block timestamp and the block arrival,
+        - `pymaker_blocks_skipped_total` (counter): blocks for which the `on_block` callback has not been called,
+          labelled with `reason` (`busy` if the previous callback was still running, `syncing` or `stale`),
+        - `pymaker_callback_delay_seconds` (histogram): time between a block arrival (or a timer tick or an event)
+          and the callback start, labelled with `callback` (`block`, `timer_1`, `event_1` etc.),
+        - `pymaker_callback_duration_seconds` (histogram): callback run time, labelled with `callback`,
+        - `pymaker_timer_drift_seconds` (histogram): how late `every` timers fire, labelled with `timer`,
+        - `pymaker_filter_thread_restarts_total` (counter): restarts of timer and event threads after
+          a failure and block source fallbacks to polling, labelled with `thread`,
+        - `pymaker_reorgs_total` (counter): chain reorganizations detected,
+        - `pymaker_reorged_blocks_total` (counter): blocks replaced by chain reorganizations.
+
+        Args:
+            metrics: Sink to report metrics to, for example :py:class:`pymaker.metrics.MetricsRegistry`.
+        """
+        assert(isinstance(metrics, MetricsSink))
+
+        self.metrics = metrics
+
+    def use_block_source(self, block_source: BlockSource):
+        """Use the specified source of new blocks for the `on_block` callback.
+
+        If not called, :py:func:`pymaker.blocks.default_block_source` decides on the source
+        depending on the provider `web3` uses. For nodes connected to over WebSocket or IPC
+        new blocks get pushed by the node as soon as they arrive, for other ones they get polled for.
+
+        Args:
+            block_source: Source of new blocks, see :py:mod:`pymaker.blocks`.
+        """
+        assert(isinstance(block_source, BlockSource))
+
+        assert(self.block_source is None)
+        self.block_source = block_source
 
     def on_event(self, event: threading.Event, min_frequency_in_seconds: int, callback):
         """
@@ -303,16 +457,44 @@ class Lifecycle:
         assert(isinstance(min_frequency_in_seconds, int))
         assert(callable(callback))
 
-        self.event_timers.append((event, min_frequency_in_seconds, AsyncCallback(callback)))
+        self.event_timers.append((event, min_frequency_in_seconds, AsyncCallback(callback, self.executor)))
 
-    def every(self, frequency_in_seconds: int, callback):
+    def every(self, frequency_in_seconds: int, callback, in_process: bool = False):
         """Register the specified callback to be called by a timer.
 
         Args:
             frequency_in_seconds: Execution frequency (in seconds).
             callback: Function to be called by the timer.
+            in_process: Whether to run the callback in a worker process, see `use_process_pool`.
         """
-        self.every_timers.append((frequency_in_seconds, AsyncCallback(callback)))
+        assert(isinstance(in_process, bool))
+
+        callback = self._in_process(callback) if in_process else callback
+        self.every_timers.append((frequency_in_seconds, AsyncCallback(callback, self.executor)))
+
+    def _in_process(self, callback):
+        # the callback gets submitted to the process pool from the usual executor, which waits for it
+        # to finish, so callbacks run in processes get triggered and measured the same way as other ones
+        if self.process_executor is None:
+            self.use_process_pool()
+
+        def run(*args):
+            self._handle_intents(self.process_executor.submit(callback, *args).result())
+
+        return run
+
+    def _handle_intents(self, result):
+        intents = result if isinstance(result, list) else [result] if result is not None else []
+        if len(intents) == 0:
+            return
+
+        if self.intents_function:
+            self.intents_function(intents)
+
+        else:
+            for intent in intents:
+                assert(isinstance(intent, TransactIntent))
+                intent.transact(self.web3).transact()
 
     def _sigint_sigterm_handler(self, sig, frame):
         if self.terminated_externally:
@@ -321,47 +503,144 @@ class Lifecycle:
             self.logger.warning("Keeper received SIGINT/SIGTERM signal, will terminate gracefully")
             self.terminated_externally = True
 
-    def _start_watching_blocks(self):
-        def new_block_callback(block_hash):
-            self._last_block_time = datetime.datetime.now(tz=pytz.UTC)
-            block = self.web3.eth.getBlock(block_hash)
-            block_number = block['number']
-            if not self.web3.eth.syncing:
-                max_block_number = self.web3.eth.blockNumber
-                if block_number == max_block_number:
-                    def on_start():
-                        self.logger.debug(f"Processing block #{block_number} ({block_hash.hex()})")
+    def _node_syncing(self) -> bool:
+        # checking it for each block would add a round trip to the node before each block callback
+        if self._syncing_checked_at is None or time.time() - self._syncing_checked_at > 5:
+            self._syncing = bool(self.web3.eth.syncing)
+            self._syncing_checked_at = time.time()
 
-                    def on_finish():
-                        self.logger.debug(f"Finished processing block #{block_number} ({block_hash.hex()})")
+        return self._syncing
 
-                    if not self.terminated_internally and not self.terminated_externally and not self.fatal_termination:
-                        if not self._on_block_callback.trigger(on_start, on_finish):
-                            self.logger.debug(f"Ignoring block #{block_number} ({block_hash.hex()}),"
-                                              f" as previous callback is still running")
-                    else:
-                        self.logger.debug(f"Ignoring block #{block_number} as keeper is already terminating")
-                else:
-                    self.logger.debug(f"Ignoring block #{block_number} ({block_hash.hex()}),"
-                                      f" as there is already block #{max_block_number} available")
-            else:
-                self.logger.info(f"Ignoring block #{block_number} ({block_hash.hex()}), as the node is syncing")
+    def _accept_block(self, block) -> bool:
+        self._last_block_time = datetime.datetime.now(tz=pytz.UTC)
+        self._current_block_time = time.time()
+        block_number = block['number']
+        block_hash = block['hash']
 
-        def new_block_watch():
-            event_filter = self.web3.eth.filter('latest')
-            while True:
-                for event in event_filter.get_new_entries():
-                    new_block_callback(event)
-                time.sleep(1)
+        self.metrics.set('pymaker_block_number', block_number)
+        if block.get('timestamp') is not None:
+            self.metrics.observe('pymaker_block_lag_seconds', self._current_block_time - block['timestamp'])
+
+        cache = call_cache(self.web3)
+        if cache is not None:
+            cache.new_block(block_number)
+
+        if self._node_syncing():
+            self.logger.info(f"Ignoring block #{block_number} ({block_hash.hex()}), as the node is syncing")
+            self.metrics.increment('pymaker_blocks_skipped_total', labels={'reason': 'syncing'})
+            return False
+
+        if self._last_block_number is not None and block_number < self._last_block_number:
+            self.logger.debug(f"Ignoring block #{block_number} ({block_hash.hex()}),"
+                              f" as there is already block #{self._last_block_number} available")
+            self.metrics.increment('pymaker_blocks_skipped_total', labels={'reason': 'stale'})
+            return False
+
+        self._last_block_number = block_number
+        return True
+
+    def _handle_reorg(self, depth: int, old_blocks: list, new_blocks: list):
+        self.logger.warning(f"Chain reorganization detected, {depth} block(s) from block #{old_blocks[0]['number']}"
+                            f" onwards replaced by {len(new_blocks)} new one(s)")
+        self.metrics.increment('pymaker_reorgs_total')
+        self.metrics.increment('pymaker_reorged_blocks_total', depth)
+
+        # the new chain may be shorter than the replaced one, its head must not be ignored as stale
+        self._last_block_number = None
+
+        cache = call_cache(self.web3)
+        if cache is not None:
+            cache.clear()
+
+        store = event_store(self.web3)
+        if store is not None:
+            store.rollback(old_blocks[0]['number'])
+
+        if self.reorg_function:
+            self._invoke_reorg_function(depth, old_blocks, new_blocks)
+
+    def _invoke_reorg_function(self, depth: int, old_blocks: list, new_blocks: list):
+        try:
+            self.reorg_function(depth, old_blocks, new_blocks)
+        except Exception as e:
+            self.logger.exception(f"Reorganization callback failed with an exception: '{e}'")
+
+    def _measured(self, callback: str, since: float, on_start, on_finish) -> tuple:
+        labels = {'callback': callback}
+        start_time = []
+
+        def measured_on_start():
+            start_time.append(time.time())
+            self.metrics.observe('pymaker_callback_delay_seconds', start_time[0] - since, labels)
+            on_start()
+
+        def measured_on_finish():
+            self.metrics.observe('pymaker_callback_duration_seconds', time.time() - start_time[0], labels)
+            on_finish()
+
+        return measured_on_start, measured_on_finish
 
+    def _block_context(self, block) -> BlockContext:
+        if len(self.block_prefetch) > 0:
+            return BlockContext.prefetch(self.web3, block, self.block_prefetch)
+        else:
+            return BlockContext(block)
+
+    def _invoke_block_function(self):
+        # the most recent block gets processed, even if newer one arrived while the callback was queued
+        self.block_function(self._block_context(self._current_block))
+
+    def _terminating(self) -> bool:
+        return self.terminated_internally or self.terminated_externally or self.fatal_termination
+
+    def _new_block_callback(self, block):
+        # called from the thread of the block source
+        reorg = self.block_history.add(block)
+        if reorg is not None:
+            self._handle_reorg(*reorg)
+
+        self._receive_block(block)
+
+    def _receive_block(self, block):
+        if self._accept_block(block) and self._on_block_callback is not None:
+            self._trigger_block_callback(block, self._current_block_time)
+
+    def _trigger_block_callback(self, block, arrival_time: float):
+        self._current_block = block
+        block_number = block['number']
+        block_hash = block['hash']
+
+        def on_start():
+            self.logger.debug(f"Processing block #{block_number} ({block_hash.hex()})")
+
+        def on_finish():
+            self.logger.debug(f"Finished processing block #{block_number} ({block_hash.hex()})")
+
+        on_start, on_finish = self._measured('block', arrival_time, on_start, on_finish)
+
+        if not self._terminating():
+            if not self._on_block_callback.trigger(on_start, on_finish):
+                self.logger.debug(f"Ignoring block #{block_number} ({block_hash.hex()}),"
+                                  f" as previous callback is still running")
+                self.metrics.increment('pymaker_blocks_skipped_total', labels={'reason': 'busy'})
+        else:
+            self.logger.debug(f"Ignoring block #{block_number} as keeper is already terminating")
+
+    def _prepare_block_callback(self):
         if self.block_function:
-            self._on_block_callback = AsyncCallback(self.block_function)
+            block_function = self._invoke_block_function if self.block_context else self.block_function
+            self._on_block_callback = AsyncCallback(block_function, self.executor)
 
-            block_filter = threading.Thread(target=new_block_watch, daemon=True)
-            block_filter.start()
-            register_filter_thread(block_filter)
+    def _start_watching_blocks(self):
+        self._prepare_block_callback()
 
-            self.logger.info("Watching for new blocks")
+        if self.block_function or self.reorg_function:
+            self.block_history = BlockHistory(self.web3)
+            self.block_source = self.block_source or default_block_source(self.web3)
+            self.block_source.metrics = self.metrics
+            register_filter_thread(self.block_source.start(self._new_block_callback))
+
+            self.logger.info(f"Watching for new blocks using {self.block_source}")
 
     def _start_thread_safely(self, t: threading.Thread):
         delay = 10
@@ -388,13 +667,19 @@ class Lifecycle:
             self.logger.info(f"Started {len(self.event_timers)} event(s)")
 
     def _start_every_timer(self, idx: int, frequency_in_seconds: int, callback):
+        scheduled_time = []
+
         def setup_timer(delay):
             timer = threading.Timer(delay, func)
             timer.daemon = True
 
+            scheduled_time[:] = [time.time() + delay]
             self._start_thread_safely(timer)
 
         def func():
+            fire_time = time.time()
+            self.metrics.observe('pymaker_timer_drift_seconds', fire_time - scheduled_time[0], {'timer': str(idx)})
+
             try:
                 if not self.terminated_internally and not self.terminated_externally and not self.fatal_termination:
                     def on_start():
@@ -403,11 +688,13 @@ class Lifecycle:
                     def on_finish():
                         self.logger.debug(f"Finished processing the timer #{idx}")
 
+                    on_start, on_finish = self._measured(f"timer_{idx}", fire_time, on_start, on_finish)
                     if not callback.trigger(on_start, on_finish):
                         self.logger.debug(f"Ignoring timer #{idx} as previous one is already running")
                 else:
                     self.logger.debug(f"Ignoring timer #{idx} as keeper is already terminating")
             except:
+                self.metrics.increment('pymaker_filter_thread_restarts_total', labels={'thread': f"timer_{idx}"})
                 setup_timer(frequency_in_seconds)
                 raise
             setup_timer(frequency_in_seconds)
@@ -433,6 +720,7 @@ class Lifecycle:
                             self.logger.debug(f"Finished processing the event #{idx}" if event_happened
                                               else f"Finished processing the event #{idx} because of minimum frequency")
 
+                        on_start, on_finish = self._measured(f"event_{idx}", time.time(), on_start, on_finish)
                         assert callback.trigger(on_start, on_finish)
                         callback.wait()
 
@@ -440,6 +728,7 @@ class Lifecycle:
                         self.logger.debug(f"Ignoring event #{idx} as keeper is terminating" if event_happened
                                           else f"Ignoring event #{idx} because of minimum frequency as keeper is terminating")
                 except:
+                    self.metrics.increment('pymaker_filter_thread_restarts_total', labels={'thread': f"event_{idx}"})
                     setup_thread()
                     raise
 
@@ -493,3 +782,531 @@ class Lifecycle:
                     self.logger.fatal("No new blocks received for 300 seconds, the keeper will terminate")
                     self.fatal_termination = True
                     break
+
+
+class AsyncLifecycle(Lifecycle):
+    """Keeper lifecycle controller running on a single asyncio event loop.
+
+    Offers the same API as :py:class:`pymaker.lifecycle.Lifecycle`, but instead of a thread per event,
+    a timer thread per timer tick and a thread per callback invocation, everything runs as tasks
+    on one event loop. Only the block source (see :py:mod:`pymaker.blocks`) keeps its own thread,
+    handing new blocks over to the loop. Callbacks can be coroutine functions,
+    which are awaited directly on the loop, or regular functions, which are run in `executor`
+    (or the default executor of the loop if not passed) so they do not block it.
+
+    Same as with `Lifecycle`, a callback never gets invoked while its previous invocation
+    is still running (see :py:class:`pymaker.util.CoroutineCallback`).
+
+    On shutdown, watching for blocks, timers and events get cancelled, then the keeper waits
+    for outstanding callbacks to finish before executing the shutdown logic.
+
+    The typical usage pattern is as follows:
+
+        with AsyncLifecycle(self.web3) as lifecycle:
+            lifecycle.on_startup(self.some_startup_function)
+            lifecycle.on_block(self.do_something_async)
+            lifecycle.every(15, self.do_something_else)
+            lifecycle.on_shutdown(self.some_shutdown_function)
+
+    Attributes:
+        web3: Instance of the `Web3` class from `web3.py`. Optional.
+    """
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._initialize()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        finally:
+            loop.close()
+
+        self.logger.info("Keeper terminated")
+        exit(10 if self.fatal_termination else 0)
+
+    def on_event(self, event: threading.Event, min_frequency_in_seconds: int, callback):
+        """
+        Register the specified callback to be called every time event is triggered,
+        but at least once every `min_frequency_in_seconds`.
+
+        Args:
+            event: Event which should be monitored.
+            min_frequency_in_seconds: Minimum execution frequency (in seconds).
+            callback: Function or coroutine function to be called by the timer.
+        """
+        assert(isinstance(event, threading.Event))
+        assert(isinstance(min_frequency_in_seconds, int))
+        assert(callable(callback))
+
+        self.event_timers.append((event, min_frequency_in_seconds, CoroutineCallback(callback, self.executor)))
+
+    def every(self, frequency_in_seconds: int, callback, in_process: bool = False):
+        """Register the specified callback to be called by a timer.
+
+        Args:
+            frequency_in_seconds: Execution frequency (in seconds).
+            callback: Function or coroutine function to be called by the timer.
+            in_process: Whether to run the callback in a worker process, see `use_process_pool`.
+                Coroutine functions can not be run in worker processes.
+        """
+        assert(isinstance(in_process, bool))
+
+        callback = self._in_process(callback) if in_process else callback
+        self.every_timers.append((frequency_in_seconds, CoroutineCallback(callback, self.executor)))
+
+    async def _run(self):
+        # Startup phase
+        if self.startup_function:
+            self.logger.info("Executing keeper startup logic")
+            await invoke_callback(self.startup_function, executor=self.executor)
+
+        # Bind `on_block`, bind `every`
+        # Enter the main loop
+        self._loop = asyncio.get_event_loop()
+        self._start_watching_blocks()
+        tasks = self._start_every_timers_async()
+        await self._main_loop_async()
+
+        # Enter shutdown process
+        self.logger.info("Shutting down the keeper")
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Disable all filters
+        if self.block_source is not None:
+            self.block_source.stop()
+
+        if any_filter_thread_present():
+            self.logger.info("Waiting for all threads to terminate...")
+            stop_all_filter_threads()
+
+        # If any callback is still running, wait for it to terminate
+        callbacks = ([self._on_block_callback] if self._on_block_callback is not None else []) \
+                    + [timer[1] for timer in self.every_timers] \
+                    + [event_timer[2] for event_timer in self.event_timers]
+
+        if len(callbacks) > 0:
+            self.logger.info("Waiting for outstanding callbacks to terminate...")
+            for callback in callbacks:
+                await callback.wait()
+
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
+
+        # Shutdown phase
+        if self.shutdown_function:
+            self.logger.info("Executing keeper shutdown logic...")
+            await invoke_callback(self.shutdown_function, executor=self.executor)
+            self.logger.info("Shutdown logic finished")
+
+    def _receive_block(self, block):
+        # called from the thread of the block source, blocks are handed over to the event loop
+        if self._accept_block(block) and self._on_block_callback is not None:
+            self._loop.call_soon_threadsafe(self._trigger_block_callback, block, self._current_block_time)
+
+    def _prepare_block_callback(self):
+        if self.block_function:
+            block_function = self._invoke_block_function_async if self.block_context else self.block_function
+            self._on_block_callback = CoroutineCallback(block_function, self.executor)
+
+    def _invoke_reorg_function(self, depth: int, old_blocks: list, new_blocks: list):
+        # called from the thread of the block source, which waits for the callback to finish
+        # so the `on_block` callback never sees the new chain before it does
+        try:
+            callback = invoke_callback(self.reorg_function, depth, old_blocks, new_blocks, executor=self.executor)
+            asyncio.run_coroutine_threadsafe(callback, self._loop).result()
+        except Exception as e:
+            self.logger.exception(f"Reorganization callback failed with an exception: '{e}'")
+
+    async def _invoke_block_function_async(self):
+        context = await invoke_callback(self._block_context, self._current_block, executor=self.executor)
+        await invoke_callback(self.block_function, context, executor=self.executor)
+
+    def _start_every_timers_async(self) -> list:
+        tasks = [asyncio.ensure_future(self._every_timer(idx, timer[0], timer[1]))
+                 for idx, timer in enumerate(self.every_timers, start=1)]
+        tasks += [asyncio.ensure_future(self._event_timer(idx, event_timer[0], event_timer[1], event_timer[2]))
+                  for idx, event_timer in enumerate(self.event_timers, start=1)]
+
+        if len(self.every_timers) > 0:
+            self.logger.info(f"Started {len(self.every_timers)} timer(s)")
+
+        if len(self.event_timers) > 0:
+            self.logger.info(f"Started {len(self.event_timers)} event(s)")
+
+        self._at_least_one_every = len(tasks) > 0
+        return tasks
+
+    async def _every_timer(self, idx: int, frequency_in_seconds: int, callback: CoroutineCallback):
+        scheduled_time = time.time() + 1
+        await asyncio.sleep(1)
+
+        while True:
+            fire_time = time.time()
+            self.metrics.observe('pymaker_timer_drift_seconds', fire_time - scheduled_time, {'timer': str(idx)})
+
+            if not self._terminating():
+                def on_start():
+                    self.logger.debug(f"Processing the timer #{idx}")
+
+                def on_finish():
+                    self.logger.debug(f"Finished processing the timer #{idx}")
+
+                on_start, on_finish = self._measured(f"timer_{idx}", fire_time, on_start, on_finish)
+                if not callback.trigger(on_start, on_finish):
+                    self.logger.debug(f"Ignoring timer #{idx} as previous one is already running")
+            else:
+                self.logger.debug(f"Ignoring timer #{idx} as keeper is already terminating")
+
+            scheduled_time = time.time() + frequency_in_seconds
+            await asyncio.sleep(frequency_in_seconds)
+
+    async def _event_timer(self, idx: int, event: threading.Event, min_frequency_in_seconds: int,
+                           callback: CoroutineCallback):
+        event_happened = False
+
+        while True:
+            if not self._terminating():
+                def on_start():
+                    self.logger.debug(f"Processing the event #{idx}" if event_happened
+                                      else f"Processing the event #{idx} because of minimum frequency")
+
+                def on_finish():
+                    self.logger.debug(f"Finished processing the event #{idx}" if event_happened
+                                      else f"Finished processing the event #{idx} because of minimum frequency")
+
+                on_start, on_finish = self._measured(f"event_{idx}", time.time(), on_start, on_finish)
+                assert callback.trigger(on_start, on_finish)
+                await callback.wait()
+
+            else:
+                self.logger.debug(f"Ignoring event #{idx} as keeper is terminating" if event_happened
+                                  else f"Ignoring event #{idx} because of minimum frequency as keeper is terminating")
+
+            # `threading.Event` can not be awaited, so it gets polled instead
+            deadline = time.time() + min_frequency_in_seconds
+            while not event.is_set() and time.time() < deadline:
+                await asyncio.sleep(0.05)
+
+            event_happened = event.is_set()
+            event.clear()
+
+    async def _main_loop_async(self):
+        # terminate gracefully on either SIGINT or SIGTERM
+        signal.signal(signal.SIGINT, self._sigint_sigterm_handler)
+        signal.signal(signal.SIGTERM, self._sigint_sigterm_handler)
+
+        # same as in `Lifecycle`, in case of no block watching, filters or timers
+        # the keeper will terminate soon after it started
+        while any_filter_thread_present() or self._at_least_one_every:
+            await asyncio.sleep(1)
+
+            # if the keeper logic asked us to terminate, we do so
+            if self.terminated_internally:
+                self.logger.warning("Keeper logic asked for termination, the keeper will terminate")
+                break
+
+            # if SIGINT/SIGTERM asked us to terminate, we do so
+            if self.terminated_externally:
+                self.logger.warning("The keeper is terminating due do SIGINT/SIGTERM signal received")
+                break
+
+            if not all_filter_threads_alive():
+                self.logger.fatal("One of filter threads is dead, the keeper will terminate")
+                self.fatal_termination = True
+                break
+
+            # if we are watching for new blocks and no new block has been reported during
+            # some time, we assume the node has a problem and terminate the keeper
+            if self._last_block_time and (datetime.datetime.now(tz=pytz.UTC) - self._last_block_time).total_seconds() > 300:
+                if not await invoke_callback(lambda: self.web3.eth.syncing):
+                    self.logger.fatal("No new blocks received for 300 seconds, the keeper will terminate")
+                    self.fatal_termination = True
+                    break
+
+
+class Supervisor:
+    """Runs many keeper lifecycles in one process.
+
+    Each keeper is described by its own :py:class:`pymaker.lifecycle.Lifecycle`, configured the usual way
+    (`on_startup`, `on_block`, `every`, `on_shutdown` etc.), but instead of each of them running
+    its own block filter thread and its own main loop, the supervisor runs all of them together:
+    - one block source (see :py:mod:`pymaker.blocks`) watches for new blocks and hands them over to all keepers,
+    - all keepers use the same `Web3` instance, so they share the HTTP connection pool of the node
+      connection and its view call cache (see :py:func:`pymaker.cache.enable_call_cache`),
+    - callbacks of all keepers run in one executor (see :py:func:`pymaker.util.default_callback_executor`).
+
+    Failures are isolated per keeper. A keeper which fails to initialize or whose startup logic raises
+    an exception does not get started, exceptions raised by callbacks are logged. A keeper which asks
+    for termination (see :py:meth:`pymaker.lifecycle.Lifecycle.terminate`) gets shut down on its own,
+    the remaining ones keep running. The supervisor terminates once there are no keepers running,
+    on SIGINT/SIGTERM, or if the block source fails or no new blocks arrive for 300 seconds.
+
+    Only :py:class:`pymaker.lifecycle.Lifecycle` instances can be supervised, not `AsyncLifecycle` ones.
+
+    The typical usage pattern is as follows:
+
+        with Supervisor(web3) as supervisor:
+            for market in markets:
+                keeper = MarketKeeper(web3, market)
+                lifecycle = supervisor.lifecycle(market.name)
+                lifecycle.on_block(keeper.on_block)
+                lifecycle.every(60, keeper.rebalance)
+
+    once called like that, `Supervisor` will enter an infinite loop.
+
+    Attributes:
+        web3: Instance of the `Web3` class from `web3.py`, shared by all keepers.
+        executor: Executor to run callbacks of all keepers in. Optional.
+        use_call_cache: Whether to enable view call caching for `web3`.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, executor: Executor = None, use_call_cache: bool = True):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(executor, Executor) or (executor is None))
+        assert(isinstance(use_call_cache, bool))
+
+        self.web3 = web3
+        self.executor = executor
+        self.use_call_cache = use_call_cache
+
+        self.keepers = []
+        self.block_source = None
+        self.block_history = None
+        self.metrics = MetricsSink()
+
+        self.terminated_externally = False
+        self.fatal_termination = False
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self._finishing = []
+        self._last_block_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.use_call_cache:
+            enable_call_cache(self.web3)
+
+        # Startup phase, all keepers start concurrently so initial delays and checks do not add up
+        self.logger.info(f"Starting {len(self.keepers)} keeper(s)")
+        self._in_threads([(self._start_keeper, name, lifecycle) for name, lifecycle in self.keepers])
+        self.logger.info(f"Started {len(self._running)} out of {len(self.keepers)} keeper(s)")
+
+        # Enter the main loop
+        self._start_watching_blocks()
+        self._main_loop()
+
+        # Enter shutdown process
+        self.logger.info("Shutting down all keepers")
+
+        if self.block_source is not None:
+            self.block_source.stop()
+
+        if any_filter_thread_present():
+            self.logger.info("Waiting for all threads to terminate...")
+            stop_all_filter_threads()
+
+        with self._running_lock:
+            running = list(self._running.items())
+            self._running = {}
+
+        for name, lifecycle in running:
+            lifecycle.terminated_externally = lifecycle.terminated_externally or self.terminated_externally
+            lifecycle.fatal_termination = lifecycle.fatal_termination or self.fatal_termination
+            self._finish_keeper(name, lifecycle)
+
+        for thread in self._finishing:
+            thread.join()
+
+        self.logger.info("All keepers terminated")
+        exit(10 if self.fatal_termination else 0)
+
+    def lifecycle(self, name: str) -> Lifecycle:
+        """Creates a new keeper lifecycle to be run by the supervisor.
+
+        The lifecycle uses the `Web3` instance and the executor of the supervisor.
+
+        Args:
+            name: Name of the keeper, used in logs and as the `keeper` label of metrics.
+
+        Returns:
+            A new :py:class:`pymaker.lifecycle.Lifecycle`, to be configured as usual.
+        """
+        lifecycle = Lifecycle(self.web3, self.executor)
+        self.add(name, lifecycle)
+        return lifecycle
+
+    def add(self, name: str, lifecycle: Lifecycle):
+        """Adds an already created keeper lifecycle to be run by the supervisor.
+
+        The lifecycle has to use the same `Web3` instance as the supervisor (or no `Web3` at all),
+        otherwise it could not share the block source, the connection pool and the call cache.
+
+        Args:
+            name: Name of the keeper, used in logs and as the `keeper` label of metrics.
+            lifecycle: The :py:class:`pymaker.lifecycle.Lifecycle` of the keeper.
+        """
+        assert(isinstance(name, str))
+        assert(isinstance(lifecycle, Lifecycle))
+        assert(not isinstance(lifecycle, AsyncLifecycle))
+        assert(lifecycle.web3 is None or lifecycle.web3 is self.web3)
+        assert(name not in [keeper_name for keeper_name, _ in self.keepers])
+
+        self.keepers.append((name, lifecycle))
+
+    def use_metrics(self, metrics: MetricsSink):
+        """Report metrics of all keepers to the specified sink.
+
+        Metrics of each keeper get reported with a `keeper` label, unless the keeper has been
+        given its own sink (see :py:meth:`pymaker.lifecycle.Lifecycle.use_metrics`).
+
+        Args:
+            metrics: Sink to report metrics to, for example :py:class:`pymaker.metrics.MetricsRegistry`.
+        """
+        assert(isinstance(metrics, MetricsSink))
+
+        self.metrics = metrics
+
+    def use_block_source(self, block_source: BlockSource):
+        """Use the specified source of new blocks for all keepers.
+
+        If not called, :py:func:`pymaker.blocks.default_block_source` decides on the source.
+
+        Args:
+            block_source: Source of new blocks, see :py:mod:`pymaker.blocks`.
+        """
+        assert(isinstance(block_source, BlockSource))
+
+        assert(self.block_source is None)
+        self.block_source = block_source
+
+    @staticmethod
+    def _in_threads(functions: list):
+        threads = [threading.Thread(target=function[0], args=function[1:], daemon=True) for function in functions]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+    def _start_keeper(self, name: str, lifecycle: Lifecycle):
+        if type(lifecycle.metrics) is MetricsSink:
+            lifecycle.metrics = self.metrics.labelled(keeper=name)
+
+        try:
+            lifecycle._initialize()
+
+            if lifecycle.startup_function:
+                self.logger.info(f"Executing startup logic of keeper {name}")
+                lifecycle.startup_function()
+
+            lifecycle._prepare_block_callback()
+            lifecycle._start_every_timers()
+
+        # `Lifecycle` calls `exit()` if the keeper account is not unlocked
+        except BaseException as e:
+            self.logger.exception(f"Keeper {name} failed to start ({e}), it will not be run")
+            return
+
+        # same as with `Lifecycle`, keepers with no blocks, timers or events to wait for terminate right away
+        if not (lifecycle.block_function or lifecycle.reorg_function or lifecycle._at_least_one_every):
+            self._finish_keeper(name, lifecycle)
+            return
+
+        with self._running_lock:
+            self._running[name] = lifecycle
+
+    def _finish_keeper(self, name: str, lifecycle: Lifecycle):
+        def finish():
+            try:
+                lifecycle._finish()
+                self.logger.info(f"Keeper {name} terminated")
+            except BaseException as e:
+                self.logger.exception(f"Keeper {name} failed to shut down cleanly ({e})")
+
+        thread = threading.Thread(target=finish, daemon=True)
+        thread.start()
+        self._finishing.append(thread)
+
+    def _start_watching_blocks(self):
+        if any(lifecycle.block_function or lifecycle.reorg_function for lifecycle in self._running.values()):
+            self.block_history = BlockHistory(self.web3)
+            self.block_source = self.block_source or default_block_source(self.web3)
+            self.block_source.metrics = self.metrics
+            register_filter_thread(self.block_source.start(self._new_block_callback))
+
+            self.logger.info(f"Watching for new blocks for all keepers using {self.block_source}")
+
+    def _new_block_callback(self, block):
+        # called from the thread of the block source, reorganizations are detected once for all keepers
+        self._last_block_time = datetime.datetime.now(tz=pytz.UTC)
+        reorg = self.block_history.add(block)
+
+        with self._running_lock:
+            running = list(self._running.items())
+
+        for name, lifecycle in running:
+            if not (lifecycle.block_function or lifecycle.reorg_function):
+                continue
+
+            try:
+                if reorg is not None:
+                    lifecycle._handle_reorg(*reorg)
+
+                lifecycle._receive_block(block)
+            except Exception as e:
+                self.logger.exception(f"Keeper {name} failed to handle block #{block['number']} ({e})")
+
+    def _sigint_sigterm_handler(self, sig, frame):
+        if self.terminated_externally:
+            self.logger.warning("Graceful termination due to SIGINT/SIGTERM already in progress")
+        else:
+            self.logger.warning("Supervisor received SIGINT/SIGTERM signal, all keepers will terminate gracefully")
+            self.terminated_externally = True
+
+    def _main_loop(self):
+        # terminate gracefully on either SIGINT or SIGTERM
+        signal.signal(signal.SIGINT, self._sigint_sigterm_handler)
+        signal.signal(signal.SIGTERM, self._sigint_sigterm_handler)
+
+        while True:
+            # keepers which asked for termination get shut down, the remaining ones keep running
+            with self._running_lock:
+                terminated = [(name, lifecycle) for name, lifecycle in self._running.items() if lifecycle._terminating()]
+                for name, _ in terminated:
+                    del self._running[name]
+
+                running = len(self._running)
+
+            for name, lifecycle in terminated:
+                self.logger.warning(f"Keeper {name} asked for termination, it will terminate")
+                self._finish_keeper(name, lifecycle)
+
+            if running == 0:
+                self.logger.info("No keepers running anymore")
+                break
+
+            if self.terminated_externally:
+                self.logger.warning("All keepers are terminating due do SIGINT/SIGTERM signal received")
+                break
+
+            if not all_filter_threads_alive():
+                self.logger.fatal("One of filter threads is dead, all keepers will terminate")
+                self.fatal_termination = True
+                break
+
+            if self._last_block_time and (datetime.datetime.now(tz=pytz.UTC) - self._last_block_time).total_seconds() > 300:
+                if not self.web3.eth.syncing:
+                    self.logger.fatal("No new blocks received for 300 seconds, all keepers will terminate")
+                    self.fatal_termination = True
+                    break
+
+            time.sleep(1)
+
+    def __repr__(self):
+        return f"Supervisor({[name for name, _ in self.keepers]})"
@@ -0,0 +1,274 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsSink:
+    """Destination of metrics reported by pymaker components, like :py:class:`pymaker.lifecycle.Lifecycle`.
+
+    This base class discards everything reported to it. Subclasses can forward metrics anywhere
+    (StatsD, logs etc.), :py:class:`pymaker.metrics.MetricsRegistry` keeps them in memory.
+    """
+
+    def increment(self, name: str, value: float = 1, labels: dict = None):
+        """Increments a counter.
+
+        Args:
+            name: Name of the counter.
+            value: Value to increment the counter by.
+            labels: Optional labels, as a dictionary.
+        """
+        pass
+
+    def set(self, name: str, value: float, labels: dict = None):
+        """Sets a gauge to a value.
+
+        Args:
+            name: Name of the gauge.
+            value: New value of the gauge.
+            labels: Optional labels, as a dictionary.
+        """
+        pass
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        """Records an observation in a histogram.
+
+        Args:
+            name: Name of the histogram.
+            value: Observed value.
+            labels: Optional labels, as a dictionary.
+        """
+        pass
+
+    def labelled(self, **labels) -> 'MetricsSink':
+        """Returns a view of this sink adding the specified labels to everything reported through it.
+
+        Useful for telling apart metrics of multiple keepers reporting to one sink.
+        """
+        return LabelledSink(self, labels)
+
+
+class LabelledSink(MetricsSink):
+    """View of a :py:class:`pymaker.metrics.MetricsSink` adding constant labels to all metrics.
+
+    Args:
+        sink: The underlying sink.
+        labels: Labels to be added.
+    """
+    def __init__(self, sink: MetricsSink, labels: dict):
+        assert(isinstance(sink, MetricsSink))
+        assert(isinstance(labels, dict))
+
+        self.sink = sink
+        self.labels = labels
+
+    def _labels(self, labels: Optional[dict]) -> dict:
+        return {**self.labels, **(labels or {})}
+
+    def increment(self, name: str, value: float = 1, labels: dict = None):
+        self.sink.increment(name, value, self._labels(labels))
+
+    def set(self, name: str, value: float, labels: dict = None):
+        self.sink.set(name, value, self._labels(labels))
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        self.sink.observe(name, value, self._labels(labels))
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, as in Prometheus.
+
+    Attributes:
+        buckets: Upper bounds of the buckets, in ascending order (not including the implicit `+Inf` one).
+        counts: Number of observations in each bucket (not cumulative), the last one being `+Inf`.
+        count: Total number of observations.
+        sum: Sum of all observed values.
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def __repr__(self):
+        return f"Histogram(count={self.count}, sum={self.sum})"
+
+
+class MetricsRegistry(MetricsSink):
+    """In-process registry of counters, gauges and histograms.
+
+    Values can be read using `counter()`, `gauge()` and `histogram()`, or rendered in the Prometheus
+    text exposition format using `prometheus_text()` (see :py:class:`pymaker.metrics.PrometheusExporter`).
+
+    Args:
+        buckets: Upper bounds of histogram buckets.
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Optional[dict]) -> tuple:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def increment(self, name: str, value: float = 1, labels: dict = None):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: dict = None):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+
+            self._histograms[key].observe(value)
+
+    def counter(self, name: str, labels: dict = None) -> float:
+        """Returns the current value of a counter, `0` if it has never been incremented."""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name: str, labels: dict = None) -> Optional[float]:
+        """Returns the current value of a gauge, `None` if it has never been set."""
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def histogram(self, name: str, labels: dict = None) -> Optional[Histogram]:
+        """Returns a histogram, `None` if nothing has been observed in it yet."""
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    def prometheus_text(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            All metrics, as text which can be served to Prometheus.
+        """
+        def labels_text(labels: tuple, extra: tuple = ()) -> str:
+            labels = labels + extra
+            if len(labels) == 0:
+                return ''
+
+            def escape(value) -> str:
+                return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+            return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+        def by_name(metrics: dict) -> dict:
+            result = {}
+            for (name, labels), value in sorted(metrics.items(), key=lambda item: str(item[0])):
+                result.setdefault(name, []).append((labels, value))
+            return result
+
+        lines = []
+        with self._lock:
+            for name, series in by_name(self._counters).items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{labels_text(labels)} {value}" for labels, value in series)
+
+            for name, series in by_name(self._gauges).items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{labels_text(labels)} {value}" for labels, value in series)
+
+            for name, series in by_name(self._histograms).items():
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{labels_text(labels, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{labels_text(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{labels_text(labels)} {histogram.count}")
+
+        return '\n'.join(lines) + '\n'
+
+    def __repr__(self):
+        return "MetricsRegistry()"
+
+
+class PrometheusExporter:
+    """Serves metrics from a :py:class:`pymaker.metrics.MetricsRegistry` over HTTP, for Prometheus to scrape.
+
+    The exporter listens on a local port (in a daemon thread) and serves the metrics
+    in the Prometheus text exposition format under `/metrics`.
+
+    Args:
+        registry: The registry to serve metrics from.
+        port: Port to listen on, `0` for any free port.
+        host: Interface to listen on.
+
+    Attributes:
+        port: Port the exporter actually listens on.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = '127.0.0.1'):
+        assert(isinstance(registry, MetricsRegistry))
+        assert(isinstance(port, int))
+        assert(isinstance(host, str))
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = registry.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.registry = registry
+        self._httpd = HTTPServer((host, port), RequestHandler)
+        self.port = self._httpd.server_port
+
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        self.logger.info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+    def stop(self):
+        """Stops serving metrics."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __repr__(self):
+        return f"PrometheusExporter(port={self.port})"
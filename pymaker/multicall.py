@@ -0,0 +1,193 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import List, Tuple
+
+from eth_abi import decode_abi
+from hexbytes import HexBytes
+from web3 import Web3
+
+from pymaker import Contract, Address, Calldata
+from pymaker.batch import Batch
+from pymaker.util import bytes_to_hexstring, make_batch_request
+
+
+class Multicall(Contract):
+    """A client for the `Multicall` contract, which executes multiple view calls within one `eth_call`.
+
+    All calls aggregated this way get executed against exactly the same state, i.e. the results
+    form an atomic snapshot of the blockchain as of the block number returned with them.
+
+    The contract has one function only, `aggregate(bytes)`, which takes a concatenation
+    of (20-byte target address, 32-byte data length, data) records and returns the current block
+    number and a concatenation of (32-byte success flag, 32-byte return data length, return data)
+    records. Each call gets executed using `STATICCALL`. The (hand-assembled) source code of the
+    contract can be found in `abi/Multicall.asm`.
+
+    The most convenient way of using it is through :py:meth:`pymaker.multicall.Multicall.batch`,
+    which works with getters of all pymaker contract classes.
+
+    Attributes:
+        web3: An instance of `Web` from `web3.py`.
+        address: Ethereum address of the `Multicall` contract.
+    """
+
+    abi = Contract._load_abi(__name__, 'abi/Multicall.abi')
+    bin = Contract._load_bin(__name__, 'abi/Multicall.bin')
+
+    @staticmethod
+    def deploy(web3: Web3):
+        return Multicall(web3=web3, address=Contract._deploy(web3, Multicall.abi, Multicall.bin, []))
+
+    def __init__(self, web3: Web3, address: Address):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(address, Address))
+
+        self.web3 = web3
+        self.address = address
+        self._contract = self._get_contract(web3, self.abi, address)
+
+    def aggregate(self, calls: List[Tuple[Address, Calldata]]) -> Tuple[int, List[Tuple[bool, bytes]]]:
+        """Executes multiple view calls within one `eth_call`.
+
+        Args:
+            calls: List of (`address`, `calldata`) tuples, each of them describing one call.
+
+        Returns:
+            A tuple, first element of which is the number of the block the calls have been executed in.
+            The second one is a list of (`success`, `return_data`) tuples, one for each call,
+            in the same order as `calls`.
+        """
+        assert(isinstance(calls, list))
+
+        result = self.web3.eth.call({'to': self.address.address, 'data': self._encode(calls)})
+        return self._decode(result)
+
+    def batch(self) -> 'MulticallBatch':
+        """Creates a new batch of calls, view calls of which will be sent to the node as one `eth_call`.
+
+        See :py:class:`pymaker.multicall.MulticallBatch` for the usage pattern.
+
+        Returns:
+            A new :py:class:`pymaker.multicall.MulticallBatch` instance.
+        """
+        return MulticallBatch(self)
+
+    def _encode(self, calls: List[Tuple[Address, Calldata]]) -> str:
+        packed = bytearray()
+        for address, calldata in calls:
+            assert(isinstance(address, Address))
+            assert(isinstance(calldata, Calldata))
+
+            data = calldata.as_bytes()
+            packed += bytes.fromhex(address.address[2:])
+            packed += len(data).to_bytes(32, byteorder='big')
+            packed += data
+
+        return self._contract.encodeABI(fn_name='aggregate', args=[bytes(packed)])
+
+    @staticmethod
+    def _decode(result: bytes) -> Tuple[int, List[Tuple[bool, bytes]]]:
+        block_number, packed = decode_abi(['uint256', 'bytes'], result)
+
+        results = []
+        position = 0
+        while position < len(packed):
+            success = int.from_bytes(packed[position:position+32], byteorder='big')
+            length = int.from_bytes(packed[position+32:position+64], byteorder='big')
+            results.append((success != 0, packed[position+64:position+64+length]))
+            position += 64 + length
+
+        return block_number, results
+
+    def __repr__(self):
+        return f"Multicall('{self.address}')"
+
+
+class MulticallBatch(Batch):
+    """Executes multiple calls using one `eth_call` to the `Multicall` contract.
+
+    It works exactly like :py:class:`pymaker.batch.Batch`, the only difference being that all
+    `eth_call` requests made against the latest block get aggregated into one `eth_call` to the
+    `Multicall` contract. Other requests (if any) are sent alongside it in the same JSON-RPC batch.
+
+    As the aggregated calls get executed in the same block, their results are always consistent
+    with each other. Bear in mind that they are executed with the `Multicall` contract being
+    their `msg.sender`, so it only makes sense to aggregate calls which do not depend on it.
+
+    The typical usage pattern is as follows:
+
+        with multicall.batch() as b:
+            tab = b.call(tub.tab, cup_id)
+            par = b.call(vox.par)
+
+        print(b.block_number, tab.result(), par.result())
+
+    Attributes:
+        multicall: The :py:class:`pymaker.multicall.Multicall` contract to use.
+        block_number: Number of the block the aggregated calls have been executed in,
+            `None` until the batch gets executed.
+    """
+
+    def __init__(self, multicall: Multicall):
+        assert(isinstance(multicall, Multicall))
+
+        super().__init__(multicall.web3)
+        self.multicall = multicall
+        self.block_number = None
+
+    @staticmethod
+    def _is_aggregatable(method: str, params) -> bool:
+        return method == 'eth_call' \
+               and len(params) == 2 \
+               and params[1] == 'latest' \
+               and 'to' in params[0] \
+               and set(params[0].keys()).issubset({'from', 'to', 'data'})
+
+    def _send(self, requests: list) -> list:
+        aggregated = [index for index, (method, params) in enumerate(requests) if self._is_aggregatable(method, params)]
+        if len(aggregated) == 0:
+            return super()._send(requests)
+
+        others = sorted(set(range(len(requests))) - set(aggregated))
+        calls = [(Address(requests[index][1][0]['to']), Calldata(requests[index][1][0].get('data', '0x')))
+                 for index in aggregated]
+
+        aggregate_request = ('eth_call', [{'to': self.multicall.address.address,
+                                           'data': self.multicall._encode(calls)}, 'latest'])
+        batch_responses = make_batch_request(self.web3, [aggregate_request] + [requests[index] for index in others])
+
+        responses = [None] * len(requests)
+        for index, response in zip(others, batch_responses[1:]):
+            responses[index] = response
+
+        if 'error' in batch_responses[0]:
+            for index in aggregated:
+                responses[index] = batch_responses[0]
+
+        else:
+            self.block_number, results = self.multicall._decode(HexBytes(batch_responses[0]['result']))
+            for index, (success, return_data) in zip(aggregated, results):
+                if success:
+                    responses[index] = {'jsonrpc': '2.0', 'result': bytes_to_hexstring(return_data)}
+                else:
+                    responses[index] = {'jsonrpc': '2.0', 'error': {'code': -32015, 'message': 'Call reverted'}}
+
+        return responses
+
+    def __repr__(self):
+        return f"MulticallBatch({self.multicall})"
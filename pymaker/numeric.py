@@ -23,6 +23,13 @@ from decimal import *
 _context = Context(prec=1000, rounding=ROUND_DOWN)
 
 
+def _div(x: int, y: int) -> int:
+    # Integer division rounding towards zero (like `ROUND_DOWN`), as opposed to `//` which rounds towards
+    # negative infinity. Arithmetic is done on integers only, so the results are always exact.
+    quotient = abs(x) // abs(y)
+    return quotient if (x < 0) == (y < 0) else -quotient
+
+
 @total_ordering
 class Wad:
     """Represents a number with 18 decimal places.
@@ -46,15 +53,16 @@ class Wad:
                 of Maker contracts is used which means that passing `1` will create an instance of `Wad`
                 with a value of `0.000000000000000001'.
         """
-        if isinstance(value, Wad):
+        # `int` goes first, as it is what the arithmetic operators create new instances from
+        if isinstance(value, int):
+            # assert(value >= 0)
+            self.value = value
+        elif isinstance(value, Wad):
             self.value = value.value
         elif isinstance(value, Ray):
-            self.value = int((Decimal(value.value) // (Decimal(10)**Decimal(9))).quantize(1, context=_context))
+            self.value = _div(value.value, 10**9)
         elif isinstance(value, Rad):
-            self.value = int((Decimal(value.value) // (Decimal(10)**Decimal(27))).quantize(1, context=_context))
-        elif isinstance(value, int):
-            # assert(value >= 0)
-            self.value = value
+            self.value = _div(value.value, 10**27)
         else:
             raise ArithmeticError
 
@@ -84,25 +92,23 @@ class Wad:
         else:
             raise ArithmeticError
 
-    # z = cast((uint256(x) * y + WAD / 2) / WAD);
+    # Rounds towards zero, so unlike DSMath `wmul` it is z = (x * y) / WAD
+    # and not z = (x * y + WAD / 2) / WAD.
     def __mul__(self, other):
         if isinstance(other, Wad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
-            return Wad(int(result.quantize(1, context=_context)))
+            return Wad(_div(self.value * other.value, 10**18))
         elif isinstance(other, Ray):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(27))
-            return Wad(int(result.quantize(1, context=_context)))
+            return Wad(_div(self.value * other.value, 10**27))
         elif isinstance(other, Rad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(45))
-            return Wad(int(result.quantize(1, context=_context)))
+            return Wad(_div(self.value * other.value, 10**45))
         elif isinstance(other, int):
-            return Wad(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+            return Wad(self.value * other)
         else:
             raise ArithmeticError
 
     def __truediv__(self, other):
         if isinstance(other, Wad):
-            return Wad(int((Decimal(self.value) * (Decimal(10) ** Decimal(18)) / Decimal(other.value)).quantize(1, context=_context)))
+            return Wad(_div(self.value * 10**18, other.value))
         else:
             raise ArithmeticError
 
@@ -167,15 +173,15 @@ class Ray:
                 of Maker contracts is used which means that passing `1` will create an instance of `Ray`
                 with a value of `0.000000000000000000000000001'.
         """
-        if isinstance(value, Ray):
+        if isinstance(value, int):
+            # assert(value >= 0)
+            self.value = value
+        elif isinstance(value, Ray):
             self.value = value.value
         elif isinstance(value, Wad):
-            self.value = int((Decimal(value.value) * (Decimal(10)**Decimal(9))).quantize(1, context=_context))
+            self.value = value.value * 10**9
         elif isinstance(value, Rad):
-            self.value = int((Decimal(value.value) / (Decimal(10)**Decimal(18))).quantize(1, context=_context))
-        elif isinstance(value, int):
-            # assert(value >= 0)
-            self.value = value
+            self.value = _div(value.value, 10**18)
         else:
             raise ArithmeticError
 
@@ -207,22 +213,19 @@ class Ray:
 
     def __mul__(self, other):
         if isinstance(other, Ray):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(27))
-            return Ray(int(result.quantize(1, context=_context)))
+            return Ray(_div(self.value * other.value, 10**27))
         elif isinstance(other, Wad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
-            return Ray(int(result.quantize(1, context=_context)))
+            return Ray(_div(self.value * other.value, 10**18))
         elif isinstance(other, Rad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(45))
-            return Ray(int(result.quantize(1, context=_context)))
+            return Ray(_div(self.value * other.value, 10**45))
         elif isinstance(other, int):
-            return Ray(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+            return Ray(self.value * other)
         else:
             raise ArithmeticError
 
     def __truediv__(self, other):
         if isinstance(other, Ray):
-            return Ray(int((Decimal(self.value) * (Decimal(10) ** Decimal(27)) / Decimal(other.value)).quantize(1, context=_context)))
+            return Ray(_div(self.value * 10**27, other.value))
         else:
             raise ArithmeticError
 
@@ -287,15 +290,15 @@ class Rad:
                 of Maker contracts is used which means that passing `1` will create an instance of `Rad`
                 with a value of `0.000000000000000000000000000000000000000000001'.
         """
-        if isinstance(value, Rad):
+        if isinstance(value, int):
+            # assert(value >= 0)
+            self.value = value
+        elif isinstance(value, Rad):
             self.value = value.value
         elif isinstance(value, Ray):
-            self.value = int((Decimal(value.value) * (Decimal(10)**Decimal(18))).quantize(1, context=_context))
+            self.value = value.value * 10**18
         elif isinstance(value, Wad):
-            self.value = int((Decimal(value.value) * (Decimal(10)**Decimal(27))).quantize(1, context=_context))
-        elif isinstance(value, int):
-            # assert(value >= 0)
-            self.value = value
+            self.value = value.value * 10**27
         else:
             raise ArithmeticError
 
@@ -327,22 +330,19 @@ class Rad:
 
     def __mul__(self, other):
         if isinstance(other, Rad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(45))
-            return Rad(int(result.quantize(1, context=_context)))
+            return Rad(_div(self.value * other.value, 10**45))
         elif isinstance(other, Ray):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(27))
-            return Rad(int(result.quantize(1, context=_context)))
+            return Rad(_div(self.value * other.value, 10**27))
         elif isinstance(other, Wad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
-            return Rad(int(result.quantize(1, context=_context)))
+            return Rad(_div(self.value * other.value, 10**18))
         elif isinstance(other, int):
-            return Rad(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+            return Rad(self.value * other)
         else:
             raise ArithmeticError
 
     def __truediv__(self, other):
         if isinstance(other, Rad):
-            return Rad(int((Decimal(self.value) * (Decimal(10) ** Decimal(45)) / Decimal(other.value)).quantize(1, context=_context)))
+            return Rad(_div(self.value * 10**45, other.value))
         else:
             raise ArithmeticError
 
@@ -382,3 +382,208 @@ class Rad:
     def max(*args):
         """Returns the higher of the Rad values"""
         return reduce(lambda x, y: x if x > y else y, args[1:], args[0])
+
+
+class _NumericArray:
+    scalar = None
+    decimals = None
+
+    def __init__(self, values):
+        """Creates a new array.
+
+        Args:
+            values: an iterable of instances of the scalar type of the array (or any other types the scalar type
+                can be created from, i.e. `Wad`, `Ray`, `Rad` or integers in the internal representation),
+                or another array.
+        """
+        if isinstance(values, type(self)):
+            self.values = list(values.values)
+        else:
+            self.values = [self.scalar(value).value for value in values]
+
+    @classmethod
+    def from_ints(cls, values: list):
+        """Creates a new array directly from a list of integers in the internal representation.
+
+        It is the cheapest way of creating an array, as the list is used as is (not even copied).
+
+        Args:
+            values: a list of integers, each of them being a value in the internal representation.
+        """
+        array = cls.__new__(cls)
+        array.values = values
+        return array
+
+    @classmethod
+    def from_numbers(cls, numbers):
+        """Creates a new array from an iterable of numbers (ints, floats etc.), like `from_number` does."""
+        return cls.from_ints([cls.scalar.from_number(number).value for number in numbers])
+
+    def to_list(self) -> list:
+        """Returns a list of scalar values held by this array."""
+        scalar = self.scalar
+        return [scalar(value) for value in self.values]
+
+    def _other_values(self, other, required_type=None) -> list:
+        if isinstance(other, _NumericArray) and (required_type is None or isinstance(other, required_type)):
+            if len(other.values) != len(self.values):
+                raise ArithmeticError("Arrays of different lengths")
+            return other.values
+        else:
+            raise ArithmeticError
+
+    @staticmethod
+    def _other_decimals(other) -> int:
+        if isinstance(other, _NumericArray):
+            return other.decimals
+        elif isinstance(other, (Wad, Ray, Rad)):
+            return _decimals[type(other)]
+        else:
+            raise ArithmeticError
+
+    def __add__(self, other):
+        if isinstance(other, self.scalar):
+            return self.from_ints([value + other.value for value in self.values])
+        else:
+            return self.from_ints([x + y for x, y in zip(self.values, self._other_values(other, type(self)))])
+
+    def __sub__(self, other):
+        if isinstance(other, self.scalar):
+            return self.from_ints([value - other.value for value in self.values])
+        else:
+            return self.from_ints([x - y for x, y in zip(self.values, self._other_values(other, type(self)))])
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return self.from_ints([value * other for value in self.values])
+
+        divisor = 10 ** self._other_decimals(other)
+        if isinstance(other, _NumericArray):
+            return self.from_ints([_div(x * y, divisor) for x, y in zip(self.values, self._other_values(other))])
+        else:
+            return self.from_ints([_div(value * other.value, divisor) for value in self.values])
+
+    def __truediv__(self, other):
+        multiplier = 10 ** self.decimals
+        if isinstance(other, self.scalar):
+            return self.from_ints([_div(value * multiplier, other.value) for value in self.values])
+        else:
+            return self.from_ints([_div(x * multiplier, y) for x, y in zip(self.values, self._other_values(other, type(self)))])
+
+    def __abs__(self):
+        return self.from_ints([abs(value) for value in self.values])
+
+    def _compare(self, other, comparison) -> list:
+        if isinstance(other, self.scalar):
+            return [comparison(value, other.value) for value in self.values]
+        else:
+            return [comparison(x, y) for x, y in zip(self.values, self._other_values(other, type(self)))]
+
+    def __lt__(self, other) -> list:
+        return self._compare(other, int.__lt__)
+
+    def __le__(self, other) -> list:
+        return self._compare(other, int.__le__)
+
+    def __gt__(self, other) -> list:
+        return self._compare(other, int.__gt__)
+
+    def __ge__(self, other) -> list:
+        return self._compare(other, int.__ge__)
+
+    def __eq__(self, other):
+        return type(other) == type(self) and other.values == self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        scalar = self.scalar
+        return (scalar(value) for value in self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.from_ints(self.values[index])
+        else:
+            return self.scalar(self.values[index])
+
+    def minimum(self, other):
+        """Returns an array of element-wise lower values of this array and `other` (an array or a scalar)."""
+        if isinstance(other, self.scalar):
+            return self.from_ints([min(value, other.value) for value in self.values])
+        else:
+            return self.from_ints([min(x, y) for x, y in zip(self.values, self._other_values(other, type(self)))])
+
+    def maximum(self, other):
+        """Returns an array of element-wise higher values of this array and `other` (an array or a scalar)."""
+        if isinstance(other, self.scalar):
+            return self.from_ints([max(value, other.value) for value in self.values])
+        else:
+            return self.from_ints([max(x, y) for x, y in zip(self.values, self._other_values(other, type(self)))])
+
+    def min(self):
+        """Returns the lowest value held by this array."""
+        return self.scalar(min(self.values))
+
+    def max(self):
+        """Returns the highest value held by this array."""
+        return self.scalar(max(self.values))
+
+    def sum(self):
+        """Returns the sum of all values held by this array."""
+        return self.scalar(sum(self.values))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.values})"
+
+
+class WadArray(_NumericArray):
+    """Represents an array of numbers with 18 decimal places, i.e. a vector of `Wad` values.
+
+    It makes it possible to do arithmetic on many `Wad` values at once, without creating
+    an instance of `Wad` for each intermediate result. Values are kept as a plain Python list
+    of integers in the `Wad` internal representation (see `values`).
+
+    `WadArray` implements element-wise addition, subtraction, multiplication, division and comparison
+    operators, the rounding being exactly the same as for `Wad`. Either side of each of these operations
+    can be an array of the same length or a scalar, which gets applied to every element. Addition, subtraction,
+    division and comparison only work with another `WadArray` or with `Wad`. Multiplication also works with
+    `RayArray`, `RadArray`, `Ray`, `Rad` and `int`, the result of it always being a `WadArray`.
+
+    Comparison operators return lists of booleans, one for each element. Equality operator compares
+    arrays as a whole though, returning a single boolean.
+
+    Attributes:
+        values: List of integers, each of them being one `Wad` value in its internal representation.
+    """
+    scalar = Wad
+    decimals = 18
+
+
+class RayArray(_NumericArray):
+    """Represents an array of numbers with 27 decimal places, i.e. a vector of `Ray` values.
+
+    Works exactly like `WadArray`, see :py:class:`pymaker.numeric.WadArray` for details.
+    The result of multiplication is always a `RayArray`.
+
+    Attributes:
+        values: List of integers, each of them being one `Ray` value in its internal representation.
+    """
+    scalar = Ray
+    decimals = 27
+
+
+class RadArray(_NumericArray):
+    """Represents an array of numbers with 45 decimal places, i.e. a vector of `Rad` values.
+
+    Works exactly like `WadArray`, see :py:class:`pymaker.numeric.WadArray` for details.
+    The result of multiplication is always a `RadArray`.
+
+    Attributes:
+        values: List of integers, each of them being one `Rad` value in its internal representation.
+    """
+    scalar = Rad
+    decimals = 45
+
+
+_decimals = {Wad: 18, Ray: 27, Rad: 45}
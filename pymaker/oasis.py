@@ -15,17 +15,28 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
+import logging
+import math
+import threading
+from fractions import Fraction
 from pprint import pformat
-from typing import Optional, List, Iterable, Iterator
+from typing import Optional, List, Iterable, Iterator, Tuple
 
+from eth_abi import decode_abi
+from eth_utils import event_abi_to_log_topic
 from hexbytes import HexBytes
 from web3 import Web3
 from web3.utils.events import get_event_data
 
 from pymaker import Contract, Address, Transact, Receipt
+from pymaker.batch import batch
 from pymaker.numeric import Wad
 from pymaker.token import ERC20Token
-from pymaker.util import int_to_bytes32, bytes_to_int
+from pymaker.util import int_to_bytes32, bytes_to_int, hexstring_to_bytes, make_batch_request
+
+order_indexes = {}
+order_indexes_lock = threading.Lock()
 
 
 class Order:
@@ -43,8 +54,14 @@ class Order:
         buy_token: The address of the token the order creator wants to be paid with.
         buy_amount: The price the order creator wants to be paid, denominated in the `buy_token` token.
         timestamp: Date and time when this order has been created, as a unix timestamp.
+        sell_to_buy_price: `pay_amount` divided by `buy_amount`. Calculated on first access and
+            cached until either amount changes, so sorting and filtering many orders by price is cheap.
+        buy_to_sell_price: `buy_amount` divided by `pay_amount`, cached the same way.
     """
 
+    __slots__ = ['_market', 'order_id', 'maker', 'pay_token', '_pay_amount', 'buy_token', '_buy_amount', 'timestamp',
+                 '_sell_to_buy_price', '_buy_to_sell_price']
+
     def __init__(self, market, order_id: int, maker: Address, pay_token: Address, pay_amount: Wad, buy_token: Address,
                  buy_amount: Wad, timestamp: int):
         assert(isinstance(order_id, int))
@@ -64,13 +81,39 @@ class Order:
         self.buy_amount = buy_amount
         self.timestamp = timestamp
 
+    @property
+    def pay_amount(self) -> Wad:
+        return self._pay_amount
+
+    @pay_amount.setter
+    def pay_amount(self, pay_amount: Wad):
+        self._pay_amount = pay_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
+    @property
+    def buy_amount(self) -> Wad:
+        return self._buy_amount
+
+    @buy_amount.setter
+    def buy_amount(self, buy_amount: Wad):
+        self._buy_amount = buy_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
     @property
     def sell_to_buy_price(self) -> Wad:
-        return self.pay_amount / self.buy_amount
+        if self._sell_to_buy_price is None:
+            self._sell_to_buy_price = self._pay_amount / self._buy_amount
+
+        return self._sell_to_buy_price
 
     @property
     def buy_to_sell_price(self) -> Wad:
-        return self.buy_amount / self.pay_amount
+        if self._buy_to_sell_price is None:
+            self._buy_to_sell_price = self._buy_amount / self._pay_amount
+
+        return self._buy_to_sell_price
 
     @property
     def remaining_buy_amount(self) -> Wad:
@@ -88,7 +131,8 @@ class Order:
         return self.order_id
 
     def __repr__(self):
-        return pformat(vars(self))
+        return pformat({name.lstrip('_'): getattr(self, name)
+                        for name in self.__slots__ if not name.endswith('_price')})
 
 
 class LogMake:
@@ -320,7 +364,9 @@ class SimpleMarket(Contract):
         """
         assert(isinstance(order_id, int))
 
-        array = self._contract.call().offers(order_id)
+        return self._to_order(order_id, self._contract.call().offers(order_id))
+
+    def _to_order(self, order_id: int, array: list) -> Optional[Order]:
         if array[5] == 0:
             return None
         else:
@@ -344,8 +390,7 @@ class SimpleMarket(Contract):
         assert((isinstance(pay_token, Address) and isinstance(buy_token, Address))
                or (pay_token is None and buy_token is None))
 
-        orders = [self.get_order(order_id + 1) for order_id in range(self.get_last_order_id())]
-        orders = [order for order in orders if order is not None]
+        orders = self._get_orders(range(1, self.get_last_order_id() + 1))
 
         if pay_token is not None and buy_token is not None:
             orders = list(filter(lambda order: order.pay_token == pay_token and order.buy_token == buy_token, orders))
@@ -363,22 +408,30 @@ class SimpleMarket(Contract):
         """
         assert(isinstance(maker, Address))
 
-        result = []
-        for order_id in range(self.get_last_order_id()):
-            # Query the order.
-            order = self.get_order(order_id + 1)
-            if order is None:
-                continue
+        # We are only interested in orders owned by `maker`. Orders which are already known to be
+        # either inactive or owned by someone else get ruled out straight away by the order index,
+        # so only orders owned by `maker` and orders not seen before get queried.
+        index = order_index(self)
+        index.update()
 
-            # We are only interested in orders owned by `maker`. In case the order is not owned by `maker`,
-            # we add it to `_alien_orders[maker]` so the next time `get_orders_by_maker()` is called
-            # with the same parameter we will be able to rule out these orders straight away.
-            if order.maker != maker:
-                continue
+        order_ids = index.candidates(maker, self.get_last_order_id())
+        orders = self._get_orders(order_ids)
+        index.record(order_ids, orders)
 
-            result.append(order)
+        return [order for order in orders if order.maker == maker]
 
-        return result
+    def _get_orders(self, order_ids) -> List[Order]:
+        # Orders are queried in JSON-RPC batches of 100, instead of one order per round trip.
+        order_ids = list(order_ids)
+        orders = []
+
+        for index in range(0, len(order_ids), 100):
+            with batch(self.web3) as b:
+                futures = [b.call(self.get_order, order_id) for order_id in order_ids[index:index+100]]
+
+            orders.extend(order for order in (future.result() for future in futures) if order is not None)
+
+        return orders
 
     def make(self, pay_token: Address, pay_amount: Wad, buy_token: Address, buy_amount: Wad) -> Transact:
         """Create a new order.
@@ -525,6 +578,8 @@ class MatchingMarket(ExpiringMarket):
     bin = Contract._load_bin(__name__, 'abi/MatchingMarket.bin')
 
     abi_support = Contract._load_abi(__name__, 'abi/MakerOtcSupportMethods.abi')
+    get_offers_output_types = [output['type'] for output in [abi for abi in abi_support
+                                                             if abi.get('name') == 'getOffers'][0]['outputs']]
 
     def __init__(self, web3: Web3, address: Address, support_address: Optional[Address] = None):
         assert(isinstance(support_address, Address) or (support_address is None))
@@ -534,6 +589,7 @@ class MatchingMarket(ExpiringMarket):
         self.support_address = support_address
         self._support_contract = self._get_contract(web3, self.abi_support, self.support_address) \
             if self.support_address else None
+        self._order_book = None
 
     @staticmethod
     def deploy(web3: Web3, close_time: int, support_address: Optional[Address] = None):
@@ -550,6 +606,22 @@ class MatchingMarket(ExpiringMarket):
         return MatchingMarket(web3=web3, address=Contract._deploy(web3, MatchingMarket.abi, MatchingMarket.bin,
                                                                   [close_time]), support_address=support_address)
 
+    def use_order_book(self, order_book):
+        """Makes `make()` calculate insertion positions using a local order book.
+
+        Positions then get calculated without any calls to the node (see `position()`). Orders placed
+        with `make()` get added to the order book as soon as their receipts arrive, so positions of
+        subsequent orders take them into account even before the book gets updated with the next block.
+
+        Args:
+            order_book: The :py:class:`pymaker.oasis.OasisOrderBook` of this market. It has to be
+                kept up to date by calling its `update()` method.
+        """
+        assert(isinstance(order_book, OasisOrderBook))
+        assert(order_book.market.address == self.address)
+
+        self._order_book = order_book
+
     def is_buy_enabled(self) -> bool:
         """Checks if direct buy is enabled.
 
@@ -633,45 +705,105 @@ class MatchingMarket(ExpiringMarket):
                or (pay_token is None and buy_token is None))
 
         if pay_token is not None and buy_token is not None:
-            orders = []
-
-            if self._support_contract:
-                result = self._support_contract.call().getOffers(self.address.address, pay_token.address, buy_token.address)
-
-                while True:
-                    count = 0
-                    for i in range(0, 100):
-                        if result[3][i] != '0x0000000000000000000000000000000000000000':
-                            count += 1
-
-                            orders.append(Order(market=self,
-                                                order_id=result[0][i],
-                                                maker=Address(result[3][i]),
-                                                pay_token=pay_token,
-                                                pay_amount=Wad(result[1][i]),
-                                                buy_token=buy_token,
-                                                buy_amount=Wad(result[2][i]),
-                                                timestamp=result[4][i]))
-
-                    if count == 100:
-                        next_order_id = self._contract.call().getWorseOffer(orders[-1].order_id)
-                        result = self._support_contract.call().getOffers(self.address.address, next_order_id)
-
-                    else:
+            orders = self.get_orders_for_pairs([(pay_token, buy_token)])[(pay_token, buy_token)]
+            return sorted(orders, key=lambda order: order.order_id)
+        else:
+            return super(ExpiringMarket, self).get_orders(pay_token, buy_token)
+
+    def get_orders_for_pairs(self, pairs: List[Tuple[Address, Address]], block_number: int = None) -> dict:
+        """Get all active orders of many token pairs.
+
+        If the `MakerOtcSupportMethods` contract is configured, orders of all pairs get fetched together,
+        each JSON-RPC batch carrying the next page of sorted orders of every pair not fully fetched yet.
+        As each page starts with the last order of the previous one, no `getWorseOffer` calls are needed
+        in between. Pages get decoded straight from the raw `eth_call` results. Fetching both sides
+        of a market at once takes as many round trips as fetching the longer one.
+
+        Args:
+            pairs: List of `(pay_token, buy_token)` token pairs.
+            block_number: Number of the block to fetch orders as of, the latest block if not passed.
+                All pages get fetched as of the same block if it is passed.
+
+        Returns:
+            Dictionary mapping each token pair to the list of its orders, sorted from the best
+            to the worst price (as in the sorted list of the market).
+        """
+        assert(isinstance(pairs, list))
+        assert(isinstance(block_number, int) or (block_number is None))
+
+        if self._support_contract:
+            return self._get_orders_through_support_contract(pairs, hex(block_number) if block_number is not None
+                                                             else 'latest')
+
+        # without the support contract, orders have to be fetched one by one, walking the sorted lists
+        block_identifier = block_number if block_number is not None else 'latest'
+        result = {}
+        for pay_token, buy_token in pairs:
+            result[(pay_token, buy_token)] = []
+
+            order_id = self._contract.functions.getBestOffer(pay_token.address, buy_token.address) \
+                .call(block_identifier=block_identifier)
+            while order_id != 0:
+                order = self._to_order(order_id, self._contract.functions.offers(order_id)
+                                       .call(block_identifier=block_identifier))
+                if order is not None:
+                    result[(pay_token, buy_token)].append(order)
+
+                order_id = self._contract.functions.getWorseOffer(order_id).call(block_identifier=block_identifier)
+
+        return result
+
+    def _get_orders_through_support_contract(self, pairs: list, block_identifier: str) -> dict:
+        result = {pair: [] for pair in pairs}
+        requests = {pair: (None, self._support_contract.encodeABI('getOffers', [self.address.address,
+                                                                               pair[0].address,
+                                                                               pair[1].address]))
+                    for pair in pairs}
+
+        while len(requests) > 0:
+            pending = list(requests.items())
+            responses = make_batch_request(self.web3, [('eth_call', [{'to': self.support_address.address, 'data': data},
+                                                                     block_identifier])
+                                                       for _, (_, data) in pending])
+            requests = {}
+
+            for ((pay_token, buy_token), (last_order_id, _)), response in zip(pending, responses):
+                if 'error' in response:
+                    raise ValueError(response['error'])
+
+                ids, pay_amounts, buy_amounts, owners, timestamps = decode_abi(self.get_offers_output_types,
+                                                                               hexstring_to_bytes(response['result']))
+
+                # pages following the first one start with the last order of the previous page. If that order
+                # is not there anymore (which can only happen if pages are fetched as of the latest block),
+                # its place in the list is unknown, so orders of the pair have to be fetched from scratch
+                if last_order_id is not None and ids[0] != last_order_id:
+                    self.logger.debug(f"Order #{last_order_id} is gone, fetching orders of the pair again")
+                    result[(pay_token, buy_token)] = []
+                    requests[(pay_token, buy_token)] = (None, self._support_contract.encodeABI(
+                        'getOffers', [self.address.address, pay_token.address, buy_token.address]))
+                    continue
+
+                orders = result[(pay_token, buy_token)]
+                for index in range(0 if last_order_id is None else 1, len(ids)):
+                    if ids[index] == 0:
                         break
 
-            else:
-                order_id = self._contract.call().getBestOffer(pay_token.address, buy_token.address)
-                while order_id != 0:
-                    order = self.get_order(order_id)
-                    if order is not None:
-                        orders.append(order)
+                    orders.append(Order(market=self,
+                                        order_id=ids[index],
+                                        maker=Address(owners[index]),
+                                        pay_token=pay_token,
+                                        pay_amount=Wad(pay_amounts[index]),
+                                        buy_token=buy_token,
+                                        buy_amount=Wad(buy_amounts[index]),
+                                        timestamp=timestamps[index]))
 
-                    order_id = self._contract.call().getWorseOffer(order_id)
+                # a full page means there can be more orders after it
+                if ids[-1] != 0:
+                    requests[(pay_token, buy_token)] = (ids[-1], self._support_contract.encodeABI(
+                        'getOffers', [self.address.address, ids[-1]]))
 
-            return sorted(orders, key=lambda order: order.order_id)
-        else:
-            return super(ExpiringMarket, self).get_orders(pay_token, buy_token)
+        return result
 
     def make(self, pay_token: Address, pay_amount: Wad, buy_token: Address, buy_amount: Wad, pos: int = None) -> Transact:
         """Create a new order.
@@ -718,10 +850,16 @@ class MatchingMarket(ExpiringMarket):
         else:
             assert(pos >= 0)
 
+        def result_function(receipt):
+            if self._order_book is not None:
+                self._order_book.apply_receipt(receipt)
+
+            return self._make_order_id_result_function(receipt)
+
         return Transact(self, self.web3, self.abi, self.address, self._contract,
                         'offer(uint256,address,uint256,address,uint256)',
                         [pay_amount.value, pay_token.address, buy_amount.value, buy_token.address, pos], None,
-                        self._make_order_id_result_function)
+                        result_function)
 
     def position(self, pay_token: Address, pay_amount: Wad, buy_token: Address, buy_amount: Wad) -> int:
         """Calculate the position (`pos`) new order should be inserted at to minimize gas costs.
@@ -738,6 +876,10 @@ class MatchingMarket(ExpiringMarket):
         This method is responsible for calculating the correct insertion position. It is used internally
         by `make` when `pos` argument is omitted (or is `None`).
 
+        If an order book is in use (see `use_order_book()`), the position gets found in its sorted
+        price index with a binary search, without any calls to the node. Otherwise all orders of the pair
+        have to be fetched first. Prices are compared as exact fractions either way.
+
         Args:
             pay_token: Address of the ERC20 token you want to put on sale.
             pay_amount: Amount of the `pay_token` token you want to put on sale.
@@ -752,15 +894,560 @@ class MatchingMarket(ExpiringMarket):
         assert(isinstance(buy_token, Address))
         assert(isinstance(buy_amount, Wad))
 
+        if self._order_book is not None:
+            return self._order_book.position(pay_token, pay_amount, buy_token, buy_amount)
+
         self.logger.debug("Enumerating orders for position calculation...")
 
-        orders = filter(lambda order: order.pay_amount / order.buy_amount >= pay_amount / buy_amount,
-                        self.get_orders(pay_token, buy_token))
+        # the new order has to be placed after the worst order which is still not worse than the new one
+        price = (Fraction(buy_amount.value, pay_amount.value), math.inf)
+        prices = [(Fraction(order.buy_amount.value, order.pay_amount.value), order.order_id)
+                  for order in self.get_orders(pay_token, buy_token)]
 
         self.logger.debug("Enumerating orders for position calculation finished")
 
-        sorted_orders = sorted(orders, key=lambda o: o.pay_amount / o.buy_amount)
-        return sorted_orders[0].order_id if len(sorted_orders) > 0 else 0
+        return max(filter(lambda key: key <= price, prices), default=(None, 0))[1]
 
     def __repr__(self):
         return f"MatchingMarket('{self.address}')"
+
+
+# all markets emit the same events, so the `SimpleMarket` ABI can be used to decode events of any of them
+market_event_classes = {'LogMake': LogMake, 'LogBump': LogBump, 'LogTake': LogTake, 'LogKill': LogKill}
+market_event_abis = {HexBytes(event_abi_to_log_topic(abi)): (abi, market_event_classes[abi['name']])
+                     for abi in SimpleMarket.abi if abi.get('type') == 'event' and abi['name'] in market_event_classes}
+
+
+def market_events(market: SimpleMarket, from_block: int, to_block: int) -> list:
+    """Fetches all `LogMake`, `LogBump`, `LogTake` and `LogKill` events emitted by a market in a range of blocks.
+
+    All of them get fetched with one `eth_getLogs` call, which makes this function well suited for following
+    a market block by block. Large ranges are better scanned with `past_make()` and similar methods.
+
+    Args:
+        market: The `OasisDEX` market.
+        from_block: First block of the range.
+        to_block: Last block of the range.
+
+    Returns:
+        Events as instances of :py:class:`pymaker.oasis.LogMake`, :py:class:`pymaker.oasis.LogBump`,
+        :py:class:`pymaker.oasis.LogTake` and :py:class:`pymaker.oasis.LogKill`, in the order
+        they have been emitted in.
+    """
+    assert(isinstance(market, SimpleMarket))
+    assert(isinstance(from_block, int))
+    assert(isinstance(to_block, int))
+
+    logs = market.web3.eth.getLogs({'address': market.address.address,
+                                    'fromBlock': from_block,
+                                    'toBlock': to_block,
+                                    'topics': [[topic.hex() for topic in market_event_abis]]})
+
+    events = []
+    for log in sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+        event_abi, cls = market_event_abis[HexBytes(log['topics'][0])]
+        events.append(cls(get_event_data(event_abi, log)))
+
+    return events
+
+
+class OasisOrderBook:
+    """In-memory order book of an `OasisDEX` market, kept up to date from market events.
+
+    Enumerating orders through a market contract costs at least one call per order, or even
+    one call per order ever created (most of them long gone) if the market is a plain `SimpleMarket`.
+    The order book enumerates them only once, when it gets bootstrapped, and then keeps itself up to date
+    by applying `LogMake`, `LogBump`, `LogTake` and `LogKill` events emitted by the market, fetched with
+    one `eth_getLogs` call per update. Reading orders from it does not involve the node at all.
+
+    If `pairs` are passed, only orders of these token pairs get tracked. Bootstrapping a `MatchingMarket`
+    then enumerates the sorted lists of these pairs (through the `MakerOtcSupportMethods` contract if
+    configured), otherwise all orders get fetched in JSON-RPC batches.
+
+    Orders of each token pair are kept sorted by price, best (i.e. the lowest `buy_to_sell_price`,
+    as in the sorted lists of `MatchingMarket`) first. Prices are compared as exact fractions,
+    so orders with equal prices never get reordered due to rounding.
+
+    Every `check_interval` blocks, orders kept by the book get compared with the ones on the chain.
+    If they differ, which can only happen if some events have been missed, a warning gets logged and
+    the book gets replaced with the orders read from the chain. Chain reorganizations cannot be
+    undone using events, so the book has to be bootstrapped again after each of them.
+
+    The typical usage pattern is as follows:
+
+        book = OasisOrderBook(otc, pairs=[(weth, dai), (dai, weth)])
+        lifecycle.on_reorg(book.handle_reorg)
+
+        def on_block():
+            book.update()
+            bids = book.get_orders(dai, weth)
+
+    Attributes:
+        market: The `OasisDEX` market, either a :py:class:`pymaker.oasis.SimpleMarket`
+            or one of its subclasses.
+        pairs: List of `(pay_token, buy_token)` token pairs to track orders of. All orders
+            get tracked if `None`.
+        check_interval: Number of blocks between consistency checks against the chain,
+            `None` meaning no checks.
+        last_block: Number of the last block the book is up to date with, `None` if the book
+            has not been bootstrapped yet.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, market: SimpleMarket, pairs: List[Tuple[Address, Address]] = None,
+                 check_interval: Optional[int] = 100):
+        assert(isinstance(market, SimpleMarket))
+        assert(isinstance(pairs, list) or (pairs is None))
+        assert(isinstance(check_interval, int) or (check_interval is None))
+
+        self.market = market
+        self.pairs = pairs
+        self.check_interval = check_interval
+        self.last_block = None
+        self.last_check_block = None
+
+        self._orders = {}
+        self._prices = {}
+        self._pairs = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.RLock()
+
+    def bootstrap(self):
+        """Fetches all active orders from the chain, replacing the ones kept by the book."""
+        with self._sync_lock:
+            block_number, orders = self._fetch_orders()
+
+            with self._lock:
+                self._replace(orders)
+                self.last_block = block_number
+                self.last_check_block = block_number
+
+            self.logger.info(f"Bootstrapped the order book of {self.market} with {len(orders)} orders"
+                             f" as of block #{block_number}")
+
+    def update(self, to_block: int = None):
+        """Applies events emitted by the market since the last update.
+
+        Bootstraps the book first if it has not been bootstrapped yet, and checks its consistency
+        against the chain if the last check happened at least `check_interval` blocks ago.
+
+        Args:
+            to_block: Number of the block to bring the book up to date with. The latest block if not passed.
+        """
+        assert(isinstance(to_block, int) or (to_block is None))
+
+        with self._sync_lock:
+            if self.last_block is None:
+                self.bootstrap()
+
+            if to_block is None:
+                to_block = self.market.web3.eth.blockNumber
+
+            if to_block > self.last_block:
+                events = market_events(self.market, self.last_block + 1, to_block)
+
+                with self._lock:
+                    for event in events:
+                        self._apply(event)
+
+                    self.last_block = to_block
+
+            if self.check_interval is not None and self.last_block - self.last_check_block >= self.check_interval:
+                self.check()
+
+    def apply(self, event):
+        """Applies a single market event to the book.
+
+        Events get applied automatically by `update()`. This method allows to apply events known
+        in advance, for example the `LogMake` events of orders just placed (see `LogMake.from_receipt`),
+        so they are reflected in the book straight away. Applying an event twice is harmless for all event
+        types except `LogTake`.
+
+        Args:
+            event: Event to apply, an instance of :py:class:`pymaker.oasis.LogMake`, :py:class:`pymaker.oasis.LogBump`,
+                :py:class:`pymaker.oasis.LogTake` or :py:class:`pymaker.oasis.LogKill`.
+        """
+        assert(isinstance(event, (LogMake, LogBump, LogTake, LogKill)))
+
+        with self._lock:
+            self._apply(event)
+
+    def apply_receipt(self, receipt: Receipt):
+        """Adds orders created by a transaction to the book.
+
+        Only `LogMake` events get applied, and only if the transaction has been mined in a block
+        the book is not up to date with yet, so the events will be applied again by the next update
+        after the ones preceding them. Orders taken by the transaction get updated by the next update.
+
+        Args:
+            receipt: Receipt of the transaction.
+        """
+        assert(isinstance(receipt, Receipt))
+
+        with self._lock:
+            if self.last_block is not None and receipt.raw_receipt['blockNumber'] > self.last_block:
+                for event in LogMake.from_receipt(receipt):
+                    self._apply(event)
+
+    def position(self, pay_token: Address, pay_amount: Wad, buy_token: Address, buy_amount: Wad) -> int:
+        """Calculates the position a new order should be inserted at in the sorted list of a `MatchingMarket`.
+
+        See :py:meth:`pymaker.oasis.MatchingMarket.position`. It takes a binary search over the sorted
+        prices of the pair.
+
+        Args:
+            pay_token: Address of the ERC20 token you want to put on sale.
+            pay_amount: Amount of the `pay_token` token you want to put on sale.
+            buy_token: Address of the ERC20 token you want to be paid with.
+            buy_amount: Amount of the `buy_token` you want to receive.
+
+        Returns:
+            Id of the worst order of the pair which is still not worse than the new one, or `0` if there is none.
+        """
+        assert(isinstance(pay_token, Address))
+        assert(isinstance(pay_amount, Wad))
+        assert(isinstance(buy_token, Address))
+        assert(isinstance(buy_amount, Wad))
+
+        with self._lock:
+            prices = self._pairs.get((pay_token, buy_token), [])
+            index = bisect.bisect_right(prices, (Fraction(buy_amount.value, pay_amount.value), math.inf))
+
+            return prices[index - 1][1] if index > 0 else 0
+
+    def check(self) -> bool:
+        """Compares orders kept by the book with the ones on the chain.
+
+        If they differ, the book gets replaced with the orders from the chain. The check gets skipped
+        if a new block has been mined while orders were being fetched, as the book would not be
+        comparable with them.
+
+        Returns:
+            `True` if the book was consistent with the chain (or the check has been skipped), `False` otherwise.
+        """
+        with self._sync_lock:
+            block_number, orders = self._fetch_orders(attempts=1)
+            if block_number != self.last_block:
+                self.logger.debug(f"Skipping the consistency check of the order book of {self.market},"
+                                  f" as the book is up to date with block #{self.last_block}"
+                                  f" and orders have been fetched as of block #{block_number}")
+                return True
+
+            with self._lock:
+                self.last_check_block = block_number
+
+                expected = {order.order_id: self._state(order) for order in orders}
+                actual = {order.order_id: self._state(order) for order in self._orders.values()}
+                if expected == actual:
+                    return True
+
+                self.logger.warning(f"Order book of {self.market} is inconsistent with the chain as of"
+                                    f" block #{block_number} ({len(actual)} orders kept, {len(expected)} orders"
+                                    f" on the chain), replacing it with orders from the chain")
+                self._replace(orders)
+                return False
+
+    def handle_reorg(self, depth: int, old_blocks: list, new_blocks: list):
+        """Bootstraps the book again after a chain reorganization.
+
+        Its signature matches `on_reorg` callbacks of :py:class:`pymaker.lifecycle.Lifecycle`.
+        """
+        self.logger.info(f"Chain reorganization of depth {depth} detected, bootstrapping the order book again")
+        self.bootstrap()
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Returns an active order.
+
+        Args:
+            order_id: The id of the order.
+
+        Returns:
+            An instance of `Order` if the order is active, `None` otherwise.
+        """
+        assert(isinstance(order_id, int))
+
+        return self._orders.get(order_id)
+
+    def get_orders(self, pay_token: Address = None, buy_token: Address = None) -> List[Order]:
+        """Returns active orders.
+
+        Either none or both of `pay_token` and `buy_token` have to be specified.
+
+        Args:
+            pay_token: Address of the `pay_token` to filter the orders by.
+            buy_token: Address of the `buy_token` to filter the orders by.
+
+        Returns:
+            Orders of the pair sorted from the best to the worst price if the pair has been specified,
+            all orders sorted by their ids otherwise.
+        """
+        assert((isinstance(pay_token, Address) and isinstance(buy_token, Address))
+               or (pay_token is None and buy_token is None))
+
+        with self._lock:
+            if pay_token is not None and buy_token is not None:
+                return [self._orders[order_id] for _, order_id in self._pairs.get((pay_token, buy_token), [])]
+            else:
+                return sorted(self._orders.values(), key=lambda order: order.order_id)
+
+    def get_orders_by_maker(self, maker: Address) -> List[Order]:
+        """Returns active orders created by `maker`, sorted by their ids.
+
+        Args:
+            maker: Address of the `maker` to filter the orders by.
+        """
+        assert(isinstance(maker, Address))
+
+        return [order for order in self.get_orders() if order.maker == maker]
+
+    def get_best_order(self, pay_token: Address, buy_token: Address) -> Optional[Order]:
+        """Returns the order of a token pair with the best price.
+
+        Args:
+            pay_token: Address of the `pay_token` of the pair.
+            buy_token: Address of the `buy_token` of the pair.
+
+        Returns:
+            The order with the lowest `buy_to_sell_price`, or `None` if there are no orders of the pair.
+        """
+        assert(isinstance(pay_token, Address))
+        assert(isinstance(buy_token, Address))
+
+        with self._lock:
+            prices = self._pairs.get((pay_token, buy_token))
+            return self._orders[prices[0][1]] if prices else None
+
+    def get_price_levels(self, pay_token: Address, buy_token: Address) -> List[Tuple[Wad, Wad]]:
+        """Returns price levels of a token pair, i.e. orders aggregated by price.
+
+        Args:
+            pay_token: Address of the `pay_token` of the pair.
+            buy_token: Address of the `buy_token` of the pair.
+
+        Returns:
+            List of `(buy_to_sell_price, pay_amount)` tuples, `pay_amount` being the total `pay_amount`
+            of all orders with that price, sorted from the best to the worst price.
+        """
+        levels = []
+        last_price = None
+        for order in self.get_orders(pay_token, buy_token):
+            price = self._price(order)
+            if price == last_price:
+                levels[-1] = (levels[-1][0], levels[-1][1] + order.pay_amount)
+            else:
+                levels.append((order.buy_to_sell_price, order.pay_amount))
+                last_price = price
+
+        return levels
+
+    def _fetch_orders(self, attempts: int = 3) -> Tuple[int, List[Order]]:
+        for attempt in range(attempts):
+            block_number = self.market.web3.eth.blockNumber
+
+            # sorted lists of a `MatchingMarket` can be fetched as of a particular block
+            if self.pairs is not None and isinstance(self.market, MatchingMarket):
+                orders = self.market.get_orders_for_pairs(self.pairs, block_number)
+                return block_number, [order for pair in self.pairs for order in orders[pair]]
+
+            # other orders are fetched again if a block has been mined in the meantime, as it is
+            # not known then which of the blocks they reflect, so which events to apply next
+            orders = self.market.get_orders()
+            if self.market.web3.eth.blockNumber == block_number:
+                break
+
+        return block_number, [order for order in orders if self._tracks(order.pay_token, order.buy_token)]
+
+    def _apply(self, event):
+        if isinstance(event, (LogMake, LogBump)):
+            if self._tracks(event.pay_token, event.buy_token):
+                self._remove(event.order_id)
+                self._add(Order(market=self.market, order_id=event.order_id, maker=event.maker,
+                                pay_token=event.pay_token, pay_amount=event.pay_amount,
+                                buy_token=event.buy_token, buy_amount=event.buy_amount,
+                                timestamp=event.timestamp))
+
+        elif isinstance(event, LogTake):
+            order = self._remove(event.order_id)
+
+            # the market deletes orders once their whole `pay_amount` has been taken
+            if order is not None and order.pay_amount > event.take_amount:
+                self._add(Order(market=self.market, order_id=order.order_id, maker=order.maker,
+                                pay_token=order.pay_token, pay_amount=order.pay_amount - event.take_amount,
+                                buy_token=order.buy_token, buy_amount=order.buy_amount - event.give_amount,
+                                timestamp=order.timestamp))
+
+        elif isinstance(event, LogKill):
+            self._remove(event.order_id)
+
+    def _add(self, order: Order):
+        pair = (order.pay_token, order.buy_token)
+        key = (self._price(order), order.order_id)
+
+        self._orders[order.order_id] = order
+        self._prices[order.order_id] = key
+        bisect.insort(self._pairs.setdefault(pair, []), key)
+
+    def _remove(self, order_id: int) -> Optional[Order]:
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            prices = self._pairs[(order.pay_token, order.buy_token)]
+            del prices[bisect.bisect_left(prices, self._prices.pop(order_id))]
+
+        return order
+
+    def _replace(self, orders: List[Order]):
+        self._orders = {}
+        self._prices = {}
+        self._pairs = {}
+
+        for order in orders:
+            self._add(order)
+
+    def _tracks(self, pay_token: Address, buy_token: Address) -> bool:
+        return self.pairs is None or (pay_token, buy_token) in self.pairs
+
+    @staticmethod
+    def _price(order: Order) -> Fraction:
+        return Fraction(order.buy_amount.value, order.pay_amount.value)
+
+    @staticmethod
+    def _state(order: Order) -> tuple:
+        return order.maker, order.pay_token, order.pay_amount, order.buy_token, order.buy_amount
+
+    def __repr__(self):
+        return f"OasisOrderBook({self.market}, orders={len(self._orders)}, last_block={self.last_block})"
+
+
+class OrderIndex:
+    """Index of the owners of active orders of an `OasisDEX` market.
+
+    Order ids are never reused and owners of orders never change, so once an order has been seen
+    it is known who owns it, and once it has been seen inactive it is known it will stay inactive
+    forever. The index records owners of all active orders seen, orders with ids up to `last_order_id`
+    missing from it being known to be inactive. It lets :py:meth:`pymaker.oasis.SimpleMarket.get_orders_by_maker`
+    query only orders owned by the maker in question and orders created since the previous call.
+
+    The index gets kept up to date using market events. `LogMake` events tell the owners of new orders,
+    so these do not have to be queried, and `LogKill` events tell which orders have become inactive.
+    Orders of the maker in question are queried anyway, so the ones completely taken (see `LogTake`)
+    get ruled out by the query. Events only save queries and are never needed for the index to be
+    correct, so if the previous update happened more than `max_event_blocks` blocks ago, new orders
+    just get queried instead.
+
+    There is one index per market, shared by all market instances of it (see :py:func:`pymaker.oasis.order_index`).
+    It is kept in memory for the lifetime of the process.
+
+    Attributes:
+        market: The `OasisDEX` market.
+        max_event_blocks: Maximum number of blocks to fetch events from in one update.
+        last_order_id: Id of the last order indexed.
+        last_block: Number of the last block events have been applied from, `None` if no update happened yet.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, market: SimpleMarket, max_event_blocks: int = 10000):
+        assert(isinstance(market, SimpleMarket))
+        assert(isinstance(max_event_blocks, int))
+
+        self.market = market
+        self.max_event_blocks = max_event_blocks
+        self.last_order_id = 0
+        self.last_block = None
+
+        self._makers = {}
+        self._orders_by_maker = {}
+        self._lock = threading.RLock()
+
+    def update(self):
+        """Applies market events emitted since the previous update."""
+        with self._lock:
+            block_number = self.market.web3.eth.blockNumber
+
+            if self.last_block is not None and 0 < block_number - self.last_block <= self.max_event_blocks:
+                for event in market_events(self.market, self.last_block + 1, block_number):
+                    self._apply(event)
+
+            self.last_block = max(block_number, self.last_block or 0)
+
+    def candidates(self, maker: Address, last_order_id: int) -> List[int]:
+        """Returns ids of orders which can be active orders owned by `maker`.
+
+        Args:
+            maker: Address of the maker.
+            last_order_id: Id of the last order created on the market.
+
+        Returns:
+            Ids of active orders owned by `maker` and of orders not indexed yet, sorted.
+        """
+        assert(isinstance(maker, Address))
+        assert(isinstance(last_order_id, int))
+
+        with self._lock:
+            return sorted(self._orders_by_maker.get(maker, set())) + \
+                   list(range(self.last_order_id + 1, last_order_id + 1))
+
+    def record(self, order_ids: List[int], orders: List[Order]):
+        """Records results of querying orders.
+
+        Args:
+            order_ids: Ids of orders queried.
+            orders: Orders found active, all other queried ones being inactive.
+        """
+        assert(isinstance(order_ids, list))
+        assert(isinstance(orders, list))
+
+        with self._lock:
+            for order_id in set(order_ids) - set(order.order_id for order in orders):
+                self._remove(order_id)
+
+            for order in orders:
+                self._add(order.order_id, order.maker)
+
+            self.last_order_id = max([self.last_order_id] + order_ids)
+
+    def reset(self):
+        """Forgets all orders, for example after a chain reorganization."""
+        with self._lock:
+            self.last_order_id = 0
+            self.last_block = None
+            self._makers = {}
+            self._orders_by_maker = {}
+
+    def _apply(self, event):
+        if isinstance(event, LogMake):
+            self._add(event.order_id, event.maker)
+            self.last_order_id = max(self.last_order_id, event.order_id)
+
+        elif isinstance(event, LogKill):
+            self._remove(event.order_id)
+
+    def _add(self, order_id: int, maker: Address):
+        self._makers[order_id] = maker
+        self._orders_by_maker.setdefault(maker, set()).add(order_id)
+
+    def _remove(self, order_id: int):
+        maker = self._makers.pop(order_id, None)
+        if maker is not None:
+            self._orders_by_maker[maker].discard(order_id)
+
+    def __repr__(self):
+        return f"OrderIndex({self.market}, active_orders={len(self._makers)}, last_order_id={self.last_order_id})"
+
+
+def order_index(market: SimpleMarket) -> OrderIndex:
+    """Returns the order index of a market, creating it if it does not exist yet.
+
+    Args:
+        market: The `OasisDEX` market.
+
+    Returns:
+        The :py:class:`pymaker.oasis.OrderIndex` of `market`, shared by all instances of it using the same `Web3`.
+    """
+    assert(isinstance(market, SimpleMarket))
+
+    with order_indexes_lock:
+        key = (market.web3, market.address)
+        if key not in order_indexes:
+            order_indexes[key] = OrderIndex(market)
+
+        return order_indexes[key]
@@ -0,0 +1,282 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from web3 import HTTPProvider
+
+http_session = None
+http_session_lock = threading.Lock()
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def pooled_session(pool_size: int = 32, max_retries: int = 3, backoff_factor: float = 0.3,
+                   status_forcelist: tuple = (502, 503, 504)) -> requests.Session:
+    """Creates a `requests.Session` keeping connections alive and retrying failed requests.
+
+    Connections to each host are kept in a pool and reused by subsequent requests, so only
+    the first request to a host pays for the TCP (and TLS) handshake. Responses get requested
+    compressed with gzip (and decompressed transparently).
+
+    Requests failing to connect are retried regardless of their method. Requests which have
+    already been sent are only retried (on read errors or on `status_forcelist` responses)
+    if their method is idempotent, so POST requests never get sent twice. Delays between retries
+    grow exponentially, starting from `backoff_factor` seconds.
+
+    Args:
+        pool_size: Maximum number of connections kept alive per host.
+        max_retries: Maximum number of retries of each request.
+        backoff_factor: Backoff factor for delays between retries (in seconds).
+        status_forcelist: HTTP status codes of responses which make idempotent requests to be retried.
+
+    Returns:
+        A new `requests.Session`.
+    """
+    assert(isinstance(pool_size, int))
+    assert(isinstance(max_retries, int))
+    assert(isinstance(backoff_factor, (int, float)))
+    assert(isinstance(status_forcelist, tuple))
+
+    retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=status_forcelist,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+def default_session() -> requests.Session:
+    """Returns the `requests.Session` shared by all HTTP clients in the process.
+
+    It gets created with default parameters (see :py:func:`pymaker.transport.pooled_session`)
+    the first time it is needed.
+
+    Returns:
+        The shared `requests.Session`.
+    """
+    global http_session
+
+    with http_session_lock:
+        if http_session is None:
+            http_session = pooled_session()
+
+        return http_session
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """`HTTPProvider` sending JSON-RPC requests through a pooled `requests.Session`.
+
+    Unlike the `HTTPProvider` of `web3.py`, which uses a default session per endpoint, it uses
+    a session with a configurable connection pool and retries (see :py:func:`pymaker.transport.pooled_session`).
+    JSON-RPC batches (see :py:func:`pymaker.util.make_batch_request`) use the same session.
+
+    Args:
+        endpoint_uri: URI of the node.
+        request_kwargs: Keyword arguments passed to `requests` with each request.
+        session: Session to send requests through. The process-wide one is used if not passed.
+    """
+    def __init__(self, endpoint_uri: str = None, request_kwargs: dict = None, session: requests.Session = None):
+        assert(isinstance(session, requests.Session) or (session is None))
+
+        super().__init__(endpoint_uri, request_kwargs)
+        self.session = session or default_session()
+
+    def post(self, data: bytes) -> bytes:
+        """Posts raw data to the node.
+
+        Args:
+            data: Body of the request.
+
+        Returns:
+            Body of the response.
+        """
+        kwargs = self.get_request_kwargs()
+        kwargs.setdefault('timeout', 10)
+
+        response = self.session.post(self.endpoint_uri, data=data, **kwargs)
+        response.raise_for_status()
+        return response.content
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s", self.endpoint_uri, method)
+        response = self.decode_rpc_response(self.post(self.encode_rpc_request(method, params)))
+        self.logger.debug("Getting response HTTP. URI: %s, Method: %s, Response: %s", self.endpoint_uri, method, response)
+        return response
+
+    def __str__(self):
+        return f"Pooled RPC connection {self.endpoint_uri}"
+
+
+def pooled_http_provider(endpoint_uri: str, timeout: float = 10, pool_size: int = 32,
+                         max_retries: int = 3) -> PooledHTTPProvider:
+    """Creates an `HTTPProvider` for `web3.py` keeping connections to the node alive.
+
+    The typical usage pattern is as follows:
+
+        web3 = Web3(pooled_http_provider("http://localhost:8545", timeout=60))
+
+    Args:
+        endpoint_uri: URI of the node.
+        timeout: Timeout of each request (in seconds).
+        pool_size: Maximum number of connections to the node kept alive.
+        max_retries: Maximum number of retries of each request, see :py:func:`pymaker.transport.pooled_session`.
+
+    Returns:
+        A new :py:class:`pymaker.transport.PooledHTTPProvider`, with its own session.
+    """
+    assert(isinstance(endpoint_uri, str))
+    assert(isinstance(timeout, (int, float)))
+
+    return PooledHTTPProvider(endpoint_uri, request_kwargs={'timeout': timeout},
+                              session=pooled_session(pool_size=pool_size, max_retries=max_retries))
+
+
+class RateLimiter:
+    """Token bucket limiting the rate at which requests get sent.
+
+    Requests can be sent at most `rate` per second on average, with bursts of up to `burst` requests.
+    Each request reserves its slot up front, so the limiter can be shared by threads and event loops.
+
+    Attributes:
+        rate: Maximum average number of requests per second.
+        burst: Maximum number of requests which can be sent at once.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        assert(isinstance(rate, (int, float)))
+        assert(rate > 0)
+        assert(isinstance(burst, int))
+        assert(burst > 0)
+
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Reserves a slot for one request.
+
+        Returns:
+            Time to wait before sending the request (in seconds).
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait(self):
+        """Waits (blocking) until a request can be sent."""
+        time.sleep(self.reserve())
+
+    async def acquire(self):
+        """Waits (without blocking the event loop) until a request can be sent."""
+        await asyncio.sleep(self.reserve())
+
+    def __repr__(self):
+        return f"RateLimiter(rate={self.rate}, burst={self.burst})"
+
+
+def rate_limiter(key: str, rate: float, burst: int = 1) -> RateLimiter:
+    """Returns the rate limiter shared by all clients of a server.
+
+    Args:
+        key: Identifies the server, usually its base URL.
+        rate: Maximum average number of requests per second. Only used if the limiter does not exist yet.
+        burst: Maximum number of requests which can be sent at once. Only used if the limiter does not exist yet.
+
+    Returns:
+        The :py:class:`pymaker.transport.RateLimiter` of the server.
+    """
+    assert(isinstance(key, str))
+
+    with rate_limiters_lock:
+        if key not in rate_limiters:
+            rate_limiters[key] = RateLimiter(rate, burst)
+
+        return rate_limiters[key]
+
+
+class AsyncClient:
+    """Base of asyncio counterparts of blocking HTTP API clients.
+
+    Methods of the blocking client get run in a dedicated pool of `max_concurrency` threads, so at most
+    that many requests are in flight at once, however many coroutines are awaiting responses.
+    Requests can also be rate limited, the limit being shared by all clients of the same server
+    (see :py:func:`pymaker.transport.rate_limiter`).
+
+    Args:
+        client: The blocking client.
+        api_server: Base URL of the server, identifying its rate limiter.
+        max_concurrency: Maximum number of requests in flight at once.
+        requests_per_second: Maximum average number of requests per second sent to the server. Optional.
+    """
+    def __init__(self, client, api_server: str, max_concurrency: int = 8, requests_per_second: float = None):
+        assert(isinstance(api_server, str))
+        assert(isinstance(max_concurrency, int))
+        assert(max_concurrency > 0)
+        assert(isinstance(requests_per_second, (int, float)) or (requests_per_second is None))
+
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter(api_server, requests_per_second) if requests_per_second is not None else None
+
+        self._executor = ThreadPoolExecutor(max_concurrency)
+
+    async def _call(self, function, *args, **kwargs):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+
+        return await asyncio.get_event_loop().run_in_executor(self._executor, partial(function, *args, **kwargs))
+
+    async def _all_pages(self, function, *args, per_page: int) -> list:
+        # the first page is fetched on its own, as most of the time it is the only one,
+        # further pages are fetched `max_concurrency` at a time until one of them is not full
+        items = await self._call(function, *args, per_page=per_page, page=1)
+        page = 2
+
+        while len(items) == (page - 1) * per_page:
+            pages = await asyncio.gather(*[self._call(function, *args, per_page=per_page, page=number)
+                                           for number in range(page, page + self.max_concurrency)])
+
+            for result in pages:
+                items.extend(result)
+                if len(result) < per_page:
+                    return items
+
+            page += self.max_concurrency
+
+        return items
+
+    def close(self):
+        """Releases the threads of the client."""
+        self._executor.shutdown(wait=False)
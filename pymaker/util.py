@@ -16,12 +16,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import json
 import logging
 import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait as wait_for_futures
 
-from web3 import Web3
+from web3 import Web3, HTTPProvider
+from web3.utils.request import make_post_request
 
 from pymaker.numeric import Wad
+from pymaker.transport import PooledHTTPProvider
 
 
 def chain(web3: Web3) -> str:
@@ -54,6 +59,54 @@ def synchronize(futures) -> list:
         return []
 
 
+def make_batch_request(web3: Web3, requests: list) -> list:
+    """Sends multiple JSON-RPC requests to the node in one go.
+
+    If `web3` is connected to the node through an `HTTPProvider`, all requests are sent
+    as one JSON-RPC batch i.e. in one HTTP round trip. For other providers they are sent
+    one by one, so the results are the same regardless of the provider used.
+
+    Web3.py middlewares are bypassed, so neither `params` nor the results get formatted
+    in any way. Both of them are exactly what goes over the wire.
+
+    Args:
+        web3: An instance of `Web3` from `web3.py`.
+        requests: List of (`method`, `params`) tuples.
+
+    Returns:
+        List of raw JSON-RPC responses, in the same order as `requests`. Each response
+        is a dictionary with either a `result` or an `error` key.
+    """
+    assert(isinstance(web3, Web3))
+    assert(isinstance(requests, list))
+
+    if len(requests) == 0:
+        return []
+
+    provider = web3.providers[0]
+    if isinstance(provider, HTTPProvider):
+        batch = [{"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+                 for request_id, (method, params) in enumerate(requests)]
+
+        if isinstance(provider, PooledHTTPProvider):
+            raw_response = provider.post(json.dumps(batch).encode('utf-8'))
+        else:
+            raw_response = make_post_request(provider.endpoint_uri, json.dumps(batch).encode('utf-8'),
+                                             **provider.get_request_kwargs())
+        responses = json.loads(raw_response.decode('utf-8'))
+
+        # Nodes which do not support batches respond with a single error object
+        if not isinstance(responses, list):
+            raise ValueError(responses.get('error', responses))
+
+        responses_by_id = {response.get('id'): response for response in responses}
+        return [responses_by_id.get(request_id, {'error': 'No response received'})
+                for request_id in range(len(requests))]
+
+    else:
+        return [provider.make_request(method, params) for method, params in requests]
+
+
 def eth_balance(web3: Web3, address) -> Wad:
     return Wad(web3.eth.getBalance(address.address))
 
@@ -96,11 +149,34 @@ def hexstring_to_bytes(value: str) -> bytes:
     return Web3.toBytes(hexstr=value)
 
 
+callback_executor = None
+callback_executor_lock = threading.Lock()
+
+
+def default_callback_executor() -> Executor:
+    """Returns the executor shared by all :py:class:`pymaker.util.AsyncCallback` instances
+    which have not been given an executor of their own.
+
+    It is a bounded pool of threads, created on first use and reused afterwards, so all
+    `Lifecycle` instances running in one process share the same threads.
+
+    Returns:
+        The default callback executor.
+    """
+    global callback_executor
+
+    with callback_executor_lock:
+        if callback_executor is None:
+            callback_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='pymaker-callback')
+
+        return callback_executor
+
+
 class AsyncCallback:
     """Decouples callback invocation from the web3.py filter.
 
     Decouples callback invocation from the web3.py filter by executing the callback
-    in a dedicated thread. If we make web3.py trigger the callback directly, and the callback
+    in a separate thread. If we make web3.py trigger the callback directly, and the callback
     execution takes more than 60 seconds, the `eth_getFilterChanges` call also will not
     get called for 60 seconds and more which will make the filter expire in Parity side.
     It's 60 seconds for Parity, this could be a different value for other nodes,
@@ -109,12 +185,34 @@ class AsyncCallback:
     Invoking the callback logic in a separate thread allows the web3.py Filter thread
     to keep calling `eth_getFilterChanges` regularly, so the filter stays active.
 
+    Callbacks are run by an executor, by default the one shared by the whole process
+    (see :py:func:`pymaker.util.default_callback_executor`), so no new thread gets created
+    for each invocation. As the executor is bounded, an invocation may have to wait in its
+    queue before it starts. Both that wait and the callback run time get measured.
+
     Attributes:
         callback: The callback function to be invoked in a separate thread.
+        executor: Executor running the callback, `None` for the default one.
+        invocations: Number of finished callback invocations.
+        queue_time: Time the most recent invocation waited for the executor (in seconds).
+        run_time: Run time of the most recent finished invocation (in seconds).
+        total_queue_time: Total time all invocations waited for the executor (in seconds).
+        total_run_time: Total run time of all finished invocations (in seconds).
     """
-    def __init__(self, callback):
+    logger = logging.getLogger()
+
+    def __init__(self, callback, executor: Executor = None):
+        assert(isinstance(executor, Executor) or (executor is None))
+
         self.callback = callback
-        self.thread = None
+        self.executor = executor
+        self.future = None
+
+        self.invocations = 0
+        self.queue_time = None
+        self.run_time = None
+        self.total_queue_time = 0.0
+        self.total_run_time = 0.0
 
     def trigger(self, on_start=None, on_finish=None) -> bool:
         """Invokes the callback in a separate thread, unless one is already running.
@@ -131,22 +229,36 @@ class AsyncCallback:
             `True` if callback has been invoked, or if it invocation attempt failed.
             `False` if the previous callback invocation still hasn't finished.
         """
-        if self.thread is None or not self.thread.is_alive():
-            def thread_target():
-                if on_start is not None:
-                    on_start()
-                self.callback()
-                if on_finish is not None:
-                    on_finish()
-
-            self.thread = threading.Thread(target=thread_target)
+        if self.future is None or self.future.done():
+            submit_time = time.time()
+
+            def target():
+                start_time = time.time()
+                self.queue_time = start_time - submit_time
+                self.total_queue_time += self.queue_time
+
+                try:
+                    if on_start is not None:
+                        on_start()
+                    self.callback()
+                    if on_finish is not None:
+                        on_finish()
+                except:
+                    self.logger.exception(f"Async callback {self.callback} failed")
+                finally:
+                    self.run_time = time.time() - start_time
+                    self.total_run_time += self.run_time
+                    self.invocations += 1
+
+                    self.logger.debug(f"Async callback {self.callback} waited {self.queue_time:.3f}s"
+                                      f" in the queue and ran for {self.run_time:.3f}s")
 
             try:
-                self.thread.start()
+                self.future = (self.executor or default_callback_executor()).submit(target)
             except Exception as e:
-                self.thread = None
+                self.future = None
 
-                logging.critical(f"Failed to start the async callback thread ({e})")
+                logging.critical(f"Failed to start the async callback ({e})")
 
             return True
         else:
@@ -156,5 +268,90 @@ class AsyncCallback:
         """Waits for the currently running callback to finish.
 
         If the callback isn't running or hasn't even been invoked once, returns instantly."""
-        if self.thread is not None:
-            self.thread.join()
+        if self.future is not None:
+            wait_for_futures([self.future])
+
+
+async def invoke_callback(callback, *args, executor: Executor = None):
+    """Invokes a callback from within an asyncio event loop.
+
+    Coroutine functions get awaited directly. Regular functions get run in `executor` (or the default
+    executor of the event loop if not specified), so they do not block the loop while running.
+
+    Arguments:
+        callback: Either a coroutine function or a regular function.
+        args: Arguments to invoke the callback with.
+        executor: Optional executor to run regular functions in.
+
+    Returns:
+        Value returned by the callback.
+    """
+    if asyncio.iscoroutinefunction(callback):
+        return await callback(*args)
+    else:
+        return await asyncio.get_event_loop().run_in_executor(executor, callback, *args)
+
+
+class CoroutineCallback:
+    """Asyncio counterpart of :py:class:`pymaker.util.AsyncCallback`.
+
+    Invokes the callback as a task on the running event loop (see :py:func:`pymaker.util.invoke_callback`),
+    unless the previous invocation is still running. Exceptions raised by the callback get logged.
+
+    Attributes:
+        callback: The callback function (or coroutine function) to be invoked.
+        executor: Executor running regular functions, `None` for the default executor of the event loop.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, callback, executor: Executor = None):
+        assert(isinstance(executor, Executor) or (executor is None))
+
+        self.callback = callback
+        self.executor = executor
+        self.task = None
+
+    def trigger(self, on_start=None, on_finish=None) -> bool:
+        """Invokes the callback as a new task, unless the previous invocation is still running.
+
+        Has to be called from within a running event loop.
+
+        Arguments:
+            on_start: Optional method to be called before the actual callback. Can be `None`.
+            on_finish: Optional method to be called after the actual callback. Can be `None`.
+
+        Returns:
+            `True` if callback has been invoked.
+            `False` if the previous callback invocation still hasn't finished.
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run(on_start, on_finish))
+            return True
+        else:
+            return False
+
+    async def _run(self, on_start, on_finish):
+        try:
+            if on_start is not None:
+                on_start()
+            await invoke_callback(self.callback, executor=self.executor)
+            if on_finish is not None:
+                on_finish()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Callback {self.callback} failed ({e})")
+
+    async def wait(self):
+        """Waits for the currently running callback to finish.
+
+        If the callback isn't running or hasn't even been invoked once, returns instantly."""
+        if self.task is not None:
+            await asyncio.wait([self.task])
+
+    def cancel(self):
+        """Cancels the currently running callback, if any.
+
+        Only coroutine functions can be cancelled, regular functions get to run until they finish."""
+        if self.task is not None:
+            self.task.cancel()
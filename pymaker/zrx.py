@@ -16,11 +16,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import array
+import asyncio
 import copy
 import logging
 import random
 from pprint import pformat
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import requests
 from hexbytes import HexBytes
@@ -31,10 +32,15 @@ from pymaker import Contract, Address, Transact
 from pymaker.numeric import Wad
 from pymaker.sign import eth_sign, to_vrs
 from pymaker.token import ERC20Token
+from pymaker.transport import default_session, AsyncClient
 from pymaker.util import bytes_to_hexstring, hexstring_to_bytes, http_response_summary
 
 
 class Order:
+    __slots__ = ['_exchange', 'maker', 'taker', 'maker_fee', 'taker_fee', 'pay_token', '_pay_amount', 'buy_token',
+                 '_buy_amount', 'salt', 'fee_recipient', 'expiration', 'exchange_contract_address', 'ec_signature_r',
+                 'ec_signature_s', 'ec_signature_v', '_sell_to_buy_price', '_buy_to_sell_price']
+
     def __init__(self, exchange, maker: Address, taker: Address, maker_fee: Wad, taker_fee: Wad, pay_token: Address,
                  pay_amount: Wad, buy_token: Address, buy_amount: Wad, salt: int, fee_recipient: Address,
                  expiration: int, exchange_contract_address: Address, ec_signature_r: Optional[str],
@@ -77,13 +83,39 @@ class Order:
     def order_id(self):
         return hash(self)
 
+    @property
+    def pay_amount(self) -> Wad:
+        return self._pay_amount
+
+    @pay_amount.setter
+    def pay_amount(self, pay_amount: Wad):
+        self._pay_amount = pay_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
+    @property
+    def buy_amount(self) -> Wad:
+        return self._buy_amount
+
+    @buy_amount.setter
+    def buy_amount(self, buy_amount: Wad):
+        self._buy_amount = buy_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
     @property
     def sell_to_buy_price(self) -> Wad:
-        return self.pay_amount / self.buy_amount
+        if self._sell_to_buy_price is None:
+            self._sell_to_buy_price = self._pay_amount / self._buy_amount
+
+        return self._sell_to_buy_price
 
     @property
     def buy_to_sell_price(self) -> Wad:
-        return self.buy_amount / self.pay_amount
+        if self._buy_to_sell_price is None:
+            self._buy_to_sell_price = self._buy_amount / self._pay_amount
+
+        return self._buy_to_sell_price
 
     @property
     def remaining_buy_amount(self) -> Wad:
@@ -195,7 +227,8 @@ class Order:
                f" '{self.exchange_contract_address}', '{self.salt}')"
 
     def __repr__(self):
-        return pformat(vars(self))
+        return pformat({name.lstrip('_'): getattr(self, name)
+                        for name in self.__slots__ if not name.endswith('_price')})
 
 
 class LogCancel:
@@ -526,18 +559,22 @@ class ZrxRelayerApi:
     Attributes:
         exchange: The 0x Exchange contract.
         api_server: Base URL of the Standard Relayer API server.
+        session: Session to send requests through, keeping connections to the relayer alive.
+            The process-wide one (see :py:func:`pymaker.transport.default_session`) is used if not passed.
     """
     logger = logging.getLogger()
     timeout = 15.5
 
-    def __init__(self, exchange: ZrxExchange, api_server: str):
+    def __init__(self, exchange: ZrxExchange, api_server: str, session: requests.Session = None):
         assert(isinstance(exchange, ZrxExchange))
         assert(isinstance(api_server, str))
+        assert(isinstance(session, requests.Session) or (session is None))
 
         self.exchange = exchange
         self.api_server = api_server
+        self.session = session or default_session()
 
-    def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100) -> List[Order]:
+    def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100, page: int = 1) -> List[Order]:
         """Returns active orders filtered by token pair (one side).
 
         In order to get them, issues a `/v0/orders` call to the Standard Relayer API.
@@ -546,26 +583,29 @@ class ZrxRelayerApi:
             per_page: Maximum number of orders to be downloaded per page. 0x Standard Relayer API
                 limitation is 100, but some relayers can handle more so that's why this parameter
                 is exposed.
+            page: Number of the page to be downloaded, starting from 1.
 
         Returns:
             Orders, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
         """
         assert(isinstance(pay_token, Address))
         assert(isinstance(buy_token, Address))
+        assert(isinstance(page, int))
 
         url = f"{self.api_server}/v0/orders?" \
               f"exchangeContractAddress={str(self.exchange.address.address).lower()}&" \
               f"makerTokenAddress={str(pay_token.address).lower()}&" \
               f"takerTokenAddress={str(buy_token.address).lower()}&" \
-              f"per_page={per_page}"
+              f"per_page={per_page}&" \
+              f"page={page}"
 
-        response = requests.get(url, timeout=self.timeout)
+        response = self.session.get(url, timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to fetch 0x orders from the relayer: {http_response_summary(response)}")
 
         return list(map(lambda item: Order.from_json(self.exchange, item), response.json()))
 
-    def get_orders_by_maker(self, maker: Address, per_page: int = 100) -> List[Order]:
+    def get_orders_by_maker(self, maker: Address, per_page: int = 100, page: int = 1) -> List[Order]:
         """Returns all active orders created by `maker`.
 
         In order to get them, issues a `/v0/orders` call to the Standard Relayer API.
@@ -575,18 +615,21 @@ class ZrxRelayerApi:
             per_page: Maximum number of orders to be downloaded per page. 0x Standard Relayer API
                 limitation is 100, but some relayers can handle more so that's why this parameter
                 is exposed.
+            page: Number of the page to be downloaded, starting from 1.
 
         Returns:
             Active orders created by `maker`, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
         """
         assert(isinstance(maker, Address))
+        assert(isinstance(page, int))
 
         url = f"{self.api_server}/v0/orders?" \
               f"exchangeContractAddress={str(self.exchange.address.address).lower()}&" \
               f"maker={str(maker.address).lower()}&" \
-              f"per_page={per_page}"
+              f"per_page={per_page}&" \
+              f"page={page}"
 
-        response = requests.get(url, timeout=self.timeout)
+        response = self.session.get(url, timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to fetch 0x orders from the relayer: {http_response_summary(response)}")
 
@@ -614,7 +657,7 @@ class ZrxRelayerApi:
         """
         assert(isinstance(order, Order))
 
-        response = requests.post(f"{self.api_server}/v0/fees", json=order.to_json_without_fees(), timeout=self.timeout)
+        response = self.session.post(f"{self.api_server}/v0/fees", json=order.to_json_without_fees(), timeout=self.timeout)
         if response.status_code == 200:
             data = response.json()
 
@@ -639,7 +682,7 @@ class ZrxRelayerApi:
         """
         assert(isinstance(order, Order))
 
-        response = requests.post(f"{self.api_server}/v0/order", json=order.to_json(), timeout=self.timeout)
+        response = self.session.post(f"{self.api_server}/v0/order", json=order.to_json(), timeout=self.timeout)
         if response.status_code in [200, 201]:
             self.logger.info(f"Placed 0x order: {order}")
             return True
@@ -649,3 +692,79 @@ class ZrxRelayerApi:
 
     def __repr__(self):
         return f"ZrxRelayerApi()"
+
+
+class AsyncZrxRelayerApi(AsyncClient):
+    """An asyncio client for the Standard 0x Relayer API.
+
+    Wraps a :py:class:`pymaker.zrx.ZrxRelayerApi`, so requests go through the same pooled session
+    and return the same :py:class:`pymaker.zrx.Order` objects. Orders of many token pairs,
+    and subsequent pages of long order lists, get downloaded concurrently.
+
+    Args:
+        relayer_api: The blocking client to run requests with.
+        max_concurrency: Maximum number of requests to the relayer in flight at once.
+        requests_per_second: Maximum average number of requests per second sent to the relayer,
+            shared by all clients of it. Optional.
+    """
+    def __init__(self, relayer_api: ZrxRelayerApi, max_concurrency: int = 8, requests_per_second: float = None):
+        assert(isinstance(relayer_api, ZrxRelayerApi))
+
+        super().__init__(relayer_api, relayer_api.api_server, max_concurrency, requests_per_second)
+        self.relayer_api = relayer_api
+
+    async def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100, page: int = 1) -> List[Order]:
+        return await self._call(self.relayer_api.get_orders, pay_token, buy_token, per_page=per_page, page=page)
+
+    async def get_all_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100) -> List[Order]:
+        """Returns all active orders filtered by token pair (one side), downloading pages concurrently.
+
+        Args:
+            pay_token: Address of the token the orders sell.
+            buy_token: Address of the token the orders buy.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Orders, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
+        """
+        return await self._all_pages(self.relayer_api.get_orders, pay_token, buy_token, per_page=per_page)
+
+    async def get_orders_for_pairs(self, pairs: List[Tuple[Address, Address]], per_page: int = 100) -> dict:
+        """Returns all active orders of many token pairs (one side each), downloading them concurrently.
+
+        Args:
+            pairs: List of `(pay_token, buy_token)` token pairs.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Dictionary mapping each token pair to its orders.
+        """
+        assert(isinstance(pairs, list))
+
+        orders = await asyncio.gather(*[self.get_all_orders(pay_token, buy_token, per_page)
+                                        for pay_token, buy_token in pairs])
+        return dict(zip(pairs, orders))
+
+    async def get_orders_by_maker(self, maker: Address, per_page: int = 100, page: int = 1) -> List[Order]:
+        return await self._call(self.relayer_api.get_orders_by_maker, maker, per_page=per_page, page=page)
+
+    async def get_all_orders_by_maker(self, maker: Address, per_page: int = 100) -> List[Order]:
+        """Returns all active orders created by `maker`, downloading pages concurrently.
+
+        Args:
+            maker: Address of the `maker` to filter the orders by.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Active orders created by `maker`, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
+        """
+        return await self._all_pages(self.relayer_api.get_orders_by_maker, maker, per_page=per_page)
+
+    async def calculate_fees(self, order: Order) -> Order:
+        return await self._call(self.relayer_api.calculate_fees, order)
+
+    async def submit_order(self, order: Order) -> bool:
+        return await self._call(self.relayer_api.submit_order, order)
+
+    def __repr__(self):
+        return f"AsyncZrxRelayerApi()"
@@ -16,6 +16,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import array
+import asyncio
 import copy
 import logging
 import random
@@ -33,6 +34,7 @@ from pymaker import Contract, Address, Transact
 from pymaker.numeric import Wad
 from pymaker.sign import eth_sign, to_vrs
 from pymaker.token import ERC20Token
+from pymaker.transport import default_session, AsyncClient
 from pymaker.util import bytes_to_hexstring, hexstring_to_bytes, http_response_summary
 
 
@@ -89,6 +91,10 @@ class UnknownAsset(Asset):
 
 
 class Order:
+    __slots__ = ['_exchange', 'sender', 'maker', 'taker', 'maker_fee', 'taker_fee', 'pay_asset', '_pay_amount',
+                 'buy_asset', '_buy_amount', 'salt', 'fee_recipient', 'expiration', 'exchange_contract_address',
+                 'signature', '_sell_to_buy_price', '_buy_to_sell_price']
+
     def __init__(self, exchange, sender: Address, maker: Address, taker: Address, maker_fee: Wad, taker_fee: Wad,
                  pay_asset: Asset, pay_amount: Wad, buy_asset: Asset, buy_amount: Wad, salt: int, fee_recipient: Address,
                  expiration: int, exchange_contract_address: Address, signature: Optional[str]):
@@ -129,13 +135,39 @@ class Order:
     def order_id(self):
         return hash(self)
 
+    @property
+    def pay_amount(self) -> Wad:
+        return self._pay_amount
+
+    @pay_amount.setter
+    def pay_amount(self, pay_amount: Wad):
+        self._pay_amount = pay_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
+    @property
+    def buy_amount(self) -> Wad:
+        return self._buy_amount
+
+    @buy_amount.setter
+    def buy_amount(self, buy_amount: Wad):
+        self._buy_amount = buy_amount
+        self._sell_to_buy_price = None
+        self._buy_to_sell_price = None
+
     @property
     def sell_to_buy_price(self) -> Wad:
-        return self.pay_amount / self.buy_amount
+        if self._sell_to_buy_price is None:
+            self._sell_to_buy_price = self._pay_amount / self._buy_amount
+
+        return self._sell_to_buy_price
 
     @property
     def buy_to_sell_price(self) -> Wad:
-        return self.buy_amount / self.pay_amount
+        if self._buy_to_sell_price is None:
+            self._buy_to_sell_price = self._buy_amount / self._pay_amount
+
+        return self._buy_to_sell_price
 
     @property
     def remaining_buy_amount(self) -> Wad:
@@ -240,7 +272,8 @@ class Order:
                f" '{self.exchange_contract_address}', '{self.salt}')"
 
     def __repr__(self):
-        return pformat(vars(self))
+        return pformat({name.lstrip('_'): getattr(self, name)
+                        for name in self.__slots__ if not name.endswith('_price')})
 
 
 class LogCancel:
@@ -605,16 +638,20 @@ class ZrxRelayerApiV2:
     Attributes:
         exchange: The 0x Exchange V2 contract.
         api_server: Base URL of the Standard Relayer API server.
+        session: Session to send requests through, keeping connections to the relayer alive.
+            The process-wide one (see :py:func:`pymaker.transport.default_session`) is used if not passed.
     """
     logger = logging.getLogger()
     timeout = 15.5
 
-    def __init__(self, exchange: ZrxExchangeV2, api_server: str):
+    def __init__(self, exchange: ZrxExchangeV2, api_server: str, session: requests.Session = None):
         assert(isinstance(exchange, ZrxExchangeV2))
         assert(isinstance(api_server, str))
+        assert(isinstance(session, requests.Session) or (session is None))
 
         self.exchange = exchange
         self.api_server = api_server
+        self.session = session or default_session()
 
     def get_book(self, pay_token: Address, buy_token: Address, depth: int = 100) -> Tuple[List[Order], List[Order]]:
         assert(isinstance(pay_token, Address))
@@ -625,7 +662,7 @@ class ZrxRelayerApiV2:
                   "quoteAssetData": ERC20Asset(buy_token).serialize(),
                   "perPage": depth}
 
-        response = requests.get(f"{self.api_server}/v2/orderbook", params, timeout=self.timeout)
+        response = self.session.get(f"{self.api_server}/v2/orderbook", params=params, timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to fetch 0x orderbook from the relayer: {http_response_summary(response)}")
 
@@ -634,7 +671,7 @@ class ZrxRelayerApiV2:
         return list(map(lambda item: Order.from_json(self.exchange, item['order']), data['asks']['records'])), \
                list(map(lambda item: Order.from_json(self.exchange, item['order']), data['bids']['records']))
 
-    def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100) -> List[Order]:
+    def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100, page: int = 1) -> List[Order]:
         """Returns active orders filtered by token pair (one side).
 
         In order to get them, issues a `/v2/orders` call to the Standard Relayer API.
@@ -643,20 +680,23 @@ class ZrxRelayerApiV2:
             per_page: Maximum number of orders to be downloaded per page. 0x Standard Relayer API
                 limitation is 100, but some relayers can handle more so that's why this parameter
                 is exposed.
+            page: Number of the page to be downloaded, starting from 1.
 
         Returns:
             Orders, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
         """
         assert(isinstance(pay_token, Address))
         assert(isinstance(buy_token, Address))
+        assert(isinstance(page, int))
 
         params = { "exchangeAddress": self.exchange.address.address.lower(),
                    "makerAssetData": ERC20Asset(pay_token).serialize(),
                    "takerAssetData": ERC20Asset(buy_token).serialize(),
                    "per_page": per_page,
+                   "page": page,
                  }
 
-        response = requests.get(f"{self.api_server}/v2/orders", params=params, timeout=self.timeout)
+        response = self.session.get(f"{self.api_server}/v2/orders", params=params, timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to fetch 0x orders from the relayer: {http_response_summary(response)}")
 
@@ -669,13 +709,13 @@ class ZrxRelayerApiV2:
     def get_order(self, order_hash: str) -> Order:
         assert(isinstance(order_hash, str))
 
-        response = requests.get(f"{self.api_server}/v2/order/{order_hash}", timeout=self.timeout)
+        response = self.session.get(f"{self.api_server}/v2/order/{order_hash}", timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to 0x order from the relayer: {http_response_summary(response)}")
 
         return Order.from_json(self.exchange, response.json()['order'])
 
-    def get_orders_by_maker(self, maker: Address, per_page: int = 100) -> List[Order]:
+    def get_orders_by_maker(self, maker: Address, per_page: int = 100, page: int = 1) -> List[Order]:
         """Returns all active orders created by `maker`.
 
         In order to get them, issues a `/v2/orders` call to the Standard Relayer API.
@@ -685,18 +725,21 @@ class ZrxRelayerApiV2:
             per_page: Maximum number of orders to be downloaded per page. 0x Standard Relayer API
                 limitation is 100, but some relayers can handle more so that's why this parameter
                 is exposed.
+            page: Number of the page to be downloaded, starting from 1.
 
         Returns:
             Active orders created by `maker`, as a list of instances of the :py:class:`pymaker.zrx.Order` class.
         """
         assert(isinstance(maker, Address))
+        assert(isinstance(page, int))
 
         params = { "exchangeAddress": self.exchange.address.address.lower(),
                    "makerAddress": str(maker).lower(),
                    "per_page": per_page,
+                   "page": page,
                  }
 
-        response = requests.get(f"{self.api_server}/v2/orders", params=params, timeout=self.timeout)
+        response = self.session.get(f"{self.api_server}/v2/orders", params=params, timeout=self.timeout)
         if not response.ok:
             raise Exception(f"Failed to fetch 0x orders from the relayer: {http_response_summary(response)}")
 
@@ -729,7 +772,7 @@ class ZrxRelayerApiV2:
         """
         assert(isinstance(order, Order))
 
-        response = requests.get(f"{self.api_server}/v2/order_config", params=order.to_json_without_fees(), timeout=self.timeout)
+        response = self.session.get(f"{self.api_server}/v2/order_config", params=order.to_json_without_fees(), timeout=self.timeout)
         if response.status_code == 200:
             data = response.json()
             #{"senderAddress":"0xc8924d8cd9a758a4150afe7cc7030effaff1aecc","feeRecipientAddress":"0xc8924d8cd9a758a4150afe7cc7030effaff1aecc","makerFee":"0","takerFee":"0"}
@@ -756,7 +799,7 @@ class ZrxRelayerApiV2:
         """
         assert(isinstance(order, Order))
 
-        response = requests.post(f"{self.api_server}/v2/order", json=order.to_json(), timeout=self.timeout)
+        response = self.session.post(f"{self.api_server}/v2/order", json=order.to_json(), timeout=self.timeout)
         if response.status_code in [200, 201]:
             self.logger.info(f"Placed 0x order: {order}")
             return True
@@ -766,3 +809,105 @@ class ZrxRelayerApiV2:
 
     def __repr__(self):
         return f"ZrxRelayerApiV2()"
+
+
+class AsyncZrxRelayerApiV2(AsyncClient):
+    """An asyncio client for the Standard 0x Relayer API V2.
+
+    Wraps a :py:class:`pymaker.zrxv2.ZrxRelayerApiV2`, so requests go through the same pooled session
+    and return the same :py:class:`pymaker.zrxv2.Order` objects. Order books of many token pairs,
+    and subsequent pages of long order lists, get downloaded concurrently.
+
+    The typical usage pattern is as follows:
+
+        api = AsyncZrxRelayerApiV2(ZrxRelayerApiV2(exchange, api_server), max_concurrency=8, requests_per_second=10)
+        books = await api.get_books([(weth, dai), (mkr, weth)])
+
+    Args:
+        relayer_api: The blocking client to run requests with.
+        max_concurrency: Maximum number of requests to the relayer in flight at once.
+        requests_per_second: Maximum average number of requests per second sent to the relayer,
+            shared by all clients of it. Optional.
+    """
+    def __init__(self, relayer_api: ZrxRelayerApiV2, max_concurrency: int = 8, requests_per_second: float = None):
+        assert(isinstance(relayer_api, ZrxRelayerApiV2))
+
+        super().__init__(relayer_api, relayer_api.api_server, max_concurrency, requests_per_second)
+        self.relayer_api = relayer_api
+
+    async def get_book(self, pay_token: Address, buy_token: Address, depth: int = 100) -> Tuple[List[Order], List[Order]]:
+        return await self._call(self.relayer_api.get_book, pay_token, buy_token, depth)
+
+    async def get_books(self, pairs: List[Tuple[Address, Address]], depth: int = 100) -> dict:
+        """Downloads order books of many token pairs concurrently.
+
+        Args:
+            pairs: List of `(pay_token, buy_token)` token pairs.
+            depth: Maximum number of orders to be downloaded on each side of each book.
+
+        Returns:
+            Dictionary mapping each token pair to its asks and bids, as returned by `get_book()`.
+        """
+        assert(isinstance(pairs, list))
+
+        books = await asyncio.gather(*[self.get_book(pay_token, buy_token, depth) for pay_token, buy_token in pairs])
+        return dict(zip(pairs, books))
+
+    async def get_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100, page: int = 1) -> List[Order]:
+        return await self._call(self.relayer_api.get_orders, pay_token, buy_token, per_page=per_page, page=page)
+
+    async def get_all_orders(self, pay_token: Address, buy_token: Address, per_page: int = 100) -> List[Order]:
+        """Returns all active orders filtered by token pair (one side), downloading pages concurrently.
+
+        Args:
+            pay_token: Address of the token the orders sell.
+            buy_token: Address of the token the orders buy.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Orders, as a list of instances of the :py:class:`pymaker.zrxv2.Order` class.
+        """
+        return await self._all_pages(self.relayer_api.get_orders, pay_token, buy_token, per_page=per_page)
+
+    async def get_orders_for_pairs(self, pairs: List[Tuple[Address, Address]], per_page: int = 100) -> dict:
+        """Returns all active orders of many token pairs (one side each), downloading them concurrently.
+
+        Args:
+            pairs: List of `(pay_token, buy_token)` token pairs.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Dictionary mapping each token pair to its orders.
+        """
+        assert(isinstance(pairs, list))
+
+        orders = await asyncio.gather(*[self.get_all_orders(pay_token, buy_token, per_page)
+                                        for pay_token, buy_token in pairs])
+        return dict(zip(pairs, orders))
+
+    async def get_order(self, order_hash: str) -> Order:
+        return await self._call(self.relayer_api.get_order, order_hash)
+
+    async def get_orders_by_maker(self, maker: Address, per_page: int = 100, page: int = 1) -> List[Order]:
+        return await self._call(self.relayer_api.get_orders_by_maker, maker, per_page=per_page, page=page)
+
+    async def get_all_orders_by_maker(self, maker: Address, per_page: int = 100) -> List[Order]:
+        """Returns all active orders created by `maker`, downloading pages concurrently.
+
+        Args:
+            maker: Address of the `maker` to filter the orders by.
+            per_page: Number of orders to be downloaded per page.
+
+        Returns:
+            Active orders created by `maker`, as a list of instances of the :py:class:`pymaker.zrxv2.Order` class.
+        """
+        return await self._all_pages(self.relayer_api.get_orders_by_maker, maker, per_page=per_page)
+
+    async def configure_order(self, order: Order) -> Order:
+        return await self._call(self.relayer_api.configure_order, order)
+
+    async def submit_order(self, order: Order) -> bool:
+        return await self._call(self.relayer_api.submit_order, order)
+
+    def __repr__(self):
+        return f"AsyncZrxRelayerApiV2()"
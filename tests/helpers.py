@@ -15,6 +15,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gzip
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
 from unittest.mock import Mock
 
 from web3 import Web3
@@ -50,3 +57,124 @@ def reset(web3: Web3, snap_id):
     assert(isinstance(web3, Web3))
 
     return web3.manager.request_blocking("evm_revert", [snap_id])
+
+
+class JsonRpcServer:
+    """Local stand-in for an Ethereum node, answering JSON-RPC requests (including batches).
+
+    `handler` gets called with the `method` and `params` of each request and should return its result.
+    All payloads received are recorded in `payloads`, so tests can check how many round trips were made.
+    Each response can be delayed by `latency` seconds, to simulate a remote node.
+    """
+    def __init__(self, handler, latency: float = 0):
+        self.handler = handler
+        self.latency = latency
+        self.payloads = []
+
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.payloads.append(payload)
+                time.sleep(server.latency)
+
+                if isinstance(payload, list):
+                    response = [server.response(request) for request in payload]
+                else:
+                    response = server.response(payload)
+
+                body = json.dumps(response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = HTTPServer(('localhost', 0), RequestHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def endpoint_uri(self) -> str:
+        return f"http://localhost:{self.httpd.server_port}"
+
+    def response(self, request: dict) -> dict:
+        try:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'result': self.handler(request['method'], request['params'])}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': -32000, 'message': str(e)}}
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class HttpServer:
+    """Local HTTP/1.1 server with keep-alive, standing in for a relayer or a node.
+
+    `handler` gets called with the `method`, `path` (without the query string), `query` (as a dictionary
+    of lists, as returned by `parse_qs`) and `body` (decoded JSON or `None`) of each request and should
+    return a (`status`, `response`) tuple, `response` being serialized as JSON. Responses get gzipped
+    if the client accepts it. All requests received are recorded in `requests`, client ports
+    of all connections made in `connections`.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_request(self, method: str):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length)) if length > 0 else None
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+
+                with server.lock:
+                    server.requests.append((method, url.path, query, body))
+                    server.connections.add(self.client_address[1])
+
+                status, response = server.handler(method, url.path, query, body)
+                data = json.dumps(response).encode('utf-8')
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    data = gzip.compress(data)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_request('GET')
+
+            def do_POST(self):
+                self.handle_request('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = ThreadingHTTPServer(('localhost', 0), RequestHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://localhost:{self.httpd.server_port}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
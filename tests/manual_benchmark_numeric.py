@@ -0,0 +1,81 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Microbenchmark of `Wad`/`Ray` arithmetic, comparing it with the `Decimal`-based arithmetic used before,
+# and of `WadArray` arithmetic, comparing it with the same arithmetic done on lists of `Wad` values.
+#
+# Usage: python -m tests.manual_benchmark_numeric
+
+import timeit
+from decimal import Decimal, Context, ROUND_DOWN
+
+from pymaker.numeric import Wad, Ray, WadArray
+
+_context = Context(prec=1000, rounding=ROUND_DOWN)
+
+
+def decimal_wad_mul(x: Wad, y: Wad) -> Wad:
+    result = Decimal(x.value) * Decimal(y.value) / (Decimal(10) ** Decimal(18))
+    return Wad(int(result.quantize(1, context=_context)))
+
+
+def decimal_wad_mul_ray(x: Wad, y: Ray) -> Wad:
+    result = Decimal(x.value) * Decimal(y.value) / (Decimal(10) ** Decimal(27))
+    return Wad(int(result.quantize(1, context=_context)))
+
+
+def decimal_wad_div(x: Wad, y: Wad) -> Wad:
+    return Wad(int((Decimal(x.value) * (Decimal(10) ** Decimal(18)) / Decimal(y.value)).quantize(1, context=_context)))
+
+
+def decimal_ray_from_wad(x: Wad) -> Ray:
+    return Ray(int((Decimal(x.value) * (Decimal(10)**Decimal(9))).quantize(1, context=_context)))
+
+
+amount = Wad.from_number(1234.5678)
+price = Wad.from_number(0.00321)
+rate = Ray.from_number(1.000000000158153903837946257)
+
+benchmarks = [
+    ("Wad * Wad", lambda: amount * price, lambda: decimal_wad_mul(amount, price)),
+    ("Wad * Ray", lambda: amount * rate, lambda: decimal_wad_mul_ray(amount, rate)),
+    ("Wad / Wad", lambda: amount / price, lambda: decimal_wad_div(amount, price)),
+    ("Ray(Wad)", lambda: Ray(amount), lambda: decimal_ray_from_wad(amount)),
+]
+
+number = 200000
+for name, integer_function, decimal_function in benchmarks:
+    assert integer_function() == decimal_function()
+
+    integer_time = min(timeit.repeat(integer_function, number=number, repeat=3))
+    decimal_time = min(timeit.repeat(decimal_function, number=number, repeat=3))
+
+    print(f"{name:<10} integer: {integer_time / number * 10**9:8.1f} ns/op"
+          f"    decimal: {decimal_time / number * 10**9:8.1f} ns/op"
+          f"    speedup: {decimal_time / integer_time:5.2f}x")
+
+
+amounts = [Wad.from_number(index + 0.5) for index in range(1000)]
+amounts_array = WadArray(amounts)
+
+number = 200
+integer_time = min(timeit.repeat(lambda: [amount * rate for amount in amounts], number=number, repeat=3))
+array_time = min(timeit.repeat(lambda: amounts_array * rate, number=number, repeat=3))
+
+print(f"1000 x Wad * Ray    list: {integer_time / number * 10**6:8.1f} us/op"
+      f"    WadArray: {array_time / number * 10**6:8.1f} us/op"
+      f"    speedup: {integer_time / array_time:5.2f}x")
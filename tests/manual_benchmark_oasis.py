@@ -0,0 +1,107 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark of fetching both sides of a `MatchingMarket` order book through the `MakerOtcSupportMethods`
+# contract, comparing `get_orders_for_pairs` with fetching pages one by one as done before (a `getOffers`
+# call followed by a `getWorseOffer` call for each page, pair after pair). The node is simulated locally,
+# each of its responses being delayed by `LATENCY` seconds.
+#
+# Usage: python -m tests.manual_benchmark_oasis
+
+import time
+from typing import List
+
+from pymaker import Address, Wad
+from pymaker.oasis import MatchingMarket, Order
+from tests.test_oasis import MarketEventsTest
+
+LATENCY = 0.005
+
+
+def naive_get_orders(market: MatchingMarket, pay_token: Address, buy_token: Address) -> List[Order]:
+    orders = []
+    result = market._support_contract.call().getOffers(market.address.address, pay_token.address, buy_token.address)
+
+    while True:
+        count = 0
+        for i in range(0, 100):
+            if result[3][i] != '0x0000000000000000000000000000000000000000':
+                count += 1
+
+                orders.append(Order(market=market,
+                                    order_id=result[0][i],
+                                    maker=Address(result[3][i]),
+                                    pay_token=pay_token,
+                                    pay_amount=Wad(result[1][i]),
+                                    buy_token=buy_token,
+                                    buy_amount=Wad(result[2][i]),
+                                    timestamp=result[4][i]))
+
+        if count == 100:
+            next_order_id = market._contract.call().getWorseOffer(orders[-1].order_id)
+            result = market._support_contract.call().getOffers(market.address.address, next_order_id)
+
+        else:
+            break
+
+    return orders
+
+
+class SimulatedMarket(MarketEventsTest):
+    SUPPORT = Address('0x5555555555666666666677777777778888888888')
+
+    def __init__(self, size: int):
+        self.setup_method()
+        self.node.latency = LATENCY
+
+        self.market = MatchingMarket(self.web3, self.MARKET, support_address=self.SUPPORT)
+        self.pairs = [(self.TOKEN1, self.TOKEN2), (self.TOKEN2, self.TOKEN1)]
+        self.offers = {order_id: self.order(order_id, 1, order_id % 97 + 1, *self.pairs[order_id % 2])
+                       for order_id in range(1, size + 1)}
+
+        # the sorted lists do not change, so they only get sorted once
+        self.lists = {pair: MarketEventsTest.sorted_offers(self, *pair) for pair in self.pairs}
+        self.worse_offers = {order_id: worse_order_id for sorted_offers in self.lists.values()
+                             for order_id, worse_order_id in zip(sorted_offers, sorted_offers[1:] + [0])}
+
+    def sorted_offers(self, pay_token: Address, buy_token: Address) -> List[int]:
+        return self.lists[(pay_token, buy_token)]
+
+    def worse_offer(self, order_id: int) -> int:
+        return self.worse_offers.get(order_id, 0)
+
+    def run(self, name: str, function) -> list:
+        self.node.payloads.clear()
+        start = time.time()
+        orders = function()
+        elapsed = time.time() - start
+
+        print(f"  {name:<24} {elapsed * 1000:9.1f} ms  {len(self.node.payloads):4d} round trips")
+        return orders
+
+
+for size in [1000, 10000]:
+    simulated = SimulatedMarket(size)
+    print(f"{size} orders, {LATENCY * 1000:.0f} ms latency:")
+
+    naive = simulated.run("getOffers/getWorseOffer", lambda: {pair: naive_get_orders(simulated.market, *pair)
+                                                              for pair in simulated.pairs})
+    paged = simulated.run("get_orders_for_pairs", lambda: simulated.market.get_orders_for_pairs(simulated.pairs))
+
+    assert all([order.order_id for order in naive[pair]] == [order.order_id for order in paged[pair]]
+               for pair in simulated.pairs)
+    simulated.teardown_method()
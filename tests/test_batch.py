@@ -0,0 +1,117 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.batch import batch
+from pymaker.numeric import Wad
+from pymaker.token import ERC20Token
+from tests.helpers import JsonRpcServer
+
+
+class TestBatch:
+    def setup_method(self):
+        # `balanceOf` of each address returns the last byte of it (in Wei)
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_call':
+                if params[0]['data'].startswith('0x70a08231'):
+                    return '0x' + params[0]['data'][-2:].rjust(64, '0')
+                else:
+                    raise Exception("Reverted")
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        self.server.payloads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_resolve_futures_with_decoded_results(self):
+        # when
+        with batch(self.web3) as b:
+            balance_1 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+            balance_2 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000002'))
+            balance_3 = b.call(self.token.balance_of, address=Address('0x0000000000000000000000000000000000000003'))
+
+        # then
+        assert balance_1.result() == Wad(1)
+        assert balance_2.result() == Wad(2)
+        assert balance_3.result() == Wad(3)
+
+    def test_should_send_all_calls_in_one_batch(self):
+        # when
+        with batch(self.web3) as b:
+            for i in range(1, 20):
+                b.call(self.token.balance_of, Address('0x00000000000000000000000000000000000000' + f"{i:02x}"))
+
+        # then
+        assert len(self.server.payloads) == 1
+        assert len(self.server.payloads[0]) == 19
+
+    def test_should_send_identical_requests_only_once(self):
+        # when
+        with batch(self.web3) as b:
+            balance_1 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+            balance_2 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+
+        # then
+        assert balance_1.result() == balance_2.result() == Wad(1)
+        assert len(self.server.payloads[0]) == 1
+
+    def test_should_pass_exceptions_through_futures(self):
+        # when
+        with batch(self.web3) as b:
+            total_supply = b.call(self.token.total_supply)
+            balance = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+            invalid = b.call(self.token.balance_of, '0x0000000000000000000000000000000000000001')
+
+        # then
+        with pytest.raises(ValueError):
+            total_supply.result()
+        with pytest.raises(AssertionError):
+            invalid.result()
+        # and
+        assert balance.result() == Wad(1)
+
+    def test_should_resolve_calls_not_making_any_requests(self):
+        # when
+        with batch(self.web3) as b:
+            value = b.call(lambda: 42)
+
+        # then
+        assert value.result() == 42
+
+    def test_should_not_affect_calls_outside_of_batch(self):
+        # given
+        with batch(self.web3) as b:
+            b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+
+        # when
+        self.server.payloads = []
+        balance = self.token.balance_of(Address('0x0000000000000000000000000000000000000005'))
+
+        # then
+        assert balance == Wad(5)
+        assert len(self.server.payloads) == 1
+        assert not isinstance(self.server.payloads[0], list)
@@ -0,0 +1,413 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+import pickle
+import socketserver
+import tempfile
+import threading
+import time
+
+import pytest
+import websockets
+from hexbytes import HexBytes
+from web3 import Web3, HTTPProvider, IPCProvider, WebsocketProvider
+from web3.datastructures import AttributeDict
+
+from pymaker import Address
+from pymaker.blocks import BlockContext, BlockHistory, PollingBlockSource, SubscriptionBlockSource, default_block_source
+from pymaker.numeric import Wad
+from pymaker.token import ERC20Token
+from tests.helpers import JsonRpcServer
+
+
+def header(block_number: int) -> dict:
+    return {'number': hex(block_number),
+            'hash': '0x' + f"{block_number:064x}",
+            'parentHash': '0x' + f"{block_number - 1:064x}",
+            'timestamp': hex(1500000000 + block_number)}
+
+
+def notification(block_number: int) -> str:
+    return json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                       'params': {'subscription': '0xabcd', 'result': header(block_number)}})
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class BlockCollector:
+    def __init__(self):
+        self.blocks = []
+        self.times = []
+
+    def __call__(self, block):
+        self.blocks.append(block)
+        self.times.append(time.time())
+
+    @property
+    def numbers(self) -> list:
+        return [block['number'] for block in self.blocks]
+
+
+class TestPollingBlockSource:
+    def setup_method(self):
+        # three blocks get mined between subsequent polls
+        self.block_number = 100
+
+        def handler(method, params):
+            if method == 'eth_newBlockFilter':
+                return '0x1'
+            elif method == 'eth_getFilterChanges':
+                self.block_number += 3
+                return [header(number)['hash'] for number in range(self.block_number - 2, self.block_number + 1)]
+            elif method == 'eth_getBlockByHash':
+                return header(int(params[0], 16))
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_deliver_only_most_recent_blocks(self):
+        # given
+        collector = BlockCollector()
+        source = PollingBlockSource(self.web3, poll_interval=0.1)
+
+        # when
+        source.start(collector)
+        wait_until(lambda: len(collector.blocks) >= 3)
+        source.stop()
+
+        # then
+        assert collector.numbers[:3] == [103, 106, 109]
+        assert collector.blocks[0]['hash'] == bytes.fromhex(f"{103:064x}")
+
+
+class TestSubscriptionBlockSource:
+    def setup_method(self):
+        self.subscriptions = []
+        self.server_loop = asyncio.new_event_loop()
+
+        async def handler(websocket, path):
+            request = json.loads(await websocket.recv())
+            self.subscriptions.append(request)
+            await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0xabcd'}))
+            for block_number in range(200, 203):
+                await asyncio.sleep(0.2)
+                await websocket.send(notification(block_number))
+            await asyncio.sleep(60)
+
+        self.websocket_server = self.server_loop.run_until_complete(websockets.serve(handler, 'localhost', 0,
+                                                                                      loop=self.server_loop))
+        self.websocket_uri = f"ws://localhost:{self.websocket_server.sockets[0].getsockname()[1]}"
+        threading.Thread(target=self.server_loop.run_forever, daemon=True).start()
+
+    def teardown_method(self):
+        self.server_loop.call_soon_threadsafe(self.server_loop.stop)
+
+    def test_should_deliver_blocks_pushed_over_websocket(self):
+        # given
+        collector = BlockCollector()
+        source = SubscriptionBlockSource(Web3(HTTPProvider("http://localhost:1")), self.websocket_uri)
+
+        # when
+        source.start(collector)
+        wait_until(lambda: len(collector.blocks) >= 3)
+        source.stop()
+
+        # then
+        assert self.subscriptions[0]['method'] == 'eth_subscribe'
+        assert self.subscriptions[0]['params'] == ['newHeads']
+        assert collector.numbers == [200, 201, 202]
+        assert collector.blocks[1]['parentHash'] == bytes.fromhex(f"{200:064x}")
+
+    def test_should_deliver_blocks_pushed_over_ipc(self):
+        # given
+        ipc_path = os.path.join(tempfile.mkdtemp(), 'node.ipc')
+        requests = []
+
+        class IpcHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                requests.append(json.loads(self.request.recv(65536).decode('utf-8')))
+                # messages are not delimited, they can also arrive split or merged
+                stream = json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': '0xabcd'}) + notification(300) \
+                         + notification(301) + notification(302)
+                self.request.sendall(stream[:100].encode('utf-8'))
+                time.sleep(0.1)
+                self.request.sendall(stream[100:].encode('utf-8'))
+                time.sleep(60)
+
+        ipc_server = socketserver.ThreadingUnixStreamServer(ipc_path, IpcHandler)
+        ipc_server.daemon_threads = True
+        threading.Thread(target=ipc_server.serve_forever, daemon=True).start()
+
+        collector = BlockCollector()
+        source = SubscriptionBlockSource(Web3(HTTPProvider("http://localhost:1")), ipc_path)
+
+        # when
+        source.start(collector)
+        wait_until(lambda: len(collector.blocks) >= 3)
+        source.stop()
+        ipc_server.shutdown()
+
+        # then
+        assert requests[0]['method'] == 'eth_subscribe'
+        assert collector.numbers == [300, 301, 302]
+
+    def test_should_fall_back_to_polling(self):
+        # given
+        def handler(method, params):
+            if method == 'eth_newBlockFilter':
+                return '0x1'
+            elif method == 'eth_getFilterChanges':
+                return [header(400)['hash']]
+            elif method == 'eth_getBlockByHash':
+                return header(int(params[0], 16))
+            else:
+                raise Exception("Unknown method")
+
+        server = JsonRpcServer(handler)
+        collector = BlockCollector()
+        source = SubscriptionBlockSource(Web3(HTTPProvider(server.endpoint_uri)), "ws://localhost:1",
+                                         poll_interval=0.1)
+
+        # when
+        source.start(collector)
+        wait_until(lambda: len(collector.blocks) >= 1)
+        source.stop()
+        server.stop()
+
+        # then
+        assert collector.numbers[0] == 400
+
+
+class TestDefaultBlockSource:
+    def test_should_subscribe_over_websocket_and_ipc_and_poll_over_http(self):
+        # expect
+        assert isinstance(default_block_source(Web3(HTTPProvider("http://localhost:8545"))), PollingBlockSource)
+        assert default_block_source(Web3(WebsocketProvider("ws://localhost:8546"))).uri == "ws://localhost:8546"
+        assert default_block_source(Web3(IPCProvider("/tmp/geth.ipc"))).uri == "/tmp/geth.ipc"
+
+
+class TestBlockHistory:
+    def setup_method(self):
+        # blocks of the main chain have `fork` equal to 0, blocks of competing chains have other values
+        self.chain = {}
+
+        def handler(method, params):
+            if method == 'eth_getBlockByHash':
+                return self.chain.get(params[0])
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def block(self, block_number: int, fork: int = 0, parent_fork: int = None) -> AttributeDict:
+        parent_fork = fork if parent_fork is None else parent_fork
+        block = {'number': hex(block_number),
+                 'hash': '0x' + f"{fork:02x}{block_number:062x}",
+                 'parentHash': '0x' + f"{parent_fork:02x}{block_number - 1:062x}",
+                 'timestamp': hex(1500000000 + block_number)}
+        self.chain[block['hash']] = block
+        return AttributeDict({'number': block_number,
+                              'hash': HexBytes(block['hash']),
+                              'parentHash': HexBytes(block['parentHash']),
+                              'timestamp': 1500000000 + block_number})
+
+    @staticmethod
+    def numbers(blocks: list) -> list:
+        return [block['number'] for block in blocks]
+
+    def test_should_not_report_reorg_when_chain_extended(self):
+        # given
+        history = BlockHistory(self.web3)
+
+        # expect
+        for block_number in range(100, 105):
+            assert history.add(self.block(block_number)) is None
+
+        # and
+        assert self.numbers(history.blocks) == [100, 101, 102, 103, 104]
+        assert history.add(self.block(104)) is None
+        assert self.numbers(history.blocks) == [100, 101, 102, 103, 104]
+
+    def test_should_fetch_skipped_blocks_without_reporting_reorg(self):
+        # given
+        history = BlockHistory(self.web3)
+        history.add(self.block(100))
+        for block_number in range(101, 104):
+            self.block(block_number)
+        self.server.payloads = []
+
+        # expect
+        assert history.add(self.block(104)) is None
+        assert self.numbers(history.blocks) == [100, 101, 102, 103, 104]
+        assert len(self.server.payloads) == 3
+
+    def test_should_report_reorg_to_longer_chain(self):
+        # given
+        history = BlockHistory(self.web3)
+        for block_number in range(100, 106):
+            history.add(self.block(block_number))
+
+        # when
+        self.block(104, fork=1, parent_fork=0)
+        self.block(105, fork=1)
+        depth, old_blocks, new_blocks = history.add(self.block(106, fork=1))
+
+        # then
+        assert depth == 2
+        assert self.numbers(old_blocks) == [104, 105]
+        assert self.numbers(new_blocks) == [104, 105, 106]
+        assert new_blocks[0]['hash'] != old_blocks[0]['hash']
+
+        # and
+        assert self.numbers(history.blocks) == [100, 101, 102, 103, 104, 105, 106]
+        assert history.blocks[4]['hash'] == new_blocks[0]['hash']
+
+    def test_should_report_reorg_to_shorter_chain(self):
+        # given
+        history = BlockHistory(self.web3)
+        for block_number in range(100, 106):
+            history.add(self.block(block_number))
+
+        # when
+        depth, old_blocks, new_blocks = history.add(self.block(104, fork=1, parent_fork=0))
+
+        # then
+        assert depth == 2
+        assert self.numbers(old_blocks) == [104, 105]
+        assert self.numbers(new_blocks) == [104]
+        assert self.numbers(history.blocks) == [100, 101, 102, 103, 104]
+
+    def test_should_report_reorg_deeper_than_buffer(self):
+        # given
+        history = BlockHistory(self.web3, size=3)
+        for block_number in range(100, 106):
+            history.add(self.block(block_number))
+
+        # when
+        self.block(100, fork=1, parent_fork=0)
+        for block_number in range(101, 106):
+            self.block(block_number, fork=1)
+        depth, old_blocks, new_blocks = history.add(self.block(106, fork=1))
+
+        # then
+        assert depth == 3
+        assert self.numbers(old_blocks) == [103, 104, 105]
+        assert self.numbers(new_blocks) == [103, 104, 105, 106]
+        assert self.numbers(history.blocks) == [104, 105, 106]
+
+
+class TestBlockContext:
+    def setup_method(self):
+        # `balanceOf` of each address returns the last byte of it (in Wei)
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_call':
+                if params[0]['data'].startswith('0x70a08231'):
+                    return '0x' + params[0]['data'][-2:].rjust(64, '0')
+                else:
+                    raise Exception("Reverted")
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        self.block = AttributeDict({'number': 500, 'hash': HexBytes(header(500)['hash']), 'timestamp': 1500000500})
+        self.server.payloads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    @staticmethod
+    def address(last_byte: int) -> Address:
+        return Address('0x00000000000000000000000000000000000000' + f"{last_byte:02x}")
+
+    def test_should_expose_block_header(self):
+        # when
+        context = BlockContext(self.block)
+
+        # then
+        assert context.block is self.block
+        assert context.number == 500
+        assert context.hash == HexBytes(header(500)['hash'])
+        assert context.timestamp == 1500000500
+
+    def test_should_prefetch_in_one_batch(self):
+        # when
+        context = BlockContext.prefetch(self.web3, self.block, {'one': (self.token.balance_of, self.address(1)),
+                                                                'two': (self.token.balance_of, self.address(2)),
+                                                                'supply': self.token.total_supply})
+
+        # then
+        assert len(self.server.payloads) == 1
+        assert len(self.server.payloads[0]) == 3
+
+        # and
+        assert context['one'] == Wad(1)
+        assert context['two'] == Wad(2)
+        assert 'one' in context
+        assert 'three' not in context
+
+        # and
+        with pytest.raises(Exception):
+            context['supply']
+
+    def test_should_serve_prefetched_calls_from_cache(self):
+        # given
+        context = BlockContext.prefetch(self.web3, self.block, {'one': (self.token.balance_of, self.address(1))})
+        self.server.payloads = []
+
+        # when
+        assert context.call(self.token.balance_of, self.address(1)) == Wad(1)
+        assert context.call(self.token.balance_of, self.address(3)) == Wad(3)
+        assert context.call(self.token.balance_of, self.address(3)) == Wad(3)
+
+        # then
+        assert len(self.server.payloads) == 1
+
+    def test_should_pickle_prefetched_results(self):
+        # given
+        context = BlockContext.prefetch(self.web3, self.block, {'one': (self.token.balance_of, self.address(1)),
+                                                                'supply': self.token.total_supply})
+
+        # when
+        unpickled = pickle.loads(pickle.dumps(context))
+
+        # then
+        assert unpickled.number == 500
+        assert unpickled.hash == HexBytes(header(500)['hash'])
+        assert unpickled['one'] == Wad(1)
+        assert 'supply' in unpickled
+        with pytest.raises(Exception):
+            unpickled['supply']
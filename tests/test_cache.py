@@ -0,0 +1,132 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.batch import batch
+from pymaker.cache import enable_call_cache, call_cache
+from pymaker.numeric import Wad
+from pymaker.token import ERC20Token
+from tests.helpers import JsonRpcServer
+
+
+class TestCallCache:
+    def setup_method(self):
+        # `balanceOf` of each address returns the last byte of it (in Wei)
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_call':
+                if params[0]['data'].startswith('0x70a08231'):
+                    return '0x' + params[0]['data'][-2:].rjust(64, '0')
+                else:
+                    raise Exception("Reverted")
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        self.cache = enable_call_cache(self.web3)
+        self.server.payloads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def balance(self, last_byte: int) -> Wad:
+        return self.token.balance_of(Address('0x00000000000000000000000000000000000000' + f"{last_byte:02x}"))
+
+    def test_should_be_enabled_only_once(self):
+        # expect
+        assert enable_call_cache(self.web3) is self.cache
+        assert call_cache(self.web3) is self.cache
+        assert call_cache(Web3(HTTPProvider(self.server.endpoint_uri))) is None
+
+    def test_should_not_cache_until_block_number_known(self):
+        # when
+        assert self.balance(1) == Wad(1)
+        assert self.balance(1) == Wad(1)
+
+        # then
+        assert len(self.server.payloads) == 2
+        assert self.cache.hits == 0
+
+    def test_should_cache_calls_within_one_block(self):
+        # given
+        self.cache.new_block(10)
+
+        # when
+        assert self.balance(1) == Wad(1)
+        assert self.balance(1) == Wad(1)
+        assert self.balance(2) == Wad(2)
+        assert self.balance(1) == Wad(1)
+
+        # then
+        assert len(self.server.payloads) == 2
+        assert self.cache.hits == 2
+        assert self.cache.misses == 2
+
+    def test_should_drop_cached_results_on_new_block(self):
+        # given
+        self.cache.new_block(10)
+        self.balance(1)
+
+        # when
+        self.cache.new_block(10)
+        self.balance(1)
+        # and
+        self.cache.new_block(11)
+        self.balance(1)
+
+        # then
+        assert len(self.server.payloads) == 2
+        assert self.cache.hits == 1
+        assert self.cache.misses == 2
+
+    def test_should_not_cache_failed_calls(self):
+        # given
+        self.cache.new_block(10)
+
+        # when
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                self.token.total_supply()
+
+        # then
+        assert len(self.server.payloads) == 2
+        assert self.cache.hits == 0
+
+    def test_should_serve_batched_calls_from_cache(self):
+        # given
+        self.cache.new_block(10)
+        self.balance(1)
+
+        # when
+        with batch(self.web3) as b:
+            balance_1 = b.call(self.balance, 1)
+            balance_2 = b.call(self.balance, 2)
+
+        # then
+        assert balance_1.result() == Wad(1)
+        assert balance_2.result() == Wad(2)
+        assert len(self.server.payloads) == 2
+        assert len(self.server.payloads[1]) == 1
+        # and
+        assert self.balance(2) == Wad(2)
+        assert len(self.server.payloads) == 2
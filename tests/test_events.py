@@ -0,0 +1,188 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address, Contract
+from pymaker.events import EventScanner
+from pymaker.numeric import Wad
+from tests.helpers import JsonRpcServer
+
+TOKEN = '0x0000000000111111111100000000001111111111'
+TRANSFER_TOPIC = '0x' + Web3.sha3(text='Transfer(address,address,uint256)').hex()[2:]
+
+
+def transfer_log(block_number: int, sender: int, value: int) -> dict:
+    return {'address': TOKEN,
+            'topics': [TRANSFER_TOPIC, '0x' + f"{sender:064x}", '0x' + f"{0x99:064x}"],
+            'data': '0x' + f"{value:064x}",
+            'blockNumber': hex(block_number),
+            'blockHash': '0x' + f"{block_number:064x}",
+            'transactionHash': '0x' + f"{block_number:064x}",
+            'transactionIndex': '0x0',
+            'logIndex': '0x0',
+            'removed': False}
+
+
+class LogTransfer:
+    def __init__(self, log):
+        self.sender = Address(log['args']['from'])
+        self.value = Wad(log['args']['value'])
+        self.block_number = log['blockNumber']
+
+
+class FakeToken(Contract):
+    abi = Contract._load_abi(__name__, '../pymaker/abi/ERC20Token.abi')
+
+    def __init__(self, web3: Web3, address: Address):
+        self.web3 = web3
+        self.address = address
+        self._contract = self._get_contract(web3, self.abi, address)
+
+    def past_transfer(self, number_of_past_blocks: int, event_filter: dict = None) -> list:
+        return self._past_events(self._contract, 'Transfer', LogTransfer, number_of_past_blocks, event_filter)
+
+
+class TestEventScanner:
+    def setup_method(self):
+        # there is one `Transfer` in every 10th block, its value being equal to the block number
+        self.ranges = []
+        self.max_range = None
+        self.failing_block = None
+
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_blockNumber':
+                return hex(1000)
+            elif method == 'eth_getLogs':
+                from_block = int(params[0]['fromBlock'], 16)
+                to_block = int(params[0]['toBlock'], 16)
+                self.ranges.append((from_block, to_block))
+
+                if self.max_range is not None and to_block - from_block + 1 > self.max_range:
+                    raise Exception("Query returned more than 10000 results")
+                if self.failing_block is not None and from_block <= self.failing_block <= to_block:
+                    raise Exception("Internal error")
+
+                sender_filter = params[0]['topics'][1] if len(params[0]['topics']) > 1 else None
+                logs = [transfer_log(block, block % 3, block) for block in range(from_block, to_block + 1)
+                        if block % 10 == 0]
+                return [log for log in logs if sender_filter is None or log['topics'][1] in sender_filter]
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.token = FakeToken(web3=self.web3, address=Address(TOKEN))
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def scanner(self, from_block: int, to_block: int, **kwargs) -> EventScanner:
+        return EventScanner(self.token._contract, 'Transfer', from_block, to_block, transform=LogTransfer, **kwargs)
+
+    def test_should_yield_events_in_order_querying_in_chunks(self):
+        # when
+        events = list(self.scanner(1, 1000, chunk_size=50, max_chunk_size=50).scan())
+
+        # then
+        assert [event.block_number for event in events] == list(range(10, 1001, 10))
+        assert [event.value for event in events] == [Wad(block) for block in range(10, 1001, 10)]
+
+        # and
+        assert sorted(self.ranges) == [(block, block + 49) for block in range(1, 1000, 50)]
+
+    def test_should_grow_chunks_after_successful_queries(self):
+        # when
+        scanner = self.scanner(1, 1000, chunk_size=10, max_chunk_size=400, max_workers=1)
+        events = list(scanner.scan())
+
+        # then
+        assert len(events) == 100
+        assert self.ranges == [(1, 10), (11, 30), (31, 70), (71, 150), (151, 310), (311, 630), (631, 1000)]
+        assert scanner.chunk_size == 400
+
+    def test_should_split_chunks_the_node_can_not_handle(self):
+        # given
+        self.max_range = 100
+
+        # when
+        scanner = self.scanner(1, 1000, chunk_size=400, max_chunk_size=400, max_workers=1)
+        events = list(scanner.scan())
+
+        # then
+        assert [event.block_number for event in events] == list(range(10, 1001, 10))
+        assert all(to_block - from_block < 400 for from_block, to_block in self.ranges[1:])
+
+    def test_should_fail_if_a_single_block_keeps_failing(self):
+        # given
+        self.failing_block = 555
+
+        # when
+        scanner = self.scanner(1, 1000, chunk_size=100, max_chunk_size=100, max_workers=1, max_retries=1)
+        events = []
+        with pytest.raises(Exception):
+            for event in scanner.scan():
+                events.append(event)
+
+        # then
+        assert [event.block_number for event in events] == list(range(10, 501, 10))
+        assert scanner.next_block == 501
+
+    def test_should_resume_scanning_without_duplicates(self):
+        # given
+        scanner = self.scanner(1, 1000, chunk_size=100, max_chunk_size=100)
+
+        # when
+        events = []
+        for event in scanner.scan():
+            events.append(event)
+            if len(events) == 15:
+                break
+
+        # and
+        events.extend(scanner.scan())
+
+        # then
+        assert [event.block_number for event in events] == list(range(10, 1001, 10))
+        assert scanner.next_block == 1001
+
+    def test_should_filter_by_indexed_arguments(self):
+        # when
+        events = list(EventScanner(self.token._contract, 'Transfer', 1, 100,
+                                   event_filter={'from': '0x0000000000000000000000000000000000000001'}).scan())
+
+        # then
+        assert [event['blockNumber'] for event in events] == [10, 40, 70, 100]
+
+    def test_should_filter_by_non_indexed_arguments(self):
+        # when
+        events = list(EventScanner(self.token._contract, 'Transfer', 1, 100, event_filter={'value': 40}).scan())
+
+        # then
+        assert [event['blockNumber'] for event in events] == [40]
+
+    def test_should_be_used_for_past_events(self):
+        # when
+        events = self.token.past_transfer(300)
+
+        # then
+        assert [event.block_number for event in events] == list(range(700, 1001, 10))
+        assert min(from_block for from_block, _ in self.ranges) == 700
+        assert max(to_block for _, to_block in self.ranges) == 1000
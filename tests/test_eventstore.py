@@ -0,0 +1,180 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.eventstore import EventStore, enable_event_store, event_store
+from pymaker.numeric import Wad
+from tests.helpers import JsonRpcServer
+from tests.test_events import TOKEN, FakeToken, transfer_log
+
+
+class TestEventStore:
+    def setup_method(self):
+        # there is one `Transfer` in every 10th block, its value being equal to the block number
+        # (plus `value_offset` for blocks from `fork_block` onwards, to simulate a chain reorganization)
+        self.head = 1000
+        self.fork_block = None
+        self.value_offset = 0
+        self.ranges = []
+
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_blockNumber':
+                return hex(self.head)
+            elif method == 'eth_getLogs':
+                from_block = int(params[0]['fromBlock'], 16)
+                to_block = int(params[0]['toBlock'], 16)
+                self.ranges.append((from_block, to_block))
+
+                def value(block: int) -> int:
+                    if self.fork_block is not None and block >= self.fork_block:
+                        return block + self.value_offset
+                    return block
+
+                return [transfer_log(block, block % 3, value(block)) for block in range(from_block, to_block + 1)
+                        if block % 10 == 0]
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def token(self, path: str, reorg_depth: int = 12) -> FakeToken:
+        web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        enable_event_store(web3, path, reorg_depth)
+        return FakeToken(web3=web3, address=Address(TOKEN))
+
+    def test_should_be_enabled_only_once(self, tmpdir):
+        # given
+        web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        store = enable_event_store(web3, str(tmpdir.join('events.db')))
+
+        # expect
+        assert isinstance(store, EventStore)
+        assert enable_event_store(web3, str(tmpdir.join('other.db'))) is store
+        assert event_store(web3) is store
+        assert event_store(Web3(HTTPProvider(self.server.endpoint_uri))) is None
+
+    def test_should_fetch_only_blocks_not_synced_yet(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')), reorg_depth=5)
+        assert [event.block_number for event in token.past_transfer(500)] == list(range(500, 1001, 10))
+
+        # when
+        self.ranges = []
+        self.head = 1100
+
+        # then
+        assert [event.block_number for event in token.past_transfer(600)] == list(range(500, 1101, 10))
+        assert min(from_block for from_block, _ in self.ranges) == 996
+        assert max(to_block for _, to_block in self.ranges) == 1100
+
+    def test_should_fetch_earlier_blocks_if_requested(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')))
+        token.past_transfer(100)
+
+        # when
+        self.ranges = []
+        events = token.past_transfer(300)
+
+        # then
+        assert [event.block_number for event in events] == list(range(700, 1001, 10))
+        assert self.ranges == [(700, 899)]
+
+    def test_should_not_fetch_anything_for_already_synced_blocks(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')))
+        token.past_transfer(500)
+
+        # when
+        self.ranges = []
+        events = token.past_transfer(200)
+
+        # then
+        assert [event.block_number for event in events] == list(range(800, 1001, 10))
+        assert self.ranges == []
+
+    def test_should_persist_events_between_restarts(self, tmpdir):
+        # given
+        self.token(str(tmpdir.join('events.db')), reorg_depth=5).past_transfer(1000)
+
+        # when
+        self.ranges = []
+        self.head = 1050
+        events = self.token(str(tmpdir.join('events.db')), reorg_depth=5).past_transfer(1050)
+
+        # then
+        assert [event.block_number for event in events] == list(range(0, 1051, 10))
+        assert self.ranges == [(996, 1050)]
+
+    def test_should_roll_back_recent_blocks_on_sync(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')), reorg_depth=12)
+        assert token.past_transfer(100)[-1].value == Wad(1000)
+
+        # when
+        self.fork_block = 990
+        self.value_offset = 1
+        self.head = 1010
+        events = token.past_transfer(120)
+
+        # then
+        assert [event.value for event in events] == [Wad(block) for block in range(890, 990, 10)] + \
+                                                    [Wad(block + 1) for block in range(990, 1011, 10)]
+
+    def test_should_fetch_rolled_back_blocks_again(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')), reorg_depth=0)
+        assert token.past_transfer(100)[-1].value == Wad(1000)
+
+        # when
+        self.fork_block = 950
+        self.value_offset = 1
+        self.ranges = []
+        event_store(token.web3).rollback(950)
+
+        # then
+        assert event_store(token.web3).synced_range(token._contract, 'Transfer') == (900, 949)
+
+        # when
+        events = token.past_transfer(100)
+
+        # then
+        assert [event.value for event in events] == [Wad(block) for block in range(900, 950, 10)] + \
+                                                    [Wad(block + 1) for block in range(950, 1001, 10)]
+        assert self.ranges == [(950, 1000)]
+
+    def test_should_filter_stored_events(self, tmpdir):
+        # given
+        token = self.token(str(tmpdir.join('events.db')))
+        token.past_transfer(1000)
+
+        # when
+        self.ranges = []
+        from_one = token.past_transfer(100, {'from': '0x0000000000000000000000000000000000000001'})
+        with_value = token.past_transfer(100, {'value': 940})
+
+        # then
+        assert [event.block_number for event in from_one] == [910, 940, 970, 1000]
+        assert [event.block_number for event in with_value] == [940]
+        assert self.ranges == []
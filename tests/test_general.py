@@ -15,12 +15,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
+import threading
+from unittest.mock import Mock
+
 import pytest
 from hexbytes import HexBytes
+from web3 import Web3, HTTPProvider
 
-from pymaker import Address, Calldata, Receipt, Transfer
+from pymaker import Address, Calldata, Receipt, Transfer, NonceAllocator, nonce_allocator, ReceiptWatcher, \
+    TransactIntent
 from pymaker.numeric import Wad
-from tests.helpers import is_hashable
+from pymaker.token import ERC20Token
+from tests.helpers import is_hashable, JsonRpcServer
 
 
 class TestAddress:
@@ -92,6 +99,40 @@ class TestAddress:
         assert address1 < address3
         assert address1 <= address3
 
+    def test_creation_from_bytes(self):
+        # given
+        address = Address('0x0000011111000001111100000111110000011111')
+
+        # expect
+        assert Address(address.as_bytes()) == address
+        assert Address(bytearray(address.as_bytes())) == address
+        assert Address(HexBytes(address.as_bytes())) == address
+
+    def test_creation_from_different_cases(self):
+        # expect
+        assert Address('0xe94e3bbb6b0a1e6f5d65b1fb6afb4e8ae79ebcb3') == \
+               Address('0xE94E3BBB6B0A1E6F5D65B1FB6AFB4E8AE79EBCB3')
+        assert Address('0xe94e3bbb6b0a1e6f5d65b1fb6afb4e8ae79ebcb3').address == \
+               Address('0xE94E3BBB6B0A1E6F5D65B1FB6AFB4E8AE79EBCB3').address == \
+               '0xE94E3BbB6b0A1E6F5d65b1fB6AFB4e8AE79ebcb3'
+
+    def test_should_reuse_checksummed_strings(self):
+        # expect
+        assert Address('0x0000011111000001111100000111110000011111').address is \
+               Address('0x0000011111000001111100000111110000011111').address
+
+    def test_should_not_have_instance_dict(self):
+        # expect
+        with pytest.raises(AttributeError):
+            Address('0x0000011111000001111100000111110000011111').some_attribute = 1
+
+    def test_should_be_picklable(self):
+        # given
+        address = Address('0x0000011111000001111100000111110000011111')
+
+        # expect
+        assert pickle.loads(pickle.dumps(address)) == address
+
 
 class TestCalldata:
     def test_creation(self):
@@ -261,3 +302,198 @@ class TestTransfer:
         assert transfer1b != transfer2
         assert transfer2 != transfer1a
         assert transfer2 != transfer1b
+
+
+class TestTransactIntent:
+    def setup_method(self):
+        self.server = JsonRpcServer(lambda method, params: '0x6000' if method == 'eth_getCode' else None)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.intent = TransactIntent(ERC20Token, Address('0x0000011111222223333344444555556666677777'), 'transfer',
+                                     [Address('0x0000000000111111111100000000001111111111'), Wad.from_number(5)])
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_be_picklable(self):
+        # when
+        intent = pickle.loads(pickle.dumps(self.intent))
+
+        # then
+        assert intent.contract_class is ERC20Token
+        assert intent.address == self.intent.address
+        assert intent.method == 'transfer'
+        assert intent.args == self.intent.args
+
+    def test_should_create_transact(self):
+        # when
+        transact = self.intent.transact(self.web3)
+
+        # then
+        assert transact.web3 is self.web3
+        assert transact.address == Address('0x0000011111222223333344444555556666677777')
+        assert transact.function_name == 'transfer'
+        assert transact.parameters == ['0x0000000000111111111100000000001111111111', Wad.from_number(5).value]
+
+
+def mocked_web3_pending_nonce(pending: int) -> Web3:
+    web3 = Mock(Web3)
+    web3.version = Mock()
+    web3.version.node = "Geth/v1.8.0"
+    web3.eth = Mock()
+    web3.eth.getTransactionCount = Mock(return_value=pending)
+    return web3
+
+
+class TestNonceAllocator:
+    def setup_method(self):
+        self.web3 = mocked_web3_pending_nonce(5)
+        self.allocator = NonceAllocator(self.web3, '0x0000000000111111111100000000001111111111')
+
+    def test_should_sync_with_the_node_only_on_first_use(self):
+        # expect
+        assert self.allocator.allocate() == 5
+        assert self.allocator.allocate() == 6
+        assert self.allocator.allocate() == 7
+        # and
+        self.web3.eth.getTransactionCount.assert_called_once_with('0x0000000000111111111100000000001111111111',
+                                                                  block_identifier='pending')
+
+    def test_should_sync_with_the_node_again_after_resync(self):
+        # given
+        assert self.allocator.allocate() == 5
+        assert self.allocator.allocate() == 6
+
+        # when
+        self.web3.eth.getTransactionCount = Mock(return_value=10)
+        self.allocator.resync()
+
+        # then
+        assert self.allocator.allocate() == 10
+        assert self.allocator.allocate() == 11
+
+    def test_should_never_allocate_the_same_nonce_twice(self):
+        # given
+        nonces = []
+
+        def allocate_many():
+            for _ in range(100):
+                nonces.append(self.allocator.allocate())
+
+        # when
+        threads = [threading.Thread(target=allocate_many) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # then
+        assert sorted(nonces) == list(range(5, 1005))
+
+    def test_should_share_allocator_per_web3_and_account(self):
+        # given
+        other_web3 = mocked_web3_pending_nonce(5)
+
+        # expect
+        assert nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111') is \
+               nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111')
+        assert nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111') is \
+               nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111'.upper().replace('0X', '0x'))
+        assert nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111') is not \
+               nonce_allocator(self.web3, '0x1111111111000000000011111111110000000000')
+        assert nonce_allocator(self.web3, '0x0000000000111111111100000000001111111111') is not \
+               nonce_allocator(other_web3, '0x0000000000111111111100000000001111111111')
+
+
+class TestReceiptWatcher:
+    def setup_method(self):
+        self.transaction_counts = {'0x0000000000111111111100000000001111111111': 3,
+                                   '0x1111111111000000000011111111110000000000': 7}
+        self.receipts = {}
+
+        def handler(method, params):
+            if method == 'eth_getTransactionCount':
+                return hex(self.transaction_counts[params[0]])
+            elif method == 'eth_getTransactionReceipt':
+                return self.receipts.get(params[0])
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.watcher = ReceiptWatcher(self.web3, frequency=60)
+
+    def teardown_method(self):
+        self.server.stop()
+
+    @staticmethod
+    def raw_receipt(transaction_hash: str, block_number: int) -> dict:
+        return {'transactionHash': transaction_hash, 'transactionIndex': '0x0', 'blockNumber': hex(block_number),
+                'blockHash': '0x' + '11' * 32, 'cumulativeGasUsed': '0x5208', 'gasUsed': '0x5208',
+                'contractAddress': None, 'logs': [], 'status': '0x1'}
+
+    def test_should_get_transaction_counts(self):
+        # expect
+        assert self.watcher.transaction_count('0x0000000000111111111100000000001111111111') == 3
+        assert self.watcher.transaction_count('0x1111111111000000000011111111110000000000') == 7
+
+    def test_should_not_poll_more_often_than_frequency(self):
+        # given
+        assert self.watcher.transaction_count('0x0000000000111111111100000000001111111111') == 3
+
+        # when
+        self.transaction_counts['0x0000000000111111111100000000001111111111'] = 4
+
+        # then
+        assert self.watcher.transaction_count('0x0000000000111111111100000000001111111111') == 3
+        assert len(self.server.payloads) == 1
+
+    def test_should_poll_for_everything_watched_in_one_batch(self):
+        # given
+        self.watcher.frequency = 0
+        self.watcher.transaction_count('0x0000000000111111111100000000001111111111')
+        self.watcher.transaction_count('0x1111111111000000000011111111110000000000')
+        self.watcher.receipt('0x' + 'aa' * 32)
+        self.watcher.receipt('0x' + 'bb' * 32)
+
+        # when
+        self.server.payloads = []
+        self.watcher.receipt('0x' + 'bb' * 32)
+
+        # then
+        assert len(self.server.payloads) == 1
+        assert sorted(request['method'] for request in self.server.payloads[0]) == \
+               ['eth_getTransactionCount', 'eth_getTransactionCount',
+                'eth_getTransactionReceipt', 'eth_getTransactionReceipt']
+
+    def test_should_return_formatted_receipts_of_mined_transactions_only(self):
+        # given
+        self.watcher.frequency = 0
+        transaction_hash = '0x' + 'aa' * 32
+
+        # expect
+        assert self.watcher.receipt(transaction_hash) is None
+
+        # when
+        self.receipts[transaction_hash] = self.raw_receipt(transaction_hash, 12)
+
+        # then
+        receipt = self.watcher.receipt(HexBytes(transaction_hash))
+        assert receipt['blockNumber'] == 12
+        assert receipt.gasUsed == 21000
+        assert Receipt(receipt).transaction_hash == HexBytes(transaction_hash)
+
+    def test_should_not_ask_for_receipts_of_mined_transactions_again(self):
+        # given
+        self.watcher.frequency = 0
+        transaction_hash = '0x' + 'aa' * 32
+        self.receipts[transaction_hash] = self.raw_receipt(transaction_hash, 12)
+        assert self.watcher.receipt(transaction_hash) is not None
+
+        # when
+        self.server.payloads = []
+        self.watcher.transaction_count('0x0000000000111111111100000000001111111111')
+
+        # then
+        assert self.watcher.receipt(transaction_hash)['blockNumber'] == 12
+        assert all(request['method'] != 'eth_getTransactionReceipt'
+                   for payload in self.server.payloads for request in payload)
@@ -15,6 +15,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+import os
+import threading
 import time
 from threading import Event
 from unittest.mock import Mock
@@ -24,8 +27,24 @@ from mock import MagicMock
 from web3 import Web3, HTTPProvider
 
 import pymaker
-from pymaker import Address
-from pymaker.lifecycle import Lifecycle, trigger_event
+from pymaker import Address, TransactIntent
+from pymaker.blocks import BlockContext
+from pymaker.cache import call_cache
+from pymaker.lifecycle import Lifecycle, AsyncLifecycle, Supervisor, trigger_event
+from pymaker.metrics import MetricsRegistry
+from pymaker.numeric import Wad
+from pymaker.token import ERC20Token
+from tests.helpers import JsonRpcServer
+
+
+# callbacks run in worker processes have to be picklable, so they are defined at module level
+def process_block_callback(context: BlockContext):
+    return {'pid': os.getpid(), 'number': context.number, 'balance': context['balance']}
+
+
+def process_timer_callback():
+    return [TransactIntent(ERC20Token, Address('0x0000000000111111111100000000001111111111'), 'transfer',
+                           [Address('0x0000000000000000000000000000000000000007'), Wad(os.getpid())])]
 
 
 @pytest.mark.timeout(60)
@@ -371,3 +390,428 @@ class TestLifecycle:
                 lifecycle.on_event(Event(), 1, event_callback_1)
                 lifecycle.on_event(Event(), 1, event_callback_2)
                 lifecycle.on_shutdown(shutdown_callback)  # assertions are in `shutdown_callback`
+
+
+@pytest.mark.timeout(60)
+class TestAsyncLifecycle:
+    def setup_method(self):
+        # a new block gets mined each time the block filter is polled
+        self.block_number = 100
+
+        def handler(method, params):
+            if method == 'web3_clientVersion':
+                return 'EthereumJS TestRPC/v2.1.0/ethereum-js'
+            elif method == 'eth_newBlockFilter':
+                return '0x1'
+            elif method == 'eth_getFilterChanges':
+                self.block_number += 1
+                return ['0x' + f"{self.block_number:064x}"]
+            elif method == 'eth_getBlockByHash':
+                return {'number': hex(int(params[0], 16)), 'hash': params[0],
+                        'parentHash': '0x' + f"{int(params[0], 16) - 1:064x}", 'timestamp': hex(1500000000)}
+            elif method == 'eth_syncing':
+                return False
+            elif method == 'eth_blockNumber':
+                return hex(self.block_number)
+            elif method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_call':
+                # `balanceOf` of each address returns the last byte of it (in Wei)
+                return '0x' + params[0]['data'][-2:].rjust(64, '0')
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+
+        pymaker.filter_threads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_always_exit(self):
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3):
+                pass
+
+    def test_should_call_startup_and_shutdown_callbacks(self):
+        # given
+        ordering = []
+
+        async def startup_callback():
+            ordering.append('STARTUP')
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle() as lifecycle:
+                lifecycle.on_startup(startup_callback)
+                lifecycle.on_shutdown(lambda: ordering.append('SHUTDOWN'))
+
+        # then
+        assert ordering == ['STARTUP', 'SHUTDOWN']
+
+    def test_every_should_run_coroutines_on_one_thread(self):
+        # given
+        threads = set()
+
+        async def callback():
+            threads.add(threading.get_ident())
+            if len(threads) > 1 or self.counter >= 2:
+                lifecycle.terminate("Unit test is over")
+            self.counter += 1
+
+        self.counter = 0
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle() as lifecycle:
+                lifecycle.every(1, callback)
+                lifecycle.every(1, callback)
+
+        # then
+        assert threads == {threading.get_ident()}
+        assert lifecycle.terminated_internally
+
+    def test_every_should_skip_invocations_if_previous_one_still_running(self):
+        # given
+        self.running = 0
+        self.max_running = 0
+        self.counter = 0
+
+        async def callback():
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            await asyncio.sleep(2.5)
+            self.running -= 1
+            self.counter += 1
+            if self.counter >= 2:
+                lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle() as lifecycle:
+                lifecycle.every(1, callback)
+
+        # then
+        assert self.counter == 2
+        assert self.max_running == 1
+
+    def test_on_event_fires_whenever_event_triggered(self):
+        # given
+        event = Event()
+        mock = Mock()
+        self.counter = 0
+
+        def every_callback():
+            self.counter = self.counter + 1
+            trigger_event(event)
+            if self.counter >= 2:
+                time.sleep(1)
+                lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle() as lifecycle:
+                lifecycle.every(1, every_callback)
+                lifecycle.on_event(event, 9999, mock)
+
+        # then
+        assert mock.call_count >= 2
+
+    def test_should_not_call_shutdown_until_callbacks_have_finished(self):
+        # given
+        self.finished = False
+
+        async def every_callback():
+            lifecycle.terminate("Unit test is over")
+            await asyncio.sleep(2)
+            self.finished = True
+
+        def shutdown_callback():
+            assert self.finished
+
+        # expect
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle() as lifecycle:
+                lifecycle.every(1, every_callback)
+                lifecycle.on_shutdown(shutdown_callback)  # assertions are in `shutdown_callback`
+
+    def test_on_block(self):
+        # given
+        block_numbers = []
+
+        async def callback():
+            block_numbers.append(self.block_number)
+            if len(block_numbers) >= 2:
+                lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3) as lifecycle:
+                lifecycle.on_block(callback)
+
+        # then
+        assert block_numbers[:2] == [101, 102]
+        assert lifecycle.terminated_internally
+        assert not lifecycle.fatal_termination
+
+    def test_on_block_with_prefetched_context(self):
+        # given
+        token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        contexts = []
+
+        def callback(context: BlockContext):
+            contexts.append(context)
+            lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3) as lifecycle:
+                lifecycle.on_block(callback, prefetch={
+                    'balance': (token.balance_of, Address('0x0000000000000000000000000000000000000007'))
+                })
+
+        # then
+        assert contexts[0].number == 101
+        assert contexts[0]['balance'] == Wad(7)
+
+    def test_on_block_in_process(self):
+        # given
+        token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        results = []
+
+        def intents_callback(intents: list):
+            results.extend(intents)
+            lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3) as lifecycle:
+                lifecycle.use_process_pool(1)
+                lifecycle.on_block(process_block_callback, in_process=True, prefetch={
+                    'balance': (token.balance_of, Address('0x0000000000000000000000000000000000000007'))
+                })
+                lifecycle.on_intents(intents_callback)
+
+        # then
+        assert results[0]['pid'] != os.getpid()
+        assert results[0]['number'] == 101
+        assert results[0]['balance'] == Wad(7)
+
+    def test_every_in_process_should_return_intents(self):
+        # given
+        intents = []
+
+        def intents_callback(result: list):
+            intents.extend(result)
+            lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3) as lifecycle:
+                lifecycle.every(1, process_timer_callback, in_process=True)
+                lifecycle.on_intents(intents_callback)
+
+        # then
+        assert len(intents) == 1
+        assert isinstance(intents[0], TransactIntent)
+        assert intents[0].args[1] != Wad(os.getpid())
+        assert intents[0].transact(self.web3).function_name == 'transfer'
+
+    def test_should_report_metrics(self):
+        # given
+        registry = MetricsRegistry()
+
+        async def block_callback():
+            await asyncio.sleep(1.5)
+
+        def every_callback():
+            if registry.counter('pymaker_blocks_skipped_total', {'reason': 'busy'}) > 0:
+                lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(self.web3) as lifecycle:
+                lifecycle.use_metrics(registry)
+                lifecycle.on_block(block_callback)
+                lifecycle.every(1, every_callback)
+
+        # then
+        assert registry.gauge('pymaker_block_number') >= 102
+        assert registry.histogram('pymaker_block_lag_seconds').count >= 2
+        assert registry.histogram('pymaker_callback_delay_seconds', {'callback': 'block'}).count >= 1
+        assert registry.histogram('pymaker_callback_duration_seconds', {'callback': 'block'}).sum >= 1.5
+        assert registry.histogram('pymaker_callback_duration_seconds', {'callback': 'timer_1'}).count >= 1
+        assert registry.histogram('pymaker_timer_drift_seconds', {'timer': '1'}).count >= 1
+        assert registry.counter('pymaker_blocks_skipped_total', {'reason': 'busy'}) >= 1
+
+    def test_should_detect_reorgs(self):
+        # given
+        chain = {}
+
+        def block(block_number: int, fork: int = 0, parent_fork: int = 0) -> str:
+            block_hash = '0x' + f"{fork:02x}{block_number:062x}"
+            chain[block_hash] = {'number': hex(block_number), 'hash': block_hash,
+                                 'parentHash': '0x' + f"{parent_fork:02x}{block_number - 1:062x}",
+                                 'timestamp': hex(1500000000 + block_number)}
+            return block_hash
+
+        # block #103 gets replaced by a competing one, followed by block #104
+        block(103, fork=1)
+        delivered = [block(101), block(102), block(103), block(104, fork=1, parent_fork=1)]
+
+        def handler(method, params):
+            if method == 'web3_clientVersion':
+                return 'EthereumJS TestRPC/v2.1.0/ethereum-js'
+            elif method == 'eth_newBlockFilter':
+                return '0x1'
+            elif method == 'eth_getFilterChanges':
+                return [delivered.pop(0)] if len(delivered) > 0 else []
+            elif method == 'eth_getBlockByHash':
+                return chain[params[0]]
+            elif method == 'eth_syncing':
+                return False
+            else:
+                raise Exception("Unknown method")
+
+        server = JsonRpcServer(handler)
+        registry = MetricsRegistry()
+        reorgs = []
+        blocks = []
+
+        async def reorg_callback(depth, old_blocks, new_blocks):
+            reorgs.append((depth, [block['number'] for block in old_blocks], [block['number'] for block in new_blocks]))
+
+        def block_callback(context: BlockContext):
+            blocks.append((context.number, context.hash.hex()[:4]))
+            if context.number == 104:
+                lifecycle.terminate("Unit test is over")
+
+        # when
+        with pytest.raises(SystemExit):
+            with AsyncLifecycle(Web3(HTTPProvider(server.endpoint_uri))) as lifecycle:
+                lifecycle.use_metrics(registry)
+                lifecycle.on_block(block_callback, context=True)
+                lifecycle.on_reorg(reorg_callback)
+
+        server.stop()
+
+        # then
+        assert reorgs == [(1, [103], [103, 104])]
+        assert blocks[-1] == (104, '0x01')
+        assert registry.counter('pymaker_reorgs_total') == 1
+        assert registry.counter('pymaker_reorged_blocks_total') == 1
+
+
+@pytest.mark.timeout(60)
+class TestSupervisor:
+    def setup_method(self):
+        # a new block gets mined each time the block filter is polled
+        self.block_number = 100
+
+        def handler(method, params):
+            if method == 'web3_clientVersion':
+                return 'EthereumJS TestRPC/v2.1.0/ethereum-js'
+            elif method == 'eth_newBlockFilter':
+                return '0x1'
+            elif method == 'eth_getFilterChanges':
+                self.block_number += 1
+                return ['0x' + f"{self.block_number:064x}"]
+            elif method == 'eth_getBlockByHash':
+                return {'number': hex(int(params[0], 16)), 'hash': params[0],
+                        'parentHash': '0x' + f"{int(params[0], 16) - 1:064x}", 'timestamp': hex(1500000000)}
+            elif method == 'eth_syncing':
+                return False
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+
+        pymaker.filter_threads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_always_exit(self):
+        with pytest.raises(SystemExit):
+            with Supervisor(self.web3) as supervisor:
+                supervisor.lifecycle('idle').on_startup(lambda: None)
+
+    def test_should_share_one_block_source_and_call_cache(self):
+        # given
+        blocks = {'first': [], 'second': []}
+
+        def block_callback(name: str):
+            def callback(context: BlockContext):
+                blocks[name].append(context.number)
+                if all(len(blocks[keeper]) >= 2 for keeper in blocks):
+                    for keeper in keepers:
+                        keeper.terminate()
+            return callback
+
+        # when
+        with pytest.raises(SystemExit) as exit_info:
+            with Supervisor(self.web3) as supervisor:
+                keepers = []
+                for name in blocks:
+                    lifecycle = supervisor.lifecycle(name)
+                    lifecycle.on_block(block_callback(name), context=True)
+                    keepers.append(lifecycle)
+
+        # then
+        assert exit_info.value.code == 0
+        assert all(len(blocks[name]) >= 2 for name in blocks)
+        assert len([payload for payload in self.server.payloads if payload['method'] == 'eth_newBlockFilter']) == 1
+        assert call_cache(self.web3) is not None
+
+    def test_should_isolate_failures_of_keepers(self):
+        # given
+        ordering = []
+        self.healthy_blocks = 0
+
+        def failing_startup():
+            raise Exception("Startup failed")
+
+        def failing_block_callback():
+            raise Exception("Block callback failed")
+
+        def terminating_block_callback():
+            terminating.terminate("Keeper is done")
+
+        def healthy_block_callback():
+            self.healthy_blocks += 1
+            if self.healthy_blocks >= 3:
+                failing.terminate("Unit test is over")
+                healthy.terminate("Unit test is over")
+
+        registry = MetricsRegistry()
+
+        # when
+        with pytest.raises(SystemExit):
+            with Supervisor(self.web3) as supervisor:
+                supervisor.use_metrics(registry)
+
+                broken = supervisor.lifecycle('broken')
+                broken.on_startup(failing_startup)
+                broken.on_block(lambda: ordering.append('BROKEN BLOCK'))
+                broken.on_shutdown(lambda: ordering.append('BROKEN SHUTDOWN'))
+
+                failing = supervisor.lifecycle('failing')
+                failing.on_block(failing_block_callback)
+                failing.on_shutdown(lambda: ordering.append('FAILING SHUTDOWN'))
+
+                terminating = supervisor.lifecycle('terminating')
+                terminating.on_block(terminating_block_callback)
+                terminating.on_shutdown(lambda: ordering.append('TERMINATING SHUTDOWN'))
+
+                healthy = supervisor.lifecycle('healthy')
+                healthy.on_block(healthy_block_callback)
+                healthy.on_shutdown(lambda: ordering.append('HEALTHY SHUTDOWN'))
+
+        # then
+        assert self.healthy_blocks >= 3
+        assert ordering[0] == 'TERMINATING SHUTDOWN'
+        assert sorted(ordering[1:]) == ['FAILING SHUTDOWN', 'HEALTHY SHUTDOWN']
+        assert registry.gauge('pymaker_block_number', {'keeper': 'healthy'}) >= 103
+        assert registry.gauge('pymaker_block_number', {'keeper': 'broken'}) is None
@@ -0,0 +1,115 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+import requests
+
+from pymaker.metrics import MetricsSink, MetricsRegistry, PrometheusExporter
+
+
+class TestMetricsRegistry:
+    def setup_method(self):
+        self.registry = MetricsRegistry(buckets=(0.1, 1.0))
+
+    def test_should_count(self):
+        # when
+        self.registry.increment('skipped_total', labels={'reason': 'busy'})
+        self.registry.increment('skipped_total', 2, labels={'reason': 'busy'})
+        self.registry.increment('skipped_total', labels={'reason': 'syncing'})
+
+        # then
+        assert self.registry.counter('skipped_total', {'reason': 'busy'}) == 3
+        assert self.registry.counter('skipped_total', {'reason': 'syncing'}) == 1
+        assert self.registry.counter('skipped_total', {'reason': 'stale'}) == 0
+
+    def test_should_set_gauges(self):
+        # when
+        self.registry.set('block_number', 10)
+        self.registry.set('block_number', 11)
+
+        # then
+        assert self.registry.gauge('block_number') == 11
+        assert self.registry.gauge('other') is None
+
+    def test_should_record_histograms(self):
+        # when
+        for value in [0.05, 0.1, 0.5, 5.0]:
+            self.registry.observe('duration_seconds', value)
+
+        # then
+        histogram = self.registry.histogram('duration_seconds')
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(5.65)
+
+    def test_should_add_labels_through_labelled_view(self):
+        # given
+        view = self.registry.labelled(keeper='oasis')
+
+        # when
+        view.increment('skipped_total', labels={'reason': 'busy'})
+
+        # then
+        assert self.registry.counter('skipped_total', {'keeper': 'oasis', 'reason': 'busy'}) == 1
+
+    def test_should_render_prometheus_text(self):
+        # given
+        self.registry.increment('skipped_total', labels={'reason': 'busy'})
+        self.registry.set('block_number', 10)
+        self.registry.observe('duration_seconds', 0.5, labels={'callback': 'block'})
+
+        # expect
+        assert self.registry.prometheus_text() == '# TYPE skipped_total counter\n' \
+                                                  'skipped_total{reason="busy"} 1\n' \
+                                                  '# TYPE block_number gauge\n' \
+                                                  'block_number 10\n' \
+                                                  '# TYPE duration_seconds histogram\n' \
+                                                  'duration_seconds_bucket{callback="block",le="0.1"} 0\n' \
+                                                  'duration_seconds_bucket{callback="block",le="1.0"} 1\n' \
+                                                  'duration_seconds_bucket{callback="block",le="+Inf"} 1\n' \
+                                                  'duration_seconds_sum{callback="block"} 0.5\n' \
+                                                  'duration_seconds_count{callback="block"} 1\n'
+
+    def test_null_sink_should_accept_everything(self):
+        # given
+        sink = MetricsSink()
+
+        # expect
+        sink.increment('a')
+        sink.set('b', 1)
+        sink.labelled(keeper='x').observe('c', 1.0)
+
+
+class TestPrometheusExporter:
+    def test_should_serve_metrics(self):
+        # given
+        registry = MetricsRegistry()
+        registry.increment('skipped_total')
+        exporter = PrometheusExporter(registry, 0)
+
+        try:
+            # when
+            response = requests.get(f"http://127.0.0.1:{exporter.port}/metrics")
+            not_found = requests.get(f"http://127.0.0.1:{exporter.port}/other")
+
+            # then
+            assert response.status_code == 200
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'skipped_total 1' in response.text
+            assert not_found.status_code == 404
+        finally:
+            exporter.stop()
@@ -0,0 +1,180 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from eth_abi import encode_abi, decode_abi
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address, Calldata
+from pymaker.deployment import Deployment
+from pymaker.feed import DSValue
+from pymaker.multicall import Multicall
+from pymaker.numeric import Wad, Ray
+from pymaker.token import ERC20Token
+from pymaker.util import bytes_to_hexstring
+from tests.helpers import JsonRpcServer
+
+
+class TestMulticall:
+    @pytest.fixture()
+    def multicall(self, deployment: Deployment) -> Multicall:
+        return Multicall.deploy(deployment.web3)
+
+    def test_fail_when_no_contract_under_that_address(self, deployment: Deployment):
+        # expect
+        with pytest.raises(Exception):
+            Multicall(web3=deployment.web3, address=Address('0xdeadadd1e5500000000000000000000000000000'))
+
+    def test_aggregate(self, deployment: Deployment, multicall: Multicall):
+        # given
+        deployment.sai.mint(Wad.from_number(15)).transact()
+
+        # when
+        block_number, results = multicall.aggregate([
+            (deployment.sai.address, Calldata.from_signature("totalSupply()", [])),
+            (deployment.sai.address, Calldata.from_signature("balanceOf(address)", [deployment.our_address.address])),
+            (Address('0xdeadadd1e5500000000000000000000000000000'), Calldata('0x12345678'))
+        ])
+
+        # then
+        assert block_number == deployment.web3.eth.blockNumber
+        assert results == [(True, Wad.from_number(15).value.to_bytes(32, byteorder='big')),
+                           (True, Wad.from_number(15).value.to_bytes(32, byteorder='big')),
+                           (True, b'')]
+
+    def test_aggregate_nothing(self, deployment: Deployment, multicall: Multicall):
+        # expect
+        assert multicall.aggregate([]) == (deployment.web3.eth.blockNumber, [])
+
+    def test_batch_should_return_same_results_as_direct_calls(self, deployment: Deployment, multicall: Multicall):
+        # given
+        deployment.sai.mint(Wad.from_number(15)).transact()
+
+        # when
+        with multicall.batch() as b:
+            tap = b.call(deployment.tub.tap)
+            axe = b.call(deployment.tub.axe)
+            par = b.call(deployment.vox.par)
+            gap = b.call(deployment.tap.gap)
+            total_supply = b.call(deployment.sai.total_supply)
+            balance = b.call(deployment.sai.balance_of, deployment.our_address)
+
+        # then
+        assert tap.result() == deployment.tub.tap()
+        assert axe.result() == deployment.tub.axe() == Ray.from_number(1)
+        assert par.result() == deployment.vox.par()
+        assert gap.result() == deployment.tap.gap()
+        assert total_supply.result() == balance.result() == Wad.from_number(15)
+        # and
+        assert b.block_number == deployment.web3.eth.blockNumber
+
+    def test_batch_should_pass_failed_calls_through_futures(self, deployment: Deployment, multicall: Multicall):
+        # given
+        dsvalue = DSValue.deploy(deployment.web3)
+
+        # when
+        with multicall.batch() as b:
+            has_value = b.call(dsvalue.has_value)
+            value = b.call(dsvalue.read_as_int)
+
+        # then
+        assert has_value.result() is False
+        with pytest.raises(Exception):
+            value.result()
+
+
+class TestMulticallBatch:
+    MULTICALL = '0x000000000000000000000000000000000000a99e'
+
+    def setup_method(self):
+        def balance_of(data):
+            assert data.startswith(bytes.fromhex('70a08231'))
+            return data[-1].to_bytes(32, byteorder='big')
+
+        # `Multicall` aggregating `balanceOf` calls only, each of them returning the last byte of the address
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_blockNumber':
+                return '0x2a'
+            elif method == 'eth_call' and params[0]['to'].lower() == self.MULTICALL:
+                packed = decode_abi(['bytes'], bytes.fromhex(params[0]['data'][10:]))[0]
+                results = b''
+                while len(packed) > 0:
+                    length = int.from_bytes(packed[20:52], byteorder='big')
+                    data = packed[52:52+length]
+                    try:
+                        return_data = balance_of(data)
+                        results += (1).to_bytes(32, byteorder='big') + len(return_data).to_bytes(32, byteorder='big') + return_data
+                    except:
+                        results += (0).to_bytes(64, byteorder='big')
+                    packed = packed[52+length:]
+                return bytes_to_hexstring(encode_abi(['uint256', 'bytes'], [42, results]))
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+        self.multicall = Multicall(web3=self.web3, address=Address(self.MULTICALL))
+        self.token = ERC20Token(web3=self.web3, address=Address('0x0000000000111111111100000000001111111111'))
+        self.server.payloads = []
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_aggregate_calls_into_one_eth_call(self):
+        # when
+        with self.multicall.batch() as b:
+            balance_1 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+            balance_2 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000002'))
+            balance_3 = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000003'))
+
+        # then
+        assert balance_1.result() == Wad(1)
+        assert balance_2.result() == Wad(2)
+        assert balance_3.result() == Wad(3)
+        assert b.block_number == 42
+        # and
+        assert len(self.server.payloads) == 1
+        assert len(self.server.payloads[0]) == 1
+        assert self.server.payloads[0][0]['method'] == 'eth_call'
+
+    def test_should_send_other_requests_in_the_same_batch(self):
+        # when
+        with self.multicall.batch() as b:
+            balance = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+            block_number = b.call(lambda: self.web3.eth.blockNumber)
+
+        # then
+        assert balance.result() == Wad(1)
+        assert block_number.result() == 42
+        # and
+        assert len(self.server.payloads) == 1
+        assert [request['method'] for request in self.server.payloads[0]] == ['eth_call', 'eth_blockNumber']
+
+    def test_should_pass_failed_calls_through_futures(self):
+        # when
+        with self.multicall.batch() as b:
+            total_supply = b.call(self.token.total_supply)
+            balance = b.call(self.token.balance_of, Address('0x0000000000000000000000000000000000000001'))
+
+        # then
+        with pytest.raises(ValueError):
+            total_supply.result()
+        # and
+        assert balance.result() == Wad(1)
+
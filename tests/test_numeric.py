@@ -15,9 +15,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import math
+import random
+from decimal import Decimal, Context, ROUND_DOWN
+from fractions import Fraction
+
 import pytest
 
-from pymaker.numeric import Wad, Ray, Rad
+from pymaker.numeric import Wad, Ray, Rad, WadArray, RayArray, RadArray
 from tests.helpers import is_hashable
 
 
@@ -681,3 +686,237 @@ class TestRad:
         assert round(Rad.from_number(123.4567), 2) == Rad.from_number(123.46)
         assert round(Rad.from_number(123.4567), 0) == Rad.from_number(123.0)
         assert round(Rad.from_number(123.4567), -2) == Rad.from_number(100.0)
+
+
+class TestIntegerArithmetic:
+    """Checks integer-only arithmetic against the `Decimal`-based implementation it has replaced.
+
+    The `Decimal`-based implementation was only exact as long as intermediate results fit in 28 significant
+    digits, so equivalence is checked within that range. Beyond it, results are checked against exact
+    rational arithmetic. Operands are random, but generated with a fixed seed so test runs are repeatable.
+    """
+
+    _context = Context(prec=1000, rounding=ROUND_DOWN)
+    types = [(Wad, 18), (Ray, 27), (Rad, 45)]
+
+    @staticmethod
+    def random_ints(count: int, max_digits: int) -> list:
+        rng = random.Random(4321)
+        return [rng.choice([-1, 1]) * rng.randrange(0, 10**rng.randint(1, max_digits)) for _ in range(count)]
+
+    @classmethod
+    def decimal_mul(cls, x: int, y: int, decimals: int) -> int:
+        result = Decimal(x) * Decimal(y) / (Decimal(10) ** Decimal(decimals))
+        return int(result.quantize(1, context=cls._context))
+
+    @classmethod
+    def decimal_div(cls, x: int, y: int, decimals: int) -> int:
+        return int((Decimal(x) * (Decimal(10) ** Decimal(decimals)) / Decimal(y)).quantize(1, context=cls._context))
+
+    @staticmethod
+    def exact(value: Fraction) -> int:
+        return math.trunc(value)
+
+    def test_multiplication_should_be_equivalent_to_decimal_arithmetic(self):
+        # `Decimal` works with 28 significant digits by default, so it is only exact for products up to 10**28
+        operands = list(zip(self.random_ints(2000, 14), reversed(self.random_ints(2000, 14))))
+
+        for x, y in operands:
+            for cls, decimals in self.types:
+                for other_cls, other_decimals in self.types:
+                    assert (cls(x) * other_cls(y)).value == self.decimal_mul(x, y, other_decimals)
+                assert (cls(x) * y).value == self.decimal_mul(x, y, 0)
+
+    def test_division_should_be_equivalent_to_decimal_arithmetic(self):
+        operands = list(zip(self.random_ints(2000, 9), reversed(self.random_ints(2000, 9))))
+
+        for x, y in operands:
+            if y != 0:
+                assert (Wad(x) / Wad(y)).value == self.decimal_div(x, y, 18)
+
+        # for larger `Ray` quotients `Decimal` rounds the last of its 28 digits instead of truncating it
+        operands = list(zip(self.random_ints(2000, 9), reversed(self.random_ints(2000, 27))))
+
+        for x, y in operands:
+            if abs(x) * 10**9 < abs(y):
+                assert (Ray(x) / Ray(y)).value == self.decimal_div(x, y, 27)
+
+    def test_conversions_should_be_equivalent_to_decimal_arithmetic(self):
+        for x in self.random_ints(2000, 18):
+            assert Wad(Ray(x)).value == int((Decimal(x) // (Decimal(10)**Decimal(9))).quantize(1, context=self._context))
+            assert Ray(Rad(x)).value == self.decimal_div(x, 1, -18)
+            assert Ray(Wad(x)).value == self.decimal_mul(x, 10**9, 0)
+
+    def test_arithmetic_should_be_exact_for_large_values(self):
+        operands = list(zip(self.random_ints(500, 80), reversed(self.random_ints(500, 80))))
+
+        for x, y in operands:
+            for cls, decimals in self.types:
+                for other_cls, other_decimals in self.types:
+                    assert (cls(x) * other_cls(y)).value == self.exact(Fraction(x * y, 10**other_decimals))
+                if y != 0:
+                    assert (cls(x) / cls(y)).value == self.exact(Fraction(x * 10**decimals, y))
+
+            assert Wad(Rad(x)).value == self.exact(Fraction(x, 10**27))
+            assert Rad(Wad(x)).value == x * 10**27
+
+    def test_division_by_zero_should_fail(self):
+        with pytest.raises(ArithmeticError):
+            Wad(1) / Wad(0)
+        with pytest.raises(ArithmeticError):
+            Ray(0) / Ray(0)
+
+
+class TestWadArray:
+    def setup_method(self):
+        self.wads = [Wad.from_number(1.5), Wad(-7), Wad.from_number(1000), Wad(0), Wad.from_number(0.3333)]
+        self.rays = [Ray.from_number(2.5), Ray(3), Ray.from_number(-0.1), Ray.from_number(7), Ray(10**27 + 1)]
+        self.rads = [Rad.from_number(0.1), Rad(-1), Rad.from_number(3), Rad(2**100), Rad.from_number(1)]
+
+    def test_should_instantiate_from_scalars(self):
+        assert WadArray(self.wads).values == [wad.value for wad in self.wads]
+        assert WadArray(self.rays).to_list() == [Wad(ray) for ray in self.rays]
+        assert WadArray([1, 2, 3]).to_list() == [Wad(1), Wad(2), Wad(3)]
+
+    def test_should_instantiate_from_ints(self):
+        assert WadArray.from_ints([1, 2, 3]) == WadArray([Wad(1), Wad(2), Wad(3)])
+
+    def test_should_instantiate_from_numbers(self):
+        assert WadArray.from_numbers([1.5, 2]) == WadArray([Wad.from_number(1.5), Wad.from_number(2)])
+
+    def test_should_instantiate_from_another_array(self):
+        assert WadArray(WadArray(self.wads)) == WadArray(self.wads)
+        assert WadArray(RayArray(self.rays)) == WadArray(self.rays)
+
+    def test_should_fail_to_instantiate_from_unsupported_types(self):
+        with pytest.raises(ArithmeticError):
+            WadArray([1.5])
+
+    def test_should_behave_like_a_sequence(self):
+        # given
+        array = WadArray(self.wads)
+
+        # expect
+        assert len(array) == 5
+        assert list(array) == self.wads
+        assert array[1] == Wad(-7)
+        assert array[1:3] == WadArray(self.wads[1:3])
+
+    def test_add_and_sub(self):
+        # given
+        array = WadArray(self.wads)
+        other = WadArray(list(reversed(self.wads)))
+
+        # expect
+        assert (array + other).to_list() == [x + y for x, y in zip(self.wads, reversed(self.wads))]
+        assert (array - other).to_list() == [x - y for x, y in zip(self.wads, reversed(self.wads))]
+        assert (array + Wad(2)).to_list() == [x + Wad(2) for x in self.wads]
+        assert (array - Wad(2)).to_list() == [x - Wad(2) for x in self.wads]
+
+    def test_add_and_sub_should_reject_other_types(self):
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) + RayArray(self.rays)
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) - Ray(2)
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) + 2
+
+    def test_should_reject_arrays_of_different_lengths(self):
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) + WadArray(self.wads[1:])
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) * RayArray(self.rays[1:])
+
+    def test_multiply_should_round_like_scalars(self):
+        # given
+        array = WadArray(self.wads)
+
+        # expect
+        assert (array * WadArray(list(reversed(self.wads)))).to_list() == [x * y for x, y in zip(self.wads, reversed(self.wads))]
+        assert (array * RayArray(self.rays)).to_list() == [x * y for x, y in zip(self.wads, self.rays)]
+        assert (array * RadArray(self.rads)).to_list() == [x * y for x, y in zip(self.wads, self.rads)]
+        assert (array * Ray.from_number(1.5)).to_list() == [x * Ray.from_number(1.5) for x in self.wads]
+        assert (array * 3).to_list() == [x * 3 for x in self.wads]
+
+    def test_divide_should_round_like_scalars(self):
+        # given
+        array = WadArray(self.wads)
+        divisors = [Wad(3), Wad.from_number(-0.7), Wad.from_number(3), Wad(1), Wad.from_number(11)]
+
+        # expect
+        assert (array / WadArray(divisors)).to_list() == [x / y for x, y in zip(self.wads, divisors)]
+        assert (array / Wad.from_number(3)).to_list() == [x / Wad.from_number(3) for x in self.wads]
+
+    def test_divide_should_reject_other_types(self):
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) / RayArray(self.rays)
+        with pytest.raises(ArithmeticError):
+            WadArray(self.wads) / 2
+
+    def test_comparisons_should_be_element_wise(self):
+        # given
+        array = WadArray([Wad(1), Wad(2), Wad(3)])
+
+        # expect
+        assert (array < Wad(2)) == [True, False, False]
+        assert (array <= Wad(2)) == [True, True, False]
+        assert (array > WadArray([Wad(3), Wad(2), Wad(1)])) == [False, False, True]
+        assert (array >= WadArray([Wad(3), Wad(2), Wad(1)])) == [False, True, True]
+
+    def test_equality_should_compare_whole_arrays(self):
+        assert WadArray([Wad(1), Wad(2)]) == WadArray([Wad(1), Wad(2)])
+        assert WadArray([Wad(1), Wad(2)]) != WadArray([Wad(1), Wad(3)])
+        assert WadArray([Wad(1), Wad(2)]) != RayArray([Ray(1), Ray(2)])
+
+    def test_reductions(self):
+        # given
+        array = WadArray(self.wads)
+
+        # expect
+        assert array.min() == Wad.min(*self.wads)
+        assert array.max() == Wad.max(*self.wads)
+        assert array.sum() == sum(self.wads, Wad(0))
+        assert abs(array).to_list() == [abs(x) for x in self.wads]
+
+    def test_minimum_and_maximum(self):
+        # given
+        array = WadArray([Wad(1), Wad(5), Wad(3)])
+
+        # expect
+        assert array.minimum(Wad(2)) == WadArray([Wad(1), Wad(2), Wad(2)])
+        assert array.maximum(WadArray([Wad(4), Wad(4), Wad(4)])) == WadArray([Wad(4), Wad(5), Wad(4)])
+
+
+class TestRayArray:
+    def test_multiply_should_round_like_scalars(self):
+        # given
+        rays = [Ray.from_number(2.5), Ray(3), Ray.from_number(-0.1)]
+        wads = [Wad(2), Wad.from_number(1.1), Wad.from_number(0.000001)]
+
+        # expect
+        assert (RayArray(rays) * WadArray(wads)).to_list() == [x * y for x, y in zip(rays, wads)]
+        assert (RayArray(rays) * RayArray(rays)).to_list() == [x * x for x in rays]
+
+    def test_divide_should_round_like_scalars(self):
+        # given
+        rays = [Ray.from_number(2.5), Ray(3), Ray.from_number(-0.1)]
+
+        # expect
+        assert (RayArray(rays) / Ray.from_number(3)).to_list() == [x / Ray.from_number(3) for x in rays]
+
+
+class TestRadArray:
+    def test_should_convert_from_wad_array(self):
+        # given
+        wads = [Wad.from_number(2.5), Wad(3)]
+
+        # expect
+        assert RadArray(WadArray(wads)).to_list() == [Rad(wad) for wad in wads]
+
+    def test_multiply_should_round_like_scalars(self):
+        # given
+        rads = [Rad.from_number(2.5), Rad(3), Rad.from_number(-0.1)]
+        rays = [Ray(2), Ray.from_number(1.1), Ray.from_number(0.000001)]
+
+        # expect
+        assert (RadArray(rads) * RayArray(rays)).to_list() == [x * y for x, y in zip(rads, rays)]
@@ -17,18 +17,25 @@
 from typing import List
 from unittest.mock import Mock
 
+from eth_abi import encode_abi, encode_single, decode_abi, decode_single
+from eth_utils import event_abi_to_log_topic, function_signature_to_4byte_selector
+from hexbytes import HexBytes
+
 import pytest
 import time
 from web3 import HTTPProvider
 from web3 import Web3
 
-from pymaker import Address, Wad, Contract
+from pymaker import Address, Wad, Contract, Receipt
 from pymaker.approval import directly
-from pymaker.oasis import SimpleMarket, ExpiringMarket, MatchingMarket, Order
+from pymaker.oasis import SimpleMarket, ExpiringMarket, MatchingMarket, Order, OasisOrderBook, LogKill, \
+    order_index, order_indexes
 from pymaker.token import DSToken
-from tests.helpers import wait_until_mock_called, is_hashable
+from pymaker.util import int_to_bytes32, bytes_to_hexstring, hexstring_to_bytes
+from tests.helpers import wait_until_mock_called, is_hashable, JsonRpcServer
 
 PAST_BLOCKS = 100
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
 
 
 class GeneralMarketTest:
@@ -250,6 +257,38 @@ class GeneralMarketTest:
         assert self.otc.get_orders() == []
         assert self.otc.get_last_order_id() == 1
 
+    def test_order_book_should_follow_events(self):
+        # given
+        self.otc.approve([self.token1, self.token2], directly())
+        self.otc.make(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                      buy_token=self.token2.address, buy_amount=Wad.from_number(2)).transact()
+        self.otc.make(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                      buy_token=self.token2.address, buy_amount=Wad.from_number(4)).transact()
+
+        # when
+        book = OasisOrderBook(self.otc, check_interval=None)
+        book.update()
+
+        # then
+        assert book.get_orders() == self.otc.get_orders()
+
+        # when
+        self.otc.make(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                      buy_token=self.token2.address, buy_amount=Wad.from_number(3)).transact()
+        self.otc.take(1, Wad.from_number(0.25)).transact()
+        self.otc.kill(2).transact(gas=4000000)
+        book.update()
+
+        # then
+        assert [order.order_id for order in book.get_orders(self.token1.address, self.token2.address)] == [1, 3]
+        assert book.get_order(1).pay_amount == Wad.from_number(0.75)
+        assert book.get_order(1).buy_amount == Wad.from_number(1.5)
+        assert book.get_order(2) is None
+        assert book.last_block == self.web3.eth.blockNumber
+
+        # and
+        assert book.check() is True
+
     def test_no_past_events_on_startup(self):
         assert self.otc.past_make(PAST_BLOCKS) == []
         assert self.otc.past_bump(PAST_BLOCKS) == []
@@ -534,6 +573,24 @@ class TestMatchingMarketPosition:
         assert self.otc.position(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
                                  buy_token=self.token2.address, buy_amount=Wad.from_number(35)) == 4
 
+    def test_should_calculate_correct_order_position_with_order_book(self):
+        # given
+        book = OasisOrderBook(self.otc, pairs=[(self.token1.address, self.token2.address)])
+        book.update()
+        self.otc.use_order_book(book)
+
+        # expect
+        assert self.otc.position(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                                 buy_token=self.token2.address, buy_amount=Wad.from_number(35)) == 4
+
+        # when
+        receipt = self.otc.make(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                                buy_token=self.token2.address, buy_amount=Wad.from_number(35)).transact()
+
+        # then
+        assert self.otc.position(pay_token=self.token1.address, pay_amount=Wad.from_number(1),
+                                 buy_token=self.token2.address, buy_amount=Wad.from_number(35.5)) == receipt.result
+
     @pytest.mark.skip(reason="Works unreliably with ganache-cli")
     def test_should_use_correct_order_position_by_default(self):
         # when
@@ -577,3 +634,518 @@ class TestMatchingMarketPosition:
         # then
         assert gas_used_optimal < gas_used_minus_1
         assert gas_used_optimal < gas_used_plus_1
+
+
+class TestOrder:
+    def setup_method(self):
+        self.market = Mock(address=Address('0x0000011111222223333344444555556666677777'))
+        self.order = Order(self.market, 7, Address('0x9e56625509c2f60af937f23b7b532600390e8c8b'),
+                           Address('0x0000000000111111111100000000001111111111'), Wad.from_number(4),
+                           Address('0x1111111111000000000011111111110000000000'), Wad.from_number(2), 1500000000)
+
+    def test_should_cache_prices(self):
+        # expect
+        assert self.order.sell_to_buy_price == Wad.from_number(2)
+        assert self.order.buy_to_sell_price == Wad.from_number(0.5)
+        assert self.order.sell_to_buy_price is self.order.sell_to_buy_price
+        assert not hasattr(self.order, '__dict__')
+
+        # when
+        self.order.pay_amount = Wad.from_number(1)
+
+        # then
+        assert self.order.sell_to_buy_price == Wad.from_number(0.5)
+        assert self.order.buy_to_sell_price == Wad.from_number(2)
+
+    def test_should_have_printable_representation(self):
+        # expect
+        assert "'order_id': 7" in repr(self.order)
+        assert "'pay_amount': Wad(4000000000000000000)" in repr(self.order)
+        assert "_price" not in repr(self.order)
+
+
+class MarketEventsTest:
+    MARKET = Address('0x0000011111222223333344444555556666677777')
+    MAKER = Address('0x9e56625509c2f60af937f23b7b532600390e8c8b')
+    OTHER_MAKER = Address('0x4444444444555555555566666666667777777777')
+    TOKEN1 = Address('0x0000000000111111111100000000001111111111')
+    TOKEN2 = Address('0x1111111111000000000011111111110000000000')
+
+    def setup_method(self):
+        self.block_number = 10
+        self.logs = []
+        self.offers = {}
+
+        def handler(method, params):
+            if method == 'eth_getCode':
+                return '0x6000'
+            elif method == 'eth_blockNumber':
+                return hex(self.block_number)
+            elif method == 'eth_getLogs':
+                from_block, to_block = int(params[0]['fromBlock'], 16), int(params[0]['toBlock'], 16)
+                return [log for log in self.logs if from_block <= int(log['blockNumber'], 16) <= to_block]
+            elif method == 'eth_call':
+                return bytes_to_hexstring(self.call(hexstring_to_bytes(params[0]['data'])))
+
+        self.node = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.node.endpoint_uri))
+        self.otc = SimpleMarket(self.web3, self.MARKET)
+
+    def teardown_method(self):
+        self.node.stop()
+
+    def call(self, data: bytes) -> bytes:
+        if data[:4] == function_signature_to_4byte_selector('last_offer_id()'):
+            return encode_single('uint256', max(self.offers.keys(), default=0))
+
+        elif data[:4] == function_signature_to_4byte_selector('offers(uint256)'):
+            offer = self.offers.get(decode_single('uint256', data[4:]))
+            if offer is None:
+                return encode_abi(['uint256', 'address', 'uint256', 'address', 'address', 'uint64'],
+                                  [0, ZERO_ADDRESS, 0, ZERO_ADDRESS, ZERO_ADDRESS, 0])
+            else:
+                return encode_abi(['uint256', 'address', 'uint256', 'address', 'address', 'uint64'],
+                                  [offer.pay_amount.value, offer.pay_token.address, offer.buy_amount.value,
+                                   offer.buy_token.address, offer.maker.address, offer.timestamp])
+
+        elif data[:4] == function_signature_to_4byte_selector('getBestOffer(address,address)'):
+            pay_token, buy_token = decode_abi(['address', 'address'], data[4:])
+            return encode_single('uint256', next(iter(self.sorted_offers(Address(pay_token), Address(buy_token))), 0))
+
+        elif data[:4] == function_signature_to_4byte_selector('getWorseOffer(uint256)'):
+            return encode_single('uint256', self.worse_offer(decode_single('uint256', data[4:])))
+
+        elif data[:4] == function_signature_to_4byte_selector('getOffers(address,address,address)'):
+            _, pay_token, buy_token = decode_abi(['address', 'address', 'address'], data[4:])
+            return self.offers_page(next(iter(self.sorted_offers(Address(pay_token), Address(buy_token))), 0))
+
+        elif data[:4] == function_signature_to_4byte_selector('getOffers(address,uint256)'):
+            return self.offers_page(decode_abi(['address', 'uint256'], data[4:])[1])
+
+    def sorted_offers(self, pay_token: Address, buy_token: Address) -> List[int]:
+        offers = [offer for offer in self.offers.values()
+                  if offer is not None and offer.pay_token == pay_token and offer.buy_token == buy_token]
+        return [offer.order_id for offer in sorted(offers, key=lambda offer: (offer.buy_amount / offer.pay_amount,
+                                                                              offer.order_id))]
+
+    def worse_offer(self, order_id: int) -> int:
+        offer = self.offers.get(order_id)
+        if offer is None:
+            return 0
+
+        sorted_offers = self.sorted_offers(offer.pay_token, offer.buy_token)
+        index = sorted_offers.index(order_id) + 1
+        return sorted_offers[index] if index < len(sorted_offers) else 0
+
+    def offers_page(self, order_id: int) -> bytes:
+        page = [[0] * 100, [0] * 100, [0] * 100, [ZERO_ADDRESS] * 100, [0] * 100]
+        for index in range(100):
+            offer = self.offers.get(order_id)
+            if offer is None:
+                break
+
+            page[0][index], page[1][index], page[2][index], page[3][index], page[4][index] = \
+                order_id, offer.pay_amount.value, offer.buy_amount.value, offer.maker.address, offer.timestamp
+            order_id = self.worse_offer(order_id)
+
+        return encode_abi(MatchingMarket.get_offers_output_types, page)
+
+    def queried_offers(self) -> List[int]:
+        selector = bytes_to_hexstring(function_signature_to_4byte_selector('offers(uint256)'))
+        return [int(request['params'][0]['data'][10:], 16)
+                for payload in self.node.payloads for request in (payload if isinstance(payload, list) else [payload])
+                if request['method'] == 'eth_call' and request['params'][0]['data'].startswith(selector)]
+
+    def order(self, order_id: int, pay_amount: int, buy_amount: int, pay_token: Address = TOKEN1,
+              buy_token: Address = TOKEN2, maker: Address = MAKER) -> Order:
+        return Order(self.otc, order_id, maker, pay_token, Wad.from_number(pay_amount),
+                     buy_token, Wad.from_number(buy_amount), 1500000000)
+
+    def log(self, event: str, order_id: int, pay_amount: float, buy_amount: float,
+            pay_token: Address = TOKEN1, buy_token: Address = TOKEN2, maker: Address = MAKER):
+        event_abi = [abi for abi in SimpleMarket.abi if abi.get('name') == event][0]
+        topics = [event_abi_to_log_topic(event_abi), bytes(32), int_to_bytes32(int(maker.address, 16))]
+        values = [pay_token.address, buy_token.address,
+                  Wad.from_number(pay_amount).value, Wad.from_number(buy_amount).value, 1500000000]
+
+        if event == 'LogTake':
+            topics.append(int_to_bytes32(int(self.MAKER.address, 16)))
+            data = encode_abi(['bytes32', 'address', 'address', 'uint128', 'uint128', 'uint64'],
+                              [int_to_bytes32(order_id)] + values)
+        else:
+            topics.insert(1, int_to_bytes32(order_id))
+            data = encode_abi(['address', 'address', 'uint128', 'uint128', 'uint64'], values)
+
+        self.logs.append({'address': self.MARKET.address, 'blockNumber': hex(self.block_number),
+                          'logIndex': hex(len(self.logs)), 'transactionIndex': '0x0', 'removed': False,
+                          'blockHash': '0x' + '11' * 32, 'transactionHash': '0x' + '22' * 32,
+                          'topics': [bytes_to_hexstring(topic) for topic in topics], 'data': bytes_to_hexstring(data)})
+
+
+class TestOasisOrderBook(MarketEventsTest):
+    def setup_method(self):
+        MarketEventsTest.setup_method(self)
+        self.otc.get_orders = Mock(return_value=[self.order(1, 1, 2), self.order(2, 1, 4)])
+
+    @staticmethod
+    def order_ids(orders: List[Order]) -> List[int]:
+        return [order.order_id for order in orders]
+
+    def test_should_bootstrap_once(self):
+        # given
+        book = OasisOrderBook(self.otc)
+
+        # when
+        book.update()
+        book.update()
+
+        # then
+        assert self.otc.get_orders.call_count == 1
+        assert book.last_block == 10
+        assert self.order_ids(book.get_orders()) == [1, 2]
+
+    def test_should_apply_events(self):
+        # given
+        book = OasisOrderBook(self.otc)
+        book.update()
+
+        # when
+        self.block_number = 11
+        self.log('LogMake', 3, 1, 3)
+        self.log('LogTake', 1, 0.25, 0.5)
+        self.log('LogKill', 2, 1, 4)
+        self.block_number = 12
+        self.log('LogMake', 4, 2, 2, pay_token=self.TOKEN2, buy_token=self.TOKEN1)
+        self.log('LogTake', 4, 2, 2, pay_token=self.TOKEN2, buy_token=self.TOKEN1)
+        book.update()
+
+        # then
+        assert book.last_block == 12
+        assert self.order_ids(book.get_orders()) == [1, 3]
+        assert book.get_order(1).pay_amount == Wad.from_number(0.75)
+        assert book.get_order(1).buy_amount == Wad.from_number(1.5)
+        assert book.get_order(2) is None
+        assert book.get_order(4) is None
+        assert book.get_orders(self.TOKEN2, self.TOKEN1) == []
+
+    def test_should_keep_pairs_sorted_by_price(self):
+        # given
+        book = OasisOrderBook(self.otc)
+        book.update()
+
+        # when
+        self.block_number = 11
+        self.log('LogMake', 3, 1, 3)
+        self.log('LogMake', 4, 2, 3)
+        self.log('LogMake', 5, 1, 4)
+        self.log('LogMake', 6, 3, 1, pay_token=self.TOKEN2, buy_token=self.TOKEN1)
+        book.update()
+
+        # then
+        assert self.order_ids(book.get_orders(self.TOKEN1, self.TOKEN2)) == [4, 1, 3, 2, 5]
+        assert self.order_ids(book.get_orders(self.TOKEN2, self.TOKEN1)) == [6]
+        assert book.get_best_order(self.TOKEN1, self.TOKEN2).order_id == 4
+        assert book.get_best_order(self.TOKEN2, self.TOKEN2) is None
+        assert book.get_price_levels(self.TOKEN1, self.TOKEN2) == [(Wad.from_number(1.5), Wad.from_number(2)),
+                                                                   (Wad.from_number(2), Wad.from_number(1)),
+                                                                   (Wad.from_number(3), Wad.from_number(1)),
+                                                                   (Wad.from_number(4), Wad.from_number(2))]
+
+    def test_should_track_selected_pairs_only(self):
+        # given
+        book = OasisOrderBook(self.otc, pairs=[(self.TOKEN2, self.TOKEN1)])
+        book.update()
+
+        # when
+        self.block_number = 11
+        self.log('LogMake', 3, 1, 3)
+        self.log('LogMake', 4, 3, 1, pay_token=self.TOKEN2, buy_token=self.TOKEN1)
+        book.update()
+
+        # then
+        assert self.order_ids(book.get_orders()) == [4]
+
+    def test_should_repair_itself_on_consistency_check(self):
+        # given
+        book = OasisOrderBook(self.otc, check_interval=5)
+        book.update()
+
+        # when
+        self.block_number = 12
+        self.log('LogKill', 2, 1, 4)
+        book.update()
+
+        # then
+        assert self.order_ids(book.get_orders()) == [1]
+        assert self.otc.get_orders.call_count == 1
+
+        # when
+        self.block_number = 15
+        book.update()
+
+        # then
+        assert self.otc.get_orders.call_count == 2
+        assert self.order_ids(book.get_orders()) == [1, 2]
+        assert book.last_check_block == 15
+
+    def receipt(self) -> Receipt:
+        # turns the last log into the receipt of a transaction which emitted it
+        log = self.logs.pop()
+        return Receipt({'transactionHash': HexBytes(log['transactionHash']), 'gasUsed': 100000,
+                        'blockNumber': int(log['blockNumber'], 16),
+                        'logs': [dict(log, blockNumber=int(log['blockNumber'], 16), logIndex=int(log['logIndex'], 16),
+                                      transactionIndex=0, topics=[HexBytes(topic) for topic in log['topics']])]})
+
+    def test_should_calculate_order_position(self):
+        # given
+        self.otc.get_orders = Mock(return_value=[self.order(order_id, 1, amount) for order_id, amount
+                                                 in enumerate([11, 55, 44, 34, 36, 21, 45, 51, 15, 34], 1)])
+        book = OasisOrderBook(self.otc)
+        book.update()
+
+        # expect
+        assert book.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(35)) == 10
+        assert book.position(self.TOKEN1, Wad.from_number(2), self.TOKEN2, Wad.from_number(70)) == 10
+        assert book.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(33)) == 6
+        assert book.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(100)) == 2
+        assert book.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(10)) == 0
+        assert book.position(self.TOKEN2, Wad.from_number(1), self.TOKEN1, Wad.from_number(10)) == 0
+
+    def test_should_calculate_order_position_without_rounding_ties(self):
+        # given
+        self.otc.get_orders = Mock(return_value=[Order(self.otc, 1, self.MAKER, self.TOKEN1, Wad(3), self.TOKEN2, Wad(1), 0),
+                                                 Order(self.otc, 2, self.MAKER, self.TOKEN1, Wad(3), self.TOKEN2, Wad(2), 0)])
+        book = OasisOrderBook(self.otc)
+        book.update()
+
+        # expect
+        assert book.position(self.TOKEN1, Wad(1000000), self.TOKEN2, Wad(333334)) == 1
+        assert book.position(self.TOKEN1, Wad(1000000), self.TOKEN2, Wad(666666)) == 1
+        assert book.position(self.TOKEN1, Wad(1000000), self.TOKEN2, Wad(666667)) == 2
+
+    def test_should_make_matching_market_calculate_positions_locally(self):
+        # given
+        otc = MatchingMarket(self.web3, self.MARKET)
+        otc.get_orders = Mock(return_value=[self.order(1, 1, 2), self.order(2, 1, 4)])
+        book = OasisOrderBook(otc)
+        book.update()
+
+        # when
+        otc.use_order_book(book)
+        self.node.payloads.clear()
+
+        # then
+        assert otc.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(3)) == 1
+        assert self.node.payloads == []
+
+    def test_should_add_orders_from_receipts(self):
+        # given
+        book = OasisOrderBook(self.otc)
+        book.update()
+
+        # when
+        self.log('LogMake', 3, 1, 3)
+        book.apply_receipt(self.receipt())
+
+        # then
+        assert book.get_order(3) is None
+
+        # when
+        self.block_number = 11
+        self.log('LogMake', 4, 1, 3)
+        book.apply_receipt(self.receipt())
+
+        # then
+        assert book.get_order(4).buy_amount == Wad.from_number(3)
+        assert book.position(self.TOKEN1, Wad.from_number(1), self.TOKEN2, Wad.from_number(3.5)) == 4
+
+    def test_should_bootstrap_again_on_reorg(self):
+        # given
+        book = OasisOrderBook(self.otc)
+        book.update()
+        book.apply(LogKill({'args': {'id': int_to_bytes32(1), 'maker': self.MAKER.address,
+                                     'pay_gem': self.TOKEN1.address, 'pay_amt': 10**18,
+                                     'buy_gem': self.TOKEN2.address, 'buy_amt': 2 * 10**18,
+                                     'timestamp': 1500000000}}))
+        assert self.order_ids(book.get_orders()) == [2]
+
+        # when
+        book.handle_reorg(1, [], [])
+
+        # then
+        assert self.order_ids(book.get_orders()) == [1, 2]
+
+
+class TestOrderIndex(MarketEventsTest):
+    def setup_method(self):
+        MarketEventsTest.setup_method(self)
+        self.offers = {1: self.order(1, 1, 2),
+                       2: self.order(2, 1, 3, maker=self.OTHER_MAKER),
+                       3: None,
+                       4: self.order(4, 1, 4),
+                       5: self.order(5, 1, 5, maker=self.OTHER_MAKER)}
+
+    def teardown_method(self):
+        MarketEventsTest.teardown_method(self)
+        order_indexes.clear()
+
+    def test_should_find_orders_by_maker(self):
+        # expect
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.MAKER)] == [1, 4]
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.OTHER_MAKER)] == [2, 5]
+        assert self.otc.get_orders_by_maker(Address('0x5555555555666666666677777777778888888888')) == []
+
+    def test_should_only_query_candidate_orders(self):
+        # given
+        self.otc.get_orders_by_maker(self.MAKER)
+        assert self.queried_offers() == [1, 2, 3, 4, 5]
+
+        # when
+        self.node.payloads.clear()
+        self.offers[1] = None
+        self.offers[6] = self.order(6, 1, 6, maker=self.OTHER_MAKER)
+        self.offers[7] = self.order(7, 1, 7)
+
+        # then
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.MAKER)] == [4, 7]
+        assert self.queried_offers() == [1, 4, 6, 7]
+
+        # when
+        self.node.payloads.clear()
+
+        # then
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.MAKER)] == [4, 7]
+        assert self.queried_offers() == [4, 7]
+
+    def test_should_apply_market_events(self):
+        # given
+        self.otc.get_orders_by_maker(self.MAKER)
+
+        # when
+        self.block_number = 11
+        self.offers[6] = self.order(6, 1, 6, maker=self.OTHER_MAKER)
+        self.offers[7] = self.order(7, 1, 7)
+        self.offers[4] = None
+        self.log('LogMake', 6, 1, 6, maker=self.OTHER_MAKER)
+        self.log('LogMake', 7, 1, 7)
+        self.log('LogKill', 4, 1, 4)
+        self.node.payloads.clear()
+
+        # then
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.MAKER)] == [1, 7]
+        assert self.queried_offers() == [1, 7]
+
+    def test_should_share_index_between_market_instances(self):
+        # given
+        self.otc.get_orders_by_maker(self.MAKER)
+        self.node.payloads.clear()
+
+        # when
+        other_otc = SimpleMarket(self.web3, self.MARKET)
+
+        # then
+        assert order_index(other_otc) is order_index(self.otc)
+        assert [order.order_id for order in other_otc.get_orders_by_maker(self.OTHER_MAKER)] == [2, 5]
+        assert self.queried_offers() == [2, 5]
+
+    def test_should_start_over_after_reset(self):
+        # given
+        self.otc.get_orders_by_maker(self.MAKER)
+        self.node.payloads.clear()
+
+        # when
+        order_index(self.otc).reset()
+
+        # then
+        assert [order.order_id for order in self.otc.get_orders_by_maker(self.MAKER)] == [1, 4]
+        assert self.queried_offers() == [1, 2, 3, 4, 5]
+
+
+class TestMatchingMarketOrderFetching(MarketEventsTest):
+    SUPPORT = Address('0x5555555555666666666677777777778888888888')
+
+    def setup_method(self):
+        MarketEventsTest.setup_method(self)
+        self.otc = MatchingMarket(self.web3, self.MARKET, support_address=self.SUPPORT)
+        self.offers = {order_id: self.order(order_id, 1, order_id % 7 + 1) for order_id in range(1, 251)}
+        self.offers.update({order_id: self.order(order_id, 1, 10, pay_token=self.TOKEN2, buy_token=self.TOKEN1)
+                            for order_id in range(251, 281)})
+
+    def batches(self) -> List[list]:
+        return [payload for payload in self.node.payloads if isinstance(payload, list)]
+
+    def test_should_fetch_both_sides_page_by_page(self):
+        # when
+        orders = self.otc.get_orders_for_pairs([(self.TOKEN1, self.TOKEN2), (self.TOKEN2, self.TOKEN1)])
+
+        # then
+        assert [order.order_id for order in orders[(self.TOKEN1, self.TOKEN2)]] == \
+            self.sorted_offers(self.TOKEN1, self.TOKEN2)
+        assert [order.order_id for order in orders[(self.TOKEN2, self.TOKEN1)]] == list(range(251, 281))
+        assert orders[(self.TOKEN1, self.TOKEN2)][0] == self.offers[7]
+        assert orders[(self.TOKEN1, self.TOKEN2)][0].buy_amount == Wad.from_number(1)
+        assert orders[(self.TOKEN2, self.TOKEN1)][0].maker == self.MAKER
+
+        # and
+        assert [len(batch) for batch in self.batches()] == [2, 1, 1]
+        assert all(request['params'][0]['to'] == self.SUPPORT.address
+                   for batch in self.batches() for request in batch)
+
+    def test_should_fetch_orders_as_of_a_block(self):
+        # when
+        orders = self.otc.get_orders_for_pairs([(self.TOKEN1, self.TOKEN2)], block_number=8)
+
+        # then
+        assert len(orders[(self.TOKEN1, self.TOKEN2)]) == 250
+        assert all(request['params'][1] == '0x8' for batch in self.batches() for request in batch)
+
+    def test_should_fetch_the_pair_again_if_an_order_is_gone(self):
+        # given
+        offers_page = self.offers_page
+        first_page = self.sorted_offers(self.TOKEN1, self.TOKEN2)[:100]
+
+        def offers_page_removing_order(order_id: int) -> bytes:
+            page = offers_page(order_id)
+            self.offers[first_page[-1]] = None
+            return page
+
+        self.offers_page = offers_page_removing_order
+
+        # when
+        orders = self.otc.get_orders_for_pairs([(self.TOKEN1, self.TOKEN2)])
+
+        # then
+        assert [order.order_id for order in orders[(self.TOKEN1, self.TOKEN2)]] == \
+            self.sorted_offers(self.TOKEN1, self.TOKEN2)
+        assert len(orders[(self.TOKEN1, self.TOKEN2)]) == 249
+
+    def test_should_sort_orders_of_a_pair_by_order_id(self):
+        # expect
+        assert [order.order_id for order in self.otc.get_orders(self.TOKEN1, self.TOKEN2)] == list(range(1, 251))
+        assert [order.order_id for order in self.otc.get_orders(self.TOKEN2, self.TOKEN1)] == list(range(251, 281))
+
+    def test_should_walk_sorted_lists_without_support_contract(self):
+        # given
+        otc = MatchingMarket(self.web3, self.MARKET)
+        self.offers = {order_id: offer for order_id, offer in self.offers.items() if order_id % 10 == 0}
+
+        # when
+        orders = otc.get_orders_for_pairs([(self.TOKEN1, self.TOKEN2), (self.TOKEN2, self.TOKEN1)])
+
+        # then
+        assert [order.order_id for order in orders[(self.TOKEN1, self.TOKEN2)]] == \
+            self.sorted_offers(self.TOKEN1, self.TOKEN2)
+        assert [order.order_id for order in orders[(self.TOKEN2, self.TOKEN1)]] == [260, 270, 280]
+        assert self.batches() == []
+
+    def test_order_book_should_bootstrap_as_of_the_current_block(self):
+        # given
+        book = OasisOrderBook(self.otc, pairs=[(self.TOKEN1, self.TOKEN2), (self.TOKEN2, self.TOKEN1)])
+
+        # when
+        book.update()
+
+        # then
+        assert [order.order_id for order in book.get_orders(self.TOKEN2, self.TOKEN1)] == list(range(251, 281))
+        assert len(book.get_orders(self.TOKEN1, self.TOKEN2)) == 250
+        assert all(request['params'][1] == '0xa' for batch in self.batches() for request in batch)
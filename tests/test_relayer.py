@@ -0,0 +1,257 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.numeric import Wad
+from pymaker.transport import RateLimiter, rate_limiter, pooled_session
+from pymaker.zrx import ZrxExchange, ZrxRelayerApi, AsyncZrxRelayerApi
+from pymaker.zrxv2 import ZrxExchangeV2, ZrxRelayerApiV2, AsyncZrxRelayerApiV2, ERC20Asset
+from tests.helpers import HttpServer, JsonRpcServer
+
+EXCHANGE = Address('0x0000011111222223333344444555556666677777')
+TOKEN_1 = Address('0x0000000000111111111100000000001111111111')
+TOKEN_2 = Address('0x1111111111000000000011111111110000000000')
+TOKEN_3 = Address('0x2222222222000000000022222222220000000000')
+ZERO = '0x0000000000000000000000000000000000000000'
+
+
+def v1_order(salt: int, maker_token: Address, taker_token: Address) -> dict:
+    return {'maker': '0x9e56625509c2f60af937f23b7b532600390e8c8b', 'taker': ZERO,
+            'makerFee': '0', 'takerFee': '0',
+            'makerTokenAddress': maker_token.address, 'makerTokenAmount': str(salt + 1),
+            'takerTokenAddress': taker_token.address, 'takerTokenAmount': '1000',
+            'salt': str(salt), 'feeRecipient': ZERO, 'expirationUnixTimestampSec': '1600000000',
+            'exchangeContractAddress': EXCHANGE.address,
+            'ecSignature': {'v': 27, 'r': '0x' + '11' * 32, 's': '0x' + '22' * 32}}
+
+
+def v2_order(salt: int, maker_asset_data: str, taker_asset_data: str) -> dict:
+    return {'order': {'senderAddress': ZERO, 'makerAddress': '0x9e56625509c2f60af937f23b7b532600390e8c8b',
+                      'takerAddress': ZERO, 'makerFee': '0', 'takerFee': '0',
+                      'makerAssetData': maker_asset_data, 'makerAssetAmount': str(salt + 1),
+                      'takerAssetData': taker_asset_data, 'takerAssetAmount': '1000',
+                      'salt': str(salt), 'feeRecipientAddress': ZERO, 'expirationTimeSeconds': '1600000000',
+                      'exchangeAddress': EXCHANGE.address, 'signature': '0x1b'}}
+
+
+def page_of(items: list, query: dict) -> list:
+    per_page = int(query['per_page'][0])
+    page = int(query['page'][0])
+    return items[(page - 1) * per_page:page * per_page]
+
+
+class TestRateLimiter:
+    def test_should_allow_bursts(self):
+        # given
+        limiter = RateLimiter(1, burst=3)
+
+        # expect
+        assert [limiter.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert 0.9 < limiter.reserve() <= 1.0
+        assert 1.9 < limiter.reserve() <= 2.0
+
+    def test_should_limit_the_average_rate(self):
+        # given
+        limiter = RateLimiter(50, burst=1)
+        start = time.time()
+
+        # when
+        for _ in range(6):
+            limiter.wait()
+
+        # then
+        assert time.time() - start >= 0.09
+
+    def test_should_limit_the_rate_across_threads(self):
+        # given
+        limiter = RateLimiter(50, burst=1)
+        start = time.time()
+
+        # when
+        threads = [threading.Thread(target=limiter.wait) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # then
+        assert time.time() - start >= 0.09
+
+    def test_should_share_limiters_per_server(self):
+        # expect
+        assert rate_limiter('http://relayer-1', 10) is rate_limiter('http://relayer-1', 20)
+        assert rate_limiter('http://relayer-1', 10) is not rate_limiter('http://relayer-2', 10)
+        assert rate_limiter('http://relayer-1', 20).rate == 10
+
+
+class TestAsyncZrxRelayerApi:
+    def setup_method(self):
+        self.orders = [v1_order(salt, TOKEN_1, TOKEN_2) for salt in range(250)]
+
+        def handler(method, path, query, body):
+            if 'maker' in query:
+                return 200, page_of(self.orders[:30], query)
+            elif query['makerTokenAddress'][0] == TOKEN_1.address.lower():
+                return 200, page_of(self.orders, query)
+            else:
+                return 200, []
+
+        self.node = JsonRpcServer(lambda method, params: '0x6000' if method == 'eth_getCode' else None)
+        self.relayer = HttpServer(handler)
+
+        web3 = Web3(HTTPProvider(self.node.endpoint_uri))
+        self.exchange = ZrxExchange(web3, EXCHANGE)
+        self.api = AsyncZrxRelayerApi(ZrxRelayerApi(self.exchange, self.relayer.url, session=pooled_session()),
+                                      max_concurrency=4)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def teardown_method(self):
+        self.api.close()
+        self.loop.close()
+        self.node.stop()
+        self.relayer.stop()
+
+    def test_should_download_all_pages(self):
+        # when
+        orders = self.loop.run_until_complete(self.api.get_all_orders(TOKEN_1, TOKEN_2, per_page=20))
+
+        # then
+        assert [order.salt for order in orders] == list(range(250))
+        assert all(order.pay_amount == Wad(order.salt + 1) for order in orders)
+
+    def test_should_download_pairs_concurrently(self):
+        # when
+        orders = self.loop.run_until_complete(self.api.get_orders_for_pairs([(TOKEN_1, TOKEN_2), (TOKEN_2, TOKEN_1)]))
+
+        # then
+        assert len(orders[(TOKEN_1, TOKEN_2)]) == 250
+        assert orders[(TOKEN_2, TOKEN_1)] == []
+
+    def test_should_download_orders_by_maker(self):
+        # when
+        orders = self.loop.run_until_complete(
+            self.api.get_all_orders_by_maker(Address('0x9e56625509c2f60af937f23b7b532600390e8c8b'), per_page=10))
+
+        # then
+        assert [order.salt for order in orders] == list(range(30))
+
+
+class TestAsyncZrxRelayerApiV2:
+    def setup_method(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.in_flight_lock = threading.Lock()
+
+        asset_1 = ERC20Asset(TOKEN_1).serialize()
+        asset_2 = ERC20Asset(TOKEN_2).serialize()
+        self.orders = [v2_order(salt, asset_1, asset_2) for salt in range(95)]
+
+        def handler(method, path, query, body):
+            with self.in_flight_lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            time.sleep(0.05)
+
+            with self.in_flight_lock:
+                self.in_flight -= 1
+
+            if path == '/v2/orderbook':
+                base, quote = query['baseAssetData'][0], query['quoteAssetData'][0]
+                return 200, {'asks': {'records': [v2_order(1, base, quote)]},
+                             'bids': {'records': [v2_order(2, quote, base), v2_order(3, quote, base)]}}
+            elif query['makerAssetData'][0] == asset_1:
+                return 200, {'records': page_of(self.orders, query)}
+            else:
+                return 200, {'records': []}
+
+        self.node = JsonRpcServer(lambda method, params: '0x6000' if method == 'eth_getCode' else None)
+        self.relayer = HttpServer(handler)
+
+        web3 = Web3(HTTPProvider(self.node.endpoint_uri))
+        self.exchange = ZrxExchangeV2(web3, EXCHANGE)
+        self.relayer_api = ZrxRelayerApiV2(self.exchange, self.relayer.url, session=pooled_session())
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.pairs = [(TOKEN_1, TOKEN_2), (TOKEN_2, TOKEN_3), (TOKEN_3, TOKEN_1), (TOKEN_2, TOKEN_1)]
+
+    def teardown_method(self):
+        self.loop.close()
+        self.node.stop()
+        self.relayer.stop()
+
+    def test_should_download_books_concurrently(self):
+        # given
+        api = AsyncZrxRelayerApiV2(self.relayer_api, max_concurrency=4)
+
+        # when
+        books = self.loop.run_until_complete(api.get_books(self.pairs, depth=10))
+
+        # then
+        assert list(books.keys()) == self.pairs
+        for pay_token, buy_token in self.pairs:
+            asks, bids = books[(pay_token, buy_token)]
+            assert [order.salt for order in asks] == [1]
+            assert [order.salt for order in bids] == [2, 3]
+            assert asks[0].pay_asset == ERC20Asset(pay_token)
+            assert bids[0].pay_asset == ERC20Asset(buy_token)
+
+        # and
+        assert self.max_in_flight > 1
+
+    def test_should_not_exceed_max_concurrency(self):
+        # given
+        api = AsyncZrxRelayerApiV2(self.relayer_api, max_concurrency=2)
+
+        # when
+        orders = self.loop.run_until_complete(api.get_orders_for_pairs(self.pairs, per_page=10))
+
+        # then
+        assert [order.salt for order in orders[(TOKEN_1, TOKEN_2)]] == list(range(95))
+        assert orders[(TOKEN_2, TOKEN_3)] == []
+        assert self.max_in_flight == 2
+
+    def test_should_stop_at_the_first_short_page(self):
+        # given
+        api = AsyncZrxRelayerApiV2(self.relayer_api, max_concurrency=4)
+
+        # when
+        orders = self.loop.run_until_complete(api.get_all_orders(TOKEN_1, TOKEN_2, per_page=50))
+
+        # then
+        assert len(orders) == 95
+        assert sorted(int(query['page'][0]) for _, _, query, _ in self.relayer.requests) == [1, 2, 3, 4, 5]
+
+    def test_should_rate_limit_requests(self):
+        # given
+        api = AsyncZrxRelayerApiV2(self.relayer_api, max_concurrency=8, requests_per_second=20)
+        start = time.time()
+
+        # when
+        self.loop.run_until_complete(api.get_books(self.pairs * 2))
+
+        # then
+        assert time.time() - start >= 0.35
+        assert len(self.relayer.requests) == 8
@@ -0,0 +1,153 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.transport import pooled_session, default_session, pooled_http_provider, PooledHTTPProvider
+from pymaker.util import make_batch_request
+from pymaker.zrxv2 import ZrxExchangeV2, ZrxRelayerApiV2
+from tests.helpers import HttpServer, JsonRpcServer
+
+
+class TestPooledSession:
+    def setup_method(self):
+        # the first `failures` requests fail with `503 Service Unavailable`
+        self.failures = 0
+
+        def handler(method, path, query, body):
+            if self.failures > 0:
+                self.failures -= 1
+                return 503, {'error': 'Service unavailable'}
+
+            return 200, {'method': method, 'path': path}
+
+        self.server = HttpServer(handler)
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_keep_connections_alive(self):
+        # given
+        session = pooled_session()
+
+        # when
+        for _ in range(5):
+            assert session.get(f"{self.server.url}/v2/orders").json() == {'method': 'GET', 'path': '/v2/orders'}
+            assert session.post(f"{self.server.url}/v2/order", json={}).json() == {'method': 'POST', 'path': '/v2/order'}
+
+        # then
+        assert len(self.server.requests) == 10
+        assert len(self.server.connections) == 1
+
+    def test_should_decompress_gzipped_responses(self):
+        # when
+        response = pooled_session().get(f"{self.server.url}/v2/orders")
+
+        # then
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.json() == {'method': 'GET', 'path': '/v2/orders'}
+
+    def test_should_retry_idempotent_requests_only(self):
+        # given
+        session = pooled_session(max_retries=3, backoff_factor=0)
+
+        # when
+        self.failures = 2
+        response = session.get(f"{self.server.url}/v2/orders")
+
+        # then
+        assert response.status_code == 200
+        assert len(self.server.requests) == 3
+
+        # when
+        self.failures = 2
+        response = session.post(f"{self.server.url}/v2/order", json={})
+
+        # then
+        assert response.status_code == 503
+        assert len(self.server.requests) == 4
+
+    def test_should_share_default_session(self):
+        # expect
+        assert default_session() is default_session()
+
+
+class TestPooledHTTPProvider:
+    def setup_method(self):
+        def result(request: dict) -> dict:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'result': '0x10'}
+
+        def handler(method, path, query, body):
+            return 200, [result(request) for request in body] if isinstance(body, list) else result(body)
+
+        self.server = HttpServer(handler)
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_keep_connection_to_the_node_alive(self):
+        # given
+        web3 = Web3(pooled_http_provider(self.server.url, timeout=30))
+
+        # when
+        assert [web3.eth.blockNumber for _ in range(3)] == [16, 16, 16]
+        assert len(make_batch_request(web3, [('eth_blockNumber', []), ('eth_gasPrice', [])])) == 2
+
+        # then
+        assert len(self.server.requests) == 4
+        assert len(self.server.connections) == 1
+
+    def test_should_create_provider(self):
+        # when
+        provider = pooled_http_provider(self.server.url, timeout=30)
+
+        # then
+        assert isinstance(provider, PooledHTTPProvider)
+        assert isinstance(provider, HTTPProvider)
+        assert provider.get_request_kwargs()['timeout'] == 30
+        assert provider.session is not default_session()
+
+
+class TestRelayerSession:
+    def setup_method(self):
+        self.node = JsonRpcServer(lambda method, params: '0x6000' if method == 'eth_getCode' else None)
+        self.relayer = HttpServer(lambda method, path, query, body: (200, {'records': []}))
+
+        web3 = Web3(HTTPProvider(self.node.endpoint_uri))
+        self.exchange = ZrxExchangeV2(web3, Address('0x0000011111222223333344444555556666677777'))
+
+    def teardown_method(self):
+        self.node.stop()
+        self.relayer.stop()
+
+    def test_should_reuse_connections_to_the_relayer(self):
+        # given
+        api = ZrxRelayerApiV2(self.exchange, self.relayer.url, session=pooled_session())
+
+        # when
+        for _ in range(3):
+            assert api.get_orders(Address('0x0000000000111111111100000000001111111111'),
+                                  Address('0x1111111111000000000011111111110000000000')) == []
+
+        # then
+        assert len(self.relayer.requests) == 3
+        assert len(self.relayer.connections) == 1
+
+    def test_should_use_default_session(self):
+        # expect
+        assert ZrxRelayerApiV2(self.exchange, self.relayer.url).session is default_session()
@@ -16,15 +16,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, call
 
 import pytest
-from web3 import Web3
+from web3 import Web3, HTTPProvider
 
 from pymaker import Address
 from pymaker.util import synchronize, int_to_bytes32, bytes_to_int, bytes_to_hexstring, hexstring_to_bytes, \
-    AsyncCallback, chain
+    AsyncCallback, chain, make_batch_request, default_callback_executor
+from tests.helpers import JsonRpcServer
 
 
 async def async_return(result):
@@ -105,6 +108,48 @@ def mocked_web3_transaction_count(address: Address, latest: int, pending: int) -
     return web3
 
 
+class TestMakeBatchRequest:
+    def setup_method(self):
+        def handler(method, params):
+            if method == 'eth_blockNumber':
+                return '0x10'
+            elif method == 'eth_getBalance':
+                return hex(int(params[0][-1]))
+            else:
+                raise Exception("Unknown method")
+
+        self.server = JsonRpcServer(handler)
+        self.web3 = Web3(HTTPProvider(self.server.endpoint_uri))
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def test_should_return_empty_list_for_no_requests(self):
+        # expect
+        assert make_batch_request(self.web3, []) == []
+        assert self.server.payloads == []
+
+    def test_should_send_all_requests_in_one_batch(self):
+        # when
+        responses = make_batch_request(self.web3, [('eth_blockNumber', []),
+                                                   ('eth_getBalance', ['0x0000000000000000000000000000000000000003', 'latest']),
+                                                   ('eth_getBalance', ['0x0000000000000000000000000000000000000007', 'latest'])])
+
+        # then
+        assert [response['result'] for response in responses] == ['0x10', '0x3', '0x7']
+        # and
+        assert len(self.server.payloads) == 1
+        assert len(self.server.payloads[0]) == 3
+
+    def test_should_return_errors_of_individual_requests(self):
+        # when
+        responses = make_batch_request(self.web3, [('eth_blockNumber', []), ('eth_unknown', [])])
+
+        # then
+        assert responses[0]['result'] == '0x10'
+        assert responses[1]['error']['message'] == "Unknown method"
+
+
 def test_synchronize_should_return_empty_list_for_no_futures():
     assert synchronize([]) == []
 
@@ -281,3 +326,84 @@ class TestAsyncCallback:
 
         # then
         assert mock.mock_calls == [call.on_start(), call.callback(), call.on_finish()]
+
+    def test_should_reuse_threads_of_the_executor(self, callbacks):
+        # given
+        threads = set()
+        executor = ThreadPoolExecutor(max_workers=2)
+        async_callback = AsyncCallback(lambda: threads.add(threading.get_ident()), executor)
+
+        # when
+        for _ in range(10):
+            assert async_callback.trigger()
+            async_callback.wait()
+
+        # then
+        assert 1 <= len(threads) <= 2
+        assert threading.get_ident() not in threads
+        assert async_callback.invocations == 10
+
+    def test_should_share_the_default_executor(self, callbacks):
+        # given
+        async_callback_1 = AsyncCallback(callbacks.short_running_callback)
+        async_callback_2 = AsyncCallback(callbacks.short_running_callback)
+
+        # when
+        async_callback_1.trigger()
+        async_callback_2.trigger()
+        async_callback_1.wait()
+        async_callback_2.wait()
+
+        # then
+        assert callbacks.counter == 2
+        assert default_callback_executor() is default_callback_executor()
+
+    def test_should_keep_single_flight_semantics_when_queued(self, callbacks):
+        # given
+        executor = ThreadPoolExecutor(max_workers=1)
+        blocker = AsyncCallback(callbacks.long_running_callback, executor)
+        async_callback = AsyncCallback(callbacks.short_running_callback, executor)
+
+        # when
+        assert blocker.trigger()
+        assert async_callback.trigger()
+        assert not async_callback.trigger()
+
+        # and
+        async_callback.wait()
+
+        # then
+        assert callbacks.counter == 2
+        assert async_callback.invocations == 1
+
+    def test_should_measure_queue_and_run_time(self, callbacks):
+        # given
+        executor = ThreadPoolExecutor(max_workers=1)
+        blocker = AsyncCallback(callbacks.long_running_callback, executor)
+        async_callback = AsyncCallback(callbacks.long_running_callback, executor)
+
+        # when
+        blocker.trigger()
+        async_callback.trigger()
+        async_callback.wait()
+
+        # then
+        assert 0.9 < async_callback.queue_time < 1.5
+        assert 0.9 < async_callback.run_time < 1.5
+        assert async_callback.total_queue_time == async_callback.queue_time
+        assert async_callback.total_run_time == async_callback.run_time
+
+    def test_should_survive_exceptions_in_callback(self):
+        # given
+        def failing_callback():
+            raise Exception("Failed")
+
+        async_callback = AsyncCallback(failing_callback)
+
+        # when
+        assert async_callback.trigger()
+        async_callback.wait()
+
+        # then
+        assert async_callback.invocations == 1
+        assert async_callback.trigger()
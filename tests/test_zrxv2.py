@@ -319,6 +319,37 @@ class TestOrder:
         # expect
         assert is_hashable(order)
 
+    def test_should_cache_prices(self):
+        # given
+        order = Order(exchange=None,
+                      sender=Address("0x0000000000000000000000000000000000000000"),
+                      maker=Address("0x9e56625509c2f60af937f23b7b532600390e8c8b"),
+                      taker=Address("0x0000000000000000000000000000000000000000"),
+                      maker_fee=Wad.from_number(123),
+                      taker_fee=Wad.from_number(456),
+                      pay_asset=ERC20Asset(Address("0x323b5d4c32345ced77393b3530b1eed0f346429d")),
+                      pay_amount=Wad(10000000000000000),
+                      buy_asset=ERC20Asset(Address("0xef7fff64389b814a946f3e92105513705ca6b990")),
+                      buy_amount=Wad(20000000000000000),
+                      salt=67006738228878699843088602623665307406148487219438534730168799356281242528500,
+                      fee_recipient=Address('0x6666666666666666666666666666666666666666'),
+                      expiration=42,
+                      exchange_contract_address=Address("0x12459c951127e0c374ff9105dda097662a027093"),
+                      signature="0x1bf9f6a3b67b52d40c16387df2cd6283bbdbfc174577743645dd6f4bd828c7dbc315baf69f6c3cc8ac0f62c89264d73accf1ae165cce5d6e2a0b6325c6e4bab96403")
+
+        # expect
+        assert order.sell_to_buy_price == Wad.from_number(0.5)
+        assert order.buy_to_sell_price == Wad.from_number(2)
+        assert order.buy_to_sell_price is order.buy_to_sell_price
+        assert not hasattr(order, '__dict__')
+
+        # when
+        order.buy_amount = Wad(40000000000000000)
+
+        # then
+        assert order.sell_to_buy_price == Wad.from_number(0.25)
+        assert order.buy_to_sell_price == Wad.from_number(4)
+
     def test_parse_signed_json_order(self):
         # given
         json_order = json.loads("""{